@@ -0,0 +1,157 @@
+"""
+Allocations and latency of the capture -> colour conversion -> display path, before and after
+the frame buffer pool:
+
+    python -m lib.benchmark.FrameBufferBenchmark --resolutions 640x480 1920x1080
+
+'allocating' is the path as it was: read() into a new image, cvtColor to RGB for MediaPipe,
+flip, cvtColor to RGBA and another flip for display. 'pooled' reads into pooled buffers with
+read(image=...), converts into a reused RGB buffer and mirrors in place (the vertical flip and
+the BGR upload are the renderer's job). Allocated bytes per frame are measured with tracemalloc
+(NumPy reports its buffers to it) in a separate pass, so tracing does not skew the latencies.
+Finally both run through FramePipeline to report how many buffers the pool needed.
+"""
+import os
+import sys
+import time
+import argparse
+import tempfile
+import tracemalloc
+
+import cv2
+import numpy as np
+
+from lib.core.FramePipeline import FramePipeline
+from lib.core.FrameBufferPool import FrameBufferPool
+from lib.benchmark.HotPathBenchmark import measure, summarize, syntheticFrames, writeClip
+
+_LIST_RESOLUTIONS = [(640, 480), (1280, 720), (1920, 1080)]
+_INT_CLIP_FRAMES = 30
+
+
+class _LoopingCapture:
+    # Re-opens the clip at its end, so the measured loop never runs out of frames
+    def __init__(self, clipPath):
+        self.clipPath = clipPath
+        self.cap = cv2.VideoCapture(clipPath)
+
+    def read(self, image=None):
+        success, img = self.cap.read(image=image)
+        if not success:
+            self.cap.release()
+            self.cap = cv2.VideoCapture(self.clipPath)
+            success, img = self.cap.read(image=image)
+        return success, img
+
+    def release(self):
+        self.cap.release()
+
+
+class AllocatingPath:
+    def __init__(self, clipPath):
+        self.capture = _LoopingCapture(clipPath)
+
+    def __call__(self, i):
+        _, img = self.capture.read()
+        imgRGB = cv2.cvtColor(img, cv2.COLOR_BGR2RGB)  # MediaPipe input
+        img = cv2.flip(img, 1)
+        img = cv2.cvtColor(img, cv2.COLOR_BGR2RGBA)
+        img = cv2.flip(img, 0)
+        return imgRGB, img
+
+
+class PooledPath:
+    def __init__(self, clipPath):
+        self.capture = _LoopingCapture(clipPath)
+        self.pool = FrameBufferPool()
+        self.imgRGB = None
+        self._shape = None
+
+    def __call__(self, i):
+        buffer = self.pool.acquire(self._shape) if self._shape else None
+        _, img = self.capture.read(image=buffer)
+        if img is not buffer:
+            self._shape = img.shape
+            self.pool.release(buffer)
+        if self.imgRGB is None or self.imgRGB.shape != img.shape:
+            self.imgRGB = np.empty_like(img)
+        cv2.cvtColor(img, cv2.COLOR_BGR2RGB, dst=self.imgRGB)
+        cv2.flip(img, 1, dst=img)
+        self.pool.release(img)  # Shown and replaced at once here
+        return self.imgRGB, img
+
+
+def allocatedBytes(fn, iterations, warmUp=3):
+    """
+    :return: (mean, max) peak bytes allocated during one call of fn, over iterations calls
+    """
+    for i in range(warmUp):
+        fn(i)
+    peaks = np.empty(iterations, dtype=np.float64)
+    tracemalloc.start()
+    try:
+        for i in range(iterations):
+            tracemalloc.reset_peak()
+            before = tracemalloc.get_traced_memory()[0]
+            fn(i)
+            peaks[i] = tracemalloc.get_traced_memory()[1] - before
+    finally:
+        tracemalloc.stop()
+    return float(peaks.mean()), float(peaks.max())
+
+
+def pipelineAllocations(clipPath, seconds):
+    """
+    Run FramePipeline with the widget's in-place display conversion for a while.
+    :return: (frames finished, pool buffers allocated)
+    """
+    def processFrame(frame):
+        cv2.flip(frame.image, 1, dst=frame.image)
+
+    pipeline = FramePipeline(_LoopingCapture(clipPath), processFrame, maxFrameAge=None)
+    pipeline.start()
+    frames = 0
+    shown = None
+    end = time.monotonic() + seconds
+    while time.monotonic() < end:
+        frame = pipeline.getLatestFrame()
+        if frame is None:
+            time.sleep(0.001)
+            continue
+        if shown is not None:
+            shown.release()
+        shown = frame
+        frames += 1
+    pipeline.stop()
+    return frames, pipeline.bufferPool.allocations
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark frame allocations on the capture/display path.')
+    parser.add_argument('--resolutions', nargs='+', default=['%dx%d' % r for r in _LIST_RESOLUTIONS],
+                        help='WxH list (default: %(default)s)')
+    parser.add_argument('--iterations', type=int, default=200)
+    parser.add_argument('--pipeline-seconds', type=float, default=2.0)
+    args = parser.parse_args(argv)
+
+    print('%-10s %-11s %9s %9s %10s %14s %14s' % ('size', 'path', 'p50 ms', 'p95 ms', 'fps',
+                                                   'alloc MB/frame', 'alloc MB/s'))
+    with tempfile.TemporaryDirectory() as tmpDir:
+        for resolution in args.resolutions:
+            w, h = (int(v) for v in resolution.lower().split('x'))
+            clipPath = os.path.join(tmpDir, 'clip_%s.avi' % resolution)
+            writeClip(syntheticFrames(w, h, _INT_CLIP_FRAMES), clipPath)
+            for name, path in (('allocating', AllocatingPath), ('pooled', PooledPath)):
+                r = summarize(measure(path(clipPath), args.iterations))
+                meanBytes, _ = allocatedBytes(path(clipPath), max(10, args.iterations // 4))
+                print('%-10s %-11s %9.3f %9.3f %10.1f %14.2f %14.1f' % (
+                    resolution, name, r['p50_ms'], r['p95_ms'], r['throughput_fps'], meanBytes / 2 ** 20,
+                    meanBytes * r['throughput_fps'] / 2 ** 20))
+            frames, allocations = pipelineAllocations(clipPath, args.pipeline_seconds)
+            print('%-10s FramePipeline: %d frames shown, %d pool buffers allocated' % (resolution, frames,
+                                                                                      allocations))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,258 @@
+"""
+Reproducible benchmark of the capture -> infer -> draw -> display hot path.
+
+Every stage runs in isolation, then the whole chain end to end, on synthetic frames and (with
+--video) on frames of a recorded clip, at several resolutions:
+
+    python -m lib.benchmark.HotPathBenchmark --video PoseVideos/pv_05.mp4 --output bench.json
+    python -m lib.benchmark.HotPathBenchmark --backend stub --output bench_stub.json
+
+The JSON file holds p50/p95/p99 latency and throughput per (source, resolution, stage) plus the
+git commit and library versions, so runs can be compared across commits with --compare.
+The decode stage reads an MJPG clip written from the same frames at each resolution, so it is
+comparable between sources and machines.
+"""
+import os
+import sys
+import json
+import time
+import platform
+import argparse
+import tempfile
+import subprocess
+
+import cv2
+import numpy as np
+
+import lib.core.PoseModule as pm
+
+_LIST_RESOLUTIONS = [(640, 480), (1280, 720), (1920, 1080)]
+_INT_SYNTHETIC_FRAMES = 30  # Distinct synthetic frames per resolution, the stages cycle over them
+_INT_ANGLE_POINTS = (11, 13, 15)  # Left shoulder, elbow, wrist
+
+
+def measure(fn, iterations, warmUp=3):
+    """
+    :param fn: callable(i) timed once per iteration
+    :return: per-call latencies in seconds
+    """
+    for i in range(warmUp):
+        fn(i)
+    samples = np.empty(iterations, dtype=np.float64)
+    for i in range(iterations):
+        start = time.perf_counter()
+        fn(i)
+        samples[i] = time.perf_counter() - start
+    return samples
+
+
+def summarize(samples):
+    return {'iterations': int(samples.size),
+            'p50_ms': float(np.percentile(samples, 50) * 1000),
+            'p95_ms': float(np.percentile(samples, 95) * 1000),
+            'p99_ms': float(np.percentile(samples, 99) * 1000),
+            'mean_ms': float(samples.mean() * 1000),
+            'throughput_fps': float(samples.size / samples.sum()) if samples.sum() > 0 else 0.0}
+
+
+def syntheticFrames(w, h, count):
+    # Smooth random texture: compresses like camera content and gives the detector some structure
+    rng = np.random.default_rng(0)
+    frames = []
+    for _ in range(count):
+        small = rng.integers(0, 256, (h // 8, w // 8, 3), dtype=np.uint8)
+        frames.append(cv2.resize(small, (w, h), interpolation=cv2.INTER_CUBIC))
+    return frames
+
+
+def recordedFrames(videoPath, w, h, count):
+    cap = cv2.VideoCapture(videoPath)
+    frames = []
+    while len(frames) < count:
+        success, img = cap.read()
+        if not success:
+            break
+        frames.append(cv2.resize(img, (w, h), interpolation=cv2.INTER_AREA))
+    cap.release()
+    return frames
+
+
+def writeClip(frames, path):
+    h, w = frames[0].shape[:2]
+    writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*'MJPG'), 30, (w, h))
+    for img in frames:
+        writer.write(img)
+    writer.release()
+
+
+def widgetConversion(img, fps=0):
+    # The display conversion of OpenGLWidget.processFrame, in place: the frame is uploaded as GL_BGR
+    cv2.flip(img, 1, dst=img)
+    cv2.putText(img, str(int(fps)), (70, 50), cv2.FONT_HERSHEY_PLAIN, 3, (255, 0, 0), 3)
+    return img
+
+
+def rgbaConversion(img, fps=0):
+    # The display conversion before the GL_BGR upload, still timed as 'rgba_flip' so reports of
+    # older commits compare like for like
+    img = cv2.flip(img, 1)
+    cv2.putText(img, str(int(fps)), (70, 50), cv2.FONT_HERSHEY_PLAIN, 3, (255, 0, 0), 3)
+    return cv2.cvtColor(img, cv2.COLOR_BGR2RGBA)
+
+
+def runStages(frames, clipPath, args):
+    """
+    :return: {stage name: summary dict}
+    """
+    n = len(frames)
+    it = args.iterations
+    results = {}
+
+    # ----- decode ----- #
+    cap = {'cap': cv2.VideoCapture(clipPath)}
+
+    def decode(i):
+        success, _ = cap['cap'].read()
+        if not success:
+            cap['cap'].release()
+            cap['cap'] = cv2.VideoCapture(clipPath)
+            cap['cap'].read()
+    results['decode'] = summarize(measure(decode, it))
+    cap['cap'].release()
+
+    # ----- colour conversion ----- #
+    results['bgr2rgb'] = summarize(measure(lambda i: cv2.cvtColor(frames[i % n], cv2.COLOR_BGR2RGB), it))
+
+    # ----- MediaPipe ----- #
+    detector = pm.PoseDetector(backend=args.backend)
+    detector.backend.warmUp(background=False)
+    results['MediaPipe_findPose'] = summarize(measure(
+        lambda i: detector.MediaPipe_findPose(frames[i % n], draw=False), it))
+
+    # Keep one result with a pose (if any) for the landmark and drawing stages
+    detector.MediaPipe_findPose(frames[0], draw=False)
+    results['MediaPipe_findPosition'] = summarize(measure(
+        lambda i: detector.MediaPipe_findPosition(frames[i % n], draw=False), it))
+
+    # ----- overlay drawing ----- #
+    if len(detector.MediaPipe_findPosition(frames[0], draw=False)) != 0:
+        canvases = [img.copy() for img in frames[:4]]
+
+        def overlay(i):
+            img = canvases[i % len(canvases)]
+            detector.backend.draw(img, detector.results)
+            detector.MediaPipe_findPosition(img, draw=True)
+            detector.MediaPipe_findAngle(img, *_INT_ANGLE_POINTS, draw=True)
+        results['overlay_draw'] = summarize(measure(overlay, it))
+
+    # ----- OpenPose ----- #
+    if args.net:
+        opDetector = pm.PoseDetector(backend='stub', netPath=args.net,
+                                     openPoseInputSize=(args.openpose_size, args.openpose_size))
+        opDetector.openPose.warmUp(background=False)
+        results['OpenPose_findPose'] = summarize(measure(
+            lambda i: opDetector.OpenPose_findPose(frames[i % n], draw=False), max(1, it // 4)))
+
+    # ----- display conversion ----- #
+    results['rgba_flip'] = summarize(measure(lambda i: rgbaConversion(frames[i % n]), it))
+    canvases = [img.copy() for img in frames]  # Converted in place, the source frames stay as they are
+    results['display_conversion'] = summarize(measure(lambda i: widgetConversion(canvases[i % n]), it))
+
+    # ----- end to end ----- #
+    detector.MediaPipe_resetTracking()
+    e2eCap = {'cap': cv2.VideoCapture(clipPath)}
+
+    def endToEnd(i):
+        success, img = e2eCap['cap'].read()
+        if not success:
+            e2eCap['cap'].release()
+            e2eCap['cap'] = cv2.VideoCapture(clipPath)
+            success, img = e2eCap['cap'].read()
+        img = detector.MediaPipe_findPose(img)
+        detector.MediaPipe_findPosition(img, draw=True)
+        widgetConversion(img)
+    results['end_to_end'] = summarize(measure(endToEnd, it))
+    e2eCap['cap'].release()
+    return results
+
+
+def gitCommit():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', 'HEAD'], stderr=subprocess.DEVNULL,
+                                       cwd=os.path.dirname(os.path.abspath(__file__))).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def printResults(report):
+    print('%-10s %-10s %-24s %9s %9s %9s %10s' % ('source', 'size', 'stage', 'p50 ms', 'p95 ms', 'p99 ms', 'fps'))
+    for run in report['runs']:
+        for stage, r in run['stages'].items():
+            print('%-10s %-10s %-24s %9.3f %9.3f %9.3f %10.1f' % (run['source'], run['resolution'], stage,
+                                                                 r['p50_ms'], r['p95_ms'], r['p99_ms'],
+                                                                 r['throughput_fps']))
+
+
+def compareReports(old, new):
+    oldRuns = {(r['source'], r['resolution']): r['stages'] for r in old['runs']}
+    print('\np50 change against %s' % (old.get('git_commit') or 'previous run'))
+    for run in new['runs']:
+        before = oldRuns.get((run['source'], run['resolution']), {})
+        for stage, r in run['stages'].items():
+            if stage in before and before[stage]['p50_ms'] > 0:
+                change = 100.0 * (r['p50_ms'] - before[stage]['p50_ms']) / before[stage]['p50_ms']
+                print('%-10s %-10s %-24s %+8.1f%%' % (run['source'], run['resolution'], stage, change))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark the capture/infer/draw/display hot path.')
+    parser.add_argument('--video', help='recorded clip, used in addition to synthetic frames')
+    parser.add_argument('--resolutions', nargs='+', default=['%dx%d' % r for r in _LIST_RESOLUTIONS],
+                        help='WxH list (default: %(default)s)')
+    parser.add_argument('--iterations', type=int, default=100, help='timed calls per stage')
+    parser.add_argument('--backend', default='mediapipe', help='landmark backend (see PoseBackends)')
+    parser.add_argument('--net', help='graph_opt.pb path, enables the OpenPose stage')
+    parser.add_argument('--openpose-size', type=int, default=368)
+    parser.add_argument('--output', '-o', default='hot_path_benchmark.json', help='JSON results file')
+    parser.add_argument('--compare', help='earlier JSON results file to compare against')
+    args = parser.parse_args(argv)
+
+    report = {'git_commit': gitCommit(),
+              'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+              'platform': platform.platform(),
+              'python': platform.python_version(),
+              'opencv': cv2.__version__,
+              'numpy': np.__version__,
+              'cpu_count': os.cpu_count(),
+              'backend': args.backend,
+              'iterations': args.iterations,
+              'runs': []}
+
+    with tempfile.TemporaryDirectory() as tmpDir:
+        for resolution in args.resolutions:
+            w, h = (int(v) for v in resolution.lower().split('x'))
+            sources = [('synthetic', syntheticFrames(w, h, _INT_SYNTHETIC_FRAMES))]
+            if args.video:
+                sources.append(('recorded', recordedFrames(args.video, w, h, args.iterations)))
+            for source, frames in sources:
+                if not frames:
+                    print('No frames for %s %s, skipped' % (source, resolution), file=sys.stderr)
+                    continue
+                clipPath = os.path.join(tmpDir, '%s_%s.avi' % (source, resolution))
+                writeClip(frames, clipPath)
+                report['runs'].append({'source': source, 'resolution': resolution,
+                                       'stages': runStages(frames, clipPath, args)})
+
+    printResults(report)
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print('\nResults written to ' + args.output)
+
+    if args.compare:
+        with open(args.compare, 'r') as f:
+            compareReports(json.load(f), report)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
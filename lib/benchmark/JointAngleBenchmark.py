@@ -0,0 +1,63 @@
+"""
+Joint angles of a long session: one MediaPipe_findAngle call per joint and frame against the
+batched JointAngleAnalytics pass (angles, statistics and rep counting).
+
+    python -m lib.benchmark.JointAngleBenchmark --minutes 60
+
+The landmarks are random, the cost does not depend on the pose. The per-frame loop is timed on
+--loop-frames frames and scaled to the session length.
+"""
+import sys
+import time
+import argparse
+
+import numpy as np
+
+import lib.core.PoseModule as pm
+from lib.core.JointAngleAnalytics import JOINTS, jointTable, analyseLandmarks
+
+_FLOAT_FPS = 30.0
+_INT_LOOP_FRAMES = 3000
+
+
+def perFrameLoop(landmarks, width, height):
+    # What a caller of the per-frame API does: pixel landmarks into lmList, one findAngle per joint
+    detector = pm.PoseDetector(backend='stub')
+    names, _ = jointTable()
+    angles = np.empty((len(landmarks), len(names)), dtype=np.float32)
+    scale = np.array([width, height, 1.0, 1.0], dtype=np.float32)
+    for f in range(len(landmarks)):
+        detector.lmList = landmarks[f] * scale
+        detector.angles = []
+        for j, name in enumerate(names):
+            angles[f, j] = detector.MediaPipe_findAngle(None, *JOINTS[name], draw=False)
+    return angles
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark per-frame against batched joint angles.')
+    parser.add_argument('--minutes', type=float, default=60.0, help='session length at 30 fps')
+    parser.add_argument('--loop-frames', type=int, default=_INT_LOOP_FRAMES)
+    args = parser.parse_args(argv)
+
+    frames = int(args.minutes * 60 * _FLOAT_FPS)
+    landmarks = np.random.default_rng(0).random((frames, 33, 4), dtype=np.float32)
+    landmarks[:, :, 3] = 1.0
+    sample = landmarks[:min(args.loop_frames, frames)]
+
+    start = time.perf_counter()
+    perFrameLoop(sample, 1280, 720)
+    loopSeconds = (time.perf_counter() - start) * frames / max(len(sample), 1)
+    start = time.perf_counter()
+    analyseLandmarks(landmarks, width=1280, height=720, repJoints=['left_knee', 'right_knee'])
+    batchSeconds = time.perf_counter() - start
+
+    print('%d frames (%.0f min at %.0f fps), %d joints' % (frames, args.minutes, _FLOAT_FPS, len(JOINTS)))
+    print('%-34s %10.2f s' % ('per-frame findAngle (extrapolated)', loopSeconds))
+    print('%-34s %10.2f s' % ('batched angles + stats + reps', batchSeconds))
+    print('%-34s %10.1fx' % ('speedup', loopSeconds / max(batchSeconds, 1e-9)))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,98 @@
+"""
+Throughput and landmark error of KeyframeTracker against per-frame inference.
+
+    python -m lib.benchmark.KeyframeTrackingBenchmark clip1.mp4 clip2.mp4 --max-interval 10
+
+Per-frame MediaPipe inference is the reference. The error is the mean (and 95th percentile)
+pixel distance of the landmarks visible in both, over all frames of a clip.
+"""
+import sys
+import time
+import argparse
+
+import cv2
+import numpy as np
+
+import lib.core.PoseModule as pm
+from lib.core.LandmarkTracker import KeyframeTracker
+
+_FLOAT_MIN_VISIBILITY = 0.5  # Landmarks compared in the error, as in KeyframeTracker
+
+
+def readFrames(videoPath, maxFrames):
+    cap = cv2.VideoCapture(videoPath)
+    frames = []
+    while len(frames) < maxFrames:
+        success, img = cap.read()
+        if not success:
+            break
+        frames.append(img)
+    cap.release()
+    return frames
+
+
+def runPerFrame(frames, backend):
+    detector = pm.PoseDetector(backend=backend)
+    detector.backend.warmUp(background=False)
+    landmarks = []
+    start = time.perf_counter()
+    for img in frames:
+        detector.MediaPipe_findPose(img, draw=False)
+        lmPixels = detector.MediaPipe_findPosition(img, draw=False)
+        landmarks.append(lmPixels.copy() if len(lmPixels) != 0 else None)
+    return time.perf_counter() - start, landmarks
+
+
+def runKeyframe(frames, backend, minInterval, maxInterval, driftBudget):
+    detector = pm.PoseDetector(backend=backend)
+    detector.backend.warmUp(background=False)
+    tracker = KeyframeTracker(detector, minInterval=minInterval, maxInterval=maxInterval, driftBudget=driftBudget)
+    landmarks = []
+    start = time.perf_counter()
+    for img in frames:
+        lm, _ = tracker.process(img)
+        landmarks.append(None if lm is None else lm.copy())
+    return time.perf_counter() - start, landmarks, tracker
+
+
+def landmarkErrors(reference, tracked):
+    errors = []
+    for ref, lm in zip(reference, tracked):
+        if ref is None or lm is None:
+            continue
+        visible = (ref[:, 3] >= _FLOAT_MIN_VISIBILITY) & (lm[:, 3] >= _FLOAT_MIN_VISIBILITY)
+        errors.append(np.linalg.norm(ref[visible, :2] - lm[visible, :2], axis=1))
+    return np.concatenate(errors) if errors else np.empty(0)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark keyframe inference with optical flow tracking.')
+    parser.add_argument('videos', nargs='+', help='recorded clips')
+    parser.add_argument('--frames', type=int, default=600, help='max frames per clip')
+    parser.add_argument('--backend', default='mediapipe')
+    parser.add_argument('--min-interval', type=int, default=1)
+    parser.add_argument('--max-interval', type=int, default=10)
+    parser.add_argument('--drift-budget', type=float, default=0.05)
+    args = parser.parse_args(argv)
+
+    print('%-30s %8s %12s %12s %9s %10s %10s' % ('clip', 'frames', 'per-frame fps', 'keyframe fps',
+                                                 'keyframes', 'mean err', 'p95 err'))
+    for video in args.videos:
+        frames = readFrames(video, args.frames)
+        if not frames:
+            print('%-30s could not be read' % video)
+            continue
+        refSeconds, reference = runPerFrame(frames, args.backend)
+        kfSeconds, tracked, tracker = runKeyframe(frames, args.backend, args.min_interval,
+                                                  args.max_interval, args.drift_budget)
+        errors = landmarkErrors(reference, tracked)
+        meanErr = errors.mean() if errors.size else float('nan')
+        p95Err = np.percentile(errors, 95) if errors.size else float('nan')
+        print('%-30s %8d %12.1f %12.1f %8.1f%% %9.2fpx %9.2fpx' % (
+            video[-30:], len(frames), len(frames) / refSeconds, len(frames) / kfSeconds,
+            100.0 * tracker.keyframes / len(frames), meanErr, p95Err))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,81 @@
+"""
+Speed/accuracy of OpenPose_findPose for several network input sizes.
+
+    python -m lib.benchmark.OpenPoseInputSizeBenchmark video.mp4 --net dnn_model/graph_opt.pb \
+        --sizes 184 256 368 480 656 --frames 200
+
+The largest size is the reference: for every other size it reports the mean and the 95th
+percentile distance (in original-frame pixels) of the keypoints found by both, and the share of
+reference keypoints that were also found.
+"""
+import sys
+import time
+import argparse
+
+import cv2
+import numpy as np
+
+import lib.core.PoseModule as pm
+
+
+def readFrames(videoPath, maxFrames):
+    cap = cv2.VideoCapture(videoPath)
+    frames = []
+    while len(frames) < maxFrames:
+        success, img = cap.read()
+        if not success:
+            break
+        frames.append(img)
+    cap.release()
+    return frames
+
+
+def runSize(frames, netPath, size):
+    detector = pm.PoseDetector(netPath=netPath, openPoseInputSize=(size, size))
+    detector.openPose.warmUp(background=False)  # Keep the cold start out of the timings
+    timings = []
+    points = []
+    for img in frames:
+        start = time.perf_counter()
+        detector.OpenPose_findPose(img, draw=False)
+        timings.append(time.perf_counter() - start)
+        points.append([p if p is not None else (np.nan, np.nan) for p in detector.opPoints])
+    return np.array(timings), np.array(points, dtype=np.float64)  # (frames, parts, 2)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark OpenPose network input sizes.')
+    parser.add_argument('video', help='recorded clip to run on')
+    parser.add_argument('--net', required=True, help='path to graph_opt.pb')
+    parser.add_argument('--sizes', type=int, nargs='+', default=[184, 256, 368, 480, 656])
+    parser.add_argument('--frames', type=int, default=200)
+    args = parser.parse_args(argv)
+
+    frames = readFrames(args.video, args.frames)
+    if not frames:
+        print('Could not read frames from ' + args.video, file=sys.stderr)
+        return 1
+    print('%d frames of %dx%d' % (len(frames), frames[0].shape[1], frames[0].shape[0]))
+
+    sizes = sorted(set(args.sizes))
+    results = {size: runSize(frames, args.net, size) for size in sizes}
+    _, reference = results[sizes[-1]]
+    refFound = ~np.isnan(reference[..., 0])
+
+    print('%6s %10s %10s %12s %12s %10s' % ('size', 'ms/frame', 'p95 ms', 'mean dev px', 'p95 dev px', 'recall'))
+    for size in sizes:
+        timings, points = results[size]
+        found = ~np.isnan(points[..., 0])
+        both = found & refFound
+        dist = np.linalg.norm(points[both] - reference[both], axis=1)
+        meanDev = dist.mean() if dist.size else float('nan')
+        p95Dev = np.percentile(dist, 95) if dist.size else float('nan')
+        recall = both.sum() / max(1, refFound.sum())
+        print('%6d %10.2f %10.2f %12.2f %12.2f %9.1f%%' % (size, 1000 * timings.mean(),
+                                                           1000 * np.percentile(timings, 95),
+                                                           meanDev, p95Dev, 100 * recall))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
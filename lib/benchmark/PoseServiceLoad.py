@@ -0,0 +1,128 @@
+"""
+Load generator for lib.core.PoseService: concurrent clients sending frames, client-side latency
+and throughput, then the service's own statistics (queue depth, batch sizes, stage latencies).
+
+    python -m lib.core.PoseService --socket /tmp/pose.sock &
+    python -m lib.benchmark.PoseServiceLoad --socket /tmp/pose.sock --clients 8 --requests 200 --op people
+
+    # Self-contained, with an in-process service on the stub backend
+    python -m lib.benchmark.PoseServiceLoad --spawn --backend stub --clients 4
+"""
+import sys
+import json
+import time
+import argparse
+import tempfile
+import threading
+
+import numpy as np
+
+from lib.core.PoseService import PoseService, PoseClient
+from lib.benchmark.HotPathBenchmark import summarize, syntheticFrames, recordedFrames
+
+_INT_FRAMES = 16  # Distinct frames each client cycles over
+
+
+def runClient(address, op, frames, requests, rate, jpeg, samples, errors, startEvent):
+    client = PoseClient(address, jpeg=jpeg)
+    call = client.people if op == 'people' else client.landmarks
+    latencies = np.empty(requests, dtype=np.float64)
+    period = 1.0 / rate if rate else 0.0
+    startEvent.wait()
+    nextSend = time.perf_counter()
+    done = 0
+    for i in range(requests):
+        if period:
+            delay = nextSend - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            nextSend += period
+        t0 = time.perf_counter()
+        try:
+            call(frames[i % len(frames)])
+        except RuntimeError as e:
+            errors.append(str(e))
+            continue
+        latencies[done] = time.perf_counter() - t0
+        done += 1
+    client.close()
+    samples.append(latencies[:done])
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Generate load on a local pose service.')
+    parser.add_argument('--socket', default=None, help='service Unix socket path or host:port')
+    parser.add_argument('--spawn', action='store_true', help='start a service in this process')
+    parser.add_argument('--backend', default='mediapipe', help='backend of the spawned service')
+    parser.add_argument('--net', help='OpenPose graph of the spawned service')
+    parser.add_argument('--workers', type=int, default=2, help='MediaPipe workers of the spawned service')
+    parser.add_argument('--max-batch', type=int, default=8)
+    parser.add_argument('--max-wait-ms', type=float, default=5.0)
+    parser.add_argument('--op', default='landmarks', choices=['landmarks', 'people'])
+    parser.add_argument('--clients', type=int, default=4, help='concurrent connections')
+    parser.add_argument('--requests', type=int, default=100, help='requests per client')
+    parser.add_argument('--rate', type=float, default=0.0, help='requests per second per client (0: closed loop)')
+    parser.add_argument('--size', default='640x480', help='WxH of the frames')
+    parser.add_argument('--video', help='send frames of this clip instead of synthetic ones')
+    parser.add_argument('--jpeg', action='store_true', help='send JPEG encoded frames')
+    parser.add_argument('--output', '-o', help='JSON results file')
+    args = parser.parse_args(argv)
+
+    w, h = (int(v) for v in args.size.lower().split('x'))
+    frames = recordedFrames(args.video, w, h, _INT_FRAMES) if args.video else syntheticFrames(w, h, _INT_FRAMES)
+
+    service = None
+    address = args.socket
+    if args.spawn:
+        address = address or tempfile.mktemp(suffix='.sock')
+        service = PoseService(address, workers=args.workers, detectorKwargs={'backend': args.backend},
+                              netPath=args.net, maxBatch=args.max_batch, maxWaitMs=args.max_wait_ms)
+        service.start()
+        time.sleep(0.2)  # Let the workers load their models before the clock starts
+    if address is None:
+        parser.error('--socket or --spawn is required')
+
+    samples, errors = [], []
+    startEvent = threading.Event()
+    threads = [threading.Thread(target=runClient, args=(address, args.op, frames, args.requests, args.rate,
+                                                        args.jpeg, samples, errors, startEvent))
+               for _ in range(args.clients)]
+    for thread in threads:
+        thread.start()
+    start = time.perf_counter()
+    startEvent.set()
+    for thread in threads:
+        thread.join()
+    wallSeconds = time.perf_counter() - start
+
+    latencies = np.concatenate(samples) if samples else np.empty(0)
+    client = PoseClient(address)
+    serverStats = client.stats()
+    client.close()
+    if service is not None:
+        service.stop()
+
+    report = {'op': args.op, 'clients': args.clients, 'size': args.size, 'jpeg': args.jpeg,
+              'requests': int(latencies.size), 'errors': len(errors), 'wall_seconds': wallSeconds,
+              'throughput_rps': latencies.size / wallSeconds if wallSeconds > 0 else 0.0,
+              'latency': summarize(latencies) if latencies.size else {}, 'service': serverStats}
+
+    print('%d clients, %d requests, %d errors, %.1f requests/s' % (args.clients, latencies.size, len(errors),
+                                                                   report['throughput_rps']))
+    if latencies.size:
+        lat = report['latency']
+        print('client latency p50 %.2f ms  p95 %.2f ms  p99 %.2f ms' % (lat['p50_ms'], lat['p95_ms'], lat['p99_ms']))
+    print('service: %d batches, mean batch size %.2f, queue depth %s' % (
+        serverStats['batches'], serverStats['mean_batch_size'], serverStats['queue_depth']))
+    for stage, stat in serverStats['latency'].items():
+        print('  %-22s p50 %8.2f ms  p95 %8.2f ms  (%d)' % (stage, stat['p50_ms'], stat['p95_ms'], stat['count']))
+    if errors:
+        print('first error: ' + errors[0], file=sys.stderr)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+    return 0 if not errors else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
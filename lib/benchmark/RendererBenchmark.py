@@ -0,0 +1,152 @@
+"""
+Headless comparison of the legacy glDrawPixels path against TextureRenderer.
+
+Runs under Mesa's software rasterizer (llvmpipe) with an EGL pbuffer, no window or display needed:
+
+    LIBGL_ALWAYS_SOFTWARE=1 python -m lib.benchmark.RendererBenchmark --frames 300
+
+PYOPENGL_PLATFORM defaults to 'egl'. Set it to 'osmesa' to use an OSMesa context instead.
+"""
+import os
+import sys
+import ctypes
+import time
+import argparse
+
+os.environ.setdefault('PYOPENGL_PLATFORM', 'egl')
+os.environ.setdefault('EGL_PLATFORM', 'surfaceless')  # Mesa: no X server or DRM device needed
+
+import numpy as np
+
+from OpenGL.GL import *
+from OpenGL import arrays
+
+from lib.gui.TextureRenderer import TextureRenderer
+
+_LIST_RESOLUTIONS = [(640, 480), (1280, 720), (1920, 1080)]
+_INT_VIEW_WIDTH = 1024
+_INT_VIEW_HEIGHT = 768
+
+
+def _createContextOSMesa(w, h):
+    from OpenGL import osmesa
+    ctx = osmesa.OSMesaCreateContextExt(osmesa.OSMESA_RGBA, 24, 0, 0, None)
+    if not ctx:
+        raise RuntimeError('Could not create an OSMesa context')
+    buf = arrays.GLubyteArray.zeros((h, w, 4))
+    if not osmesa.OSMesaMakeCurrent(ctx, buf, GL_UNSIGNED_BYTE, w, h):
+        raise RuntimeError('Could not make the OSMesa context current')
+    return lambda: osmesa.OSMesaDestroyContext(ctx)
+
+
+def _createContextEGL(w, h):
+    from OpenGL import EGL
+    display = EGL.eglGetDisplay(EGL.EGL_DEFAULT_DISPLAY)
+    major, minor = EGL.EGLint(), EGL.EGLint()
+    if not EGL.eglInitialize(display, major, minor):
+        raise RuntimeError('Could not initialize EGL')
+    configAttribs = arrays.GLintArray.asArray([
+        EGL.EGL_SURFACE_TYPE, EGL.EGL_PBUFFER_BIT,
+        EGL.EGL_RED_SIZE, 8, EGL.EGL_GREEN_SIZE, 8, EGL.EGL_BLUE_SIZE, 8, EGL.EGL_ALPHA_SIZE, 8,
+        EGL.EGL_RENDERABLE_TYPE, EGL.EGL_OPENGL_BIT,
+        EGL.EGL_NONE])
+    config = EGL.EGLConfig()
+    numConfigs = EGL.EGLint()
+    if not EGL.eglChooseConfig(display, configAttribs, ctypes.pointer(config), 1, ctypes.pointer(numConfigs)) \
+            or numConfigs.value < 1:
+        raise RuntimeError('No EGL config with desktop OpenGL and pbuffer support')
+    surface = EGL.eglCreatePbufferSurface(display, config, arrays.GLintArray.asArray([
+        EGL.EGL_WIDTH, w, EGL.EGL_HEIGHT, h, EGL.EGL_NONE]))
+    EGL.eglBindAPI(EGL.EGL_OPENGL_API)
+    ctx = EGL.eglCreateContext(display, config, EGL.EGL_NO_CONTEXT, None)
+    if not ctx or not EGL.eglMakeCurrent(display, surface, surface, ctx):
+        raise RuntimeError('Could not make the EGL context current')
+
+    def destroy():
+        EGL.eglMakeCurrent(display, EGL.EGL_NO_SURFACE, EGL.EGL_NO_SURFACE, EGL.EGL_NO_CONTEXT)
+        EGL.eglDestroyContext(display, ctx)
+        EGL.eglDestroySurface(display, surface)
+        EGL.eglTerminate(display)
+    return destroy
+
+
+def createContext(w, h):
+    """
+    Create and make current a headless compatibility-profile context.
+    :return: a callable that destroys the context
+    """
+    if os.environ['PYOPENGL_PLATFORM'] == 'osmesa':
+        destroy = _createContextOSMesa(w, h)
+    else:
+        destroy = _createContextEGL(w, h)
+    glViewport(0, 0, w, h)
+    return destroy
+
+
+def drawPixelsLegacy(img, viewWidth, viewHeight):
+    # The OpenGLWidget.paintGL path before TextureRenderer: CPU flip + full glDrawPixels each paint
+    img = np.ascontiguousarray(img[::-1])
+    w = img.shape[1]
+    h = img.shape[0]
+    original_ratio = w / h
+    designer_ratio = viewWidth / viewHeight
+    if original_ratio > designer_ratio:
+        scale = (viewWidth / original_ratio) / h
+    elif original_ratio < designer_ratio:
+        scale = (viewHeight * original_ratio) / w
+    else:
+        scale = 1
+    pos_w = 1.0 - ((viewWidth - scale * w) / viewWidth)
+    pos_h = 1.0 - ((viewHeight - scale * h) / viewHeight)
+    glRasterPos2f(-pos_w, -pos_h)
+    glPixelZoom(scale, scale)
+    glDrawPixels(w, h, GL_RGBA, GL_UNSIGNED_BYTE, img)
+
+
+def runCase(name, paint, frames):
+    glFinish()
+    start = time.perf_counter()
+    for i in range(frames):
+        glClear(GL_COLOR_BUFFER_BIT)
+        paint(i)
+    glFinish()
+    elapsed = time.perf_counter() - start
+    print('%-40s %8.3f ms/paint  %8.1f paints/s' % (name, 1000 * elapsed / frames, frames / elapsed))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark glDrawPixels vs TextureRenderer headless.')
+    parser.add_argument('--frames', type=int, default=200, help='paints per case')
+    parser.add_argument('--new-frame-every', type=int, default=3,
+                        help='a new camera frame arrives every N paints (60 Hz paint, ~20 fps camera)')
+    args = parser.parse_args(argv)
+
+    destroyContext = createContext(_INT_VIEW_WIDTH, _INT_VIEW_HEIGHT)
+    print('GL_RENDERER:', glGetString(GL_RENDERER).decode())
+
+    for w, h in _LIST_RESOLUTIONS:
+        rng = np.random.default_rng(0)
+        pool = [rng.integers(0, 256, (h, w, 4), dtype=np.uint8) for _ in range(4)]
+        every = max(1, args.new_frame_every)
+
+        runCase('%dx%d glDrawPixels' % (w, h),
+                lambda i: drawPixelsLegacy(pool[(i // every) % 4], _INT_VIEW_WIDTH, _INT_VIEW_HEIGHT),
+                args.frames)
+
+        renderer = TextureRenderer()
+
+        def paintTexture(i):
+            seq = i // every
+            renderer.upload(pool[seq % 4], seq)
+            renderer.draw(_INT_VIEW_WIDTH, _INT_VIEW_HEIGHT)
+
+        runCase('%dx%d TextureRenderer (PBO)' % (w, h), paintTexture, args.frames)
+        print('%-40s %d uploads for %d paints' % ('', renderer.uploads, args.frames))
+        renderer.release()
+
+    destroyContext()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
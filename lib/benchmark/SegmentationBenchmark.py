@@ -0,0 +1,147 @@
+"""
+Extra per-frame cost of background blur / replacement with the segmentation mask:
+
+    python -m lib.benchmark.SegmentationBenchmark --resolutions 1280x720 1920x1080
+    LIBGL_ALWAYS_SOFTWARE=1 python -m lib.benchmark.SegmentationBenchmark --gl
+
+CPU cases, on frames with a full resolution float32 mask as MediaPipe returns it:
+  - 'copy + mask to alpha': maskToAlpha(), the only per-frame mask work of the GL path,
+  - 'float blend': the straightforward way, full resolution float mask and blur, blended in float32,
+  - 'blendLinear replace': the same blend as 'compositor replace' in one cv2.blendLinear pass with
+    float32 weights, the fused alternative to the compositor's uint8 passes,
+  - 'compositor blur' / 'compositor replace': SegmentationCompositor, the headless path.
+With --gl, TextureRenderer paints (upload and draw) without and with compositing in a headless
+context (see RendererBenchmark), so the GPU path's extra cost is measured in the same units.
+"""
+import sys
+import argparse
+
+import cv2
+import numpy as np
+
+from lib.core.SegmentationCompositor import SegmentationCompositor, maskToAlpha
+from lib.benchmark.HotPathBenchmark import measure, summarize, syntheticFrames
+
+_LIST_RESOLUTIONS = [(1280, 720), (1920, 1080)]
+_INT_FRAMES = 8
+_INT_NAIVE_BLUR_KERNEL = 41  # Full resolution blur matching the compositor's low resolution one
+
+
+def personMask(w, h):
+    # Float32 probabilities, soft edge, the shape of a person in the middle
+    mask = np.zeros((h, w), dtype=np.float32)
+    cv2.ellipse(mask, (w // 2, int(0.55 * h)), (int(0.16 * w), int(0.4 * h)), 0, 0, 360, 1.0, cv2.FILLED)
+    return cv2.GaussianBlur(mask, (21, 21), 0)
+
+
+def floatBlend(img, mask):
+    # Upscaled float mask, full resolution blur, float32 blend and conversion back
+    blurred = cv2.GaussianBlur(img, (_INT_NAIVE_BLUR_KERNEL, _INT_NAIVE_BLUR_KERNEL), 0)
+    alpha = mask[:, :, None]
+    return (img.astype(np.float32) * alpha + blurred.astype(np.float32) * (1.0 - alpha)).astype(np.uint8)
+
+
+def blendLinearInto(background, alpha, shape):
+    # One fused pass per frame: float32 weights scaled up from the low resolution alpha, then blendLinear
+    h, w = shape[:2]
+    back = cv2.resize(background, (w, h), interpolation=cv2.INTER_AREA)
+    small = np.empty(alpha.shape, dtype=np.float32)
+    weights = np.empty((h, w), dtype=np.float32)
+    inverse = np.empty((h, w), dtype=np.float32)
+
+    def composite(img):
+        cv2.multiply(alpha, 1.0, dst=small, scale=1 / 255, dtype=cv2.CV_32F)
+        cv2.resize(small, (w, h), dst=weights, interpolation=cv2.INTER_LINEAR)
+        cv2.subtract(1.0, weights, dst=inverse)
+        cv2.blendLinear(img, back, weights, inverse, dst=img)
+    return composite
+
+
+def cpuCases(frames, mask, background):
+    alpha = maskToAlpha(mask)
+    blur = SegmentationCompositor('blur')
+    replace = SegmentationCompositor('replace', background)
+    work = [f.copy() for f in frames]
+    n = len(frames)
+
+    def compositeInto(compositor):
+        def run(i):
+            np.copyto(work[i % n], frames[i % n])  # The compositor works in place
+            compositor.composite(work[i % n], alpha)
+        return run
+
+    def copyOnly(i):
+        np.copyto(work[i % n], frames[i % n])
+
+    fused = blendLinearInto(background, alpha, frames[0].shape)
+
+    def blendLinearReplace(i):
+        copyOnly(i)
+        fused(work[i % n])
+
+    return [('copy (baseline)', copyOnly),
+            ('copy + mask to alpha', lambda i: (copyOnly(i), maskToAlpha(mask, out=alpha))),
+            ('float blend', lambda i: floatBlend(frames[i % n], mask)),
+            ('compositor blur', compositeInto(blur)),
+            ('compositor replace', compositeInto(replace)),
+            ('blendLinear replace', blendLinearReplace)]
+
+
+def glCases(frames, mask, background, viewW, viewH):
+    from OpenGL.GL import glFinish
+    from lib.gui.TextureRenderer import TextureRenderer
+
+    alpha = maskToAlpha(mask)
+    cases = []
+    for name, mode in (('gl paint (baseline)', 'none'), ('gl paint blur', 'blur'), ('gl paint replace', 'replace')):
+        renderer = TextureRenderer()
+        renderer.setBackgroundMode(mode, background if mode == 'replace' else None)
+
+        def paint(i, renderer=renderer, mode=mode):
+            renderer.upload(frames[i % len(frames)], i)  # A new frame every paint
+            if mode != 'none':
+                renderer.setMask(maskToAlpha(mask, out=alpha))
+            renderer.draw(viewW, viewH)
+            glFinish()
+        cases.append((name, paint, renderer))
+    return cases
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark segmentation mask compositing.')
+    parser.add_argument('--resolutions', nargs='+', default=['%dx%d' % r for r in _LIST_RESOLUTIONS],
+                        help='WxH list (default: %(default)s)')
+    parser.add_argument('--iterations', type=int, default=100)
+    parser.add_argument('--gl', action='store_true', help='also measure the GL path in a headless context')
+    args = parser.parse_args(argv)
+
+    destroyContext = None
+    if args.gl:
+        from lib.benchmark.RendererBenchmark import createContext
+        destroyContext = createContext(1024, 768)
+
+    print('%-10s %-24s %9s %9s %12s' % ('size', 'case', 'p50 ms', 'p95 ms', 'extra ms'))
+    for resolution in args.resolutions:
+        w, h = (int(v) for v in resolution.lower().split('x'))
+        frames = syntheticFrames(w, h, _INT_FRAMES)
+        mask = personMask(w, h)
+        background = cv2.resize(frames[-1], (w // 2, h // 2))
+        groups = [[(name, fn, None) for name, fn in cpuCases(frames, mask, background)]]
+        if args.gl:
+            groups.append(glCases(frames, mask, background, 1024, 768))
+        for cases in groups:
+            baseline = None
+            for name, fn, renderer in cases:
+                r = summarize(measure(fn, args.iterations))
+                baseline = r['p50_ms'] if baseline is None else baseline
+                print('%-10s %-24s %9.3f %9.3f %12.3f' % (resolution, name, r['p50_ms'], r['p95_ms'],
+                                                          r['p50_ms'] - baseline))
+                if renderer is not None:
+                    renderer.release()
+    if destroyContext is not None:
+        destroyContext()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
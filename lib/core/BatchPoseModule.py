@@ -0,0 +1,281 @@
+"""
+Headless batch processing of many video files with one PoseDetector per worker process.
+
+    python -m lib.core.BatchPoseModule "archive/2023-*/*.mp4" archive/extra --output landmarks/
+
+For every video <dir>/<name>.<ext> it writes <output>/<name>-<hash>.landmarks.csv with one row per
+frame (frame index followed by x, y, z, visibility of the 33 MediaPipe landmarks, empty when no
+pose was found) and <output>/<name>-<hash>.progress.json. <hash> is taken from the absolute path
+of the video, so same-named videos of different directories never share output files. Re-running
+the same command continues every unfinished file from its last flushed frame and skips finished
+ones. A video that can not be read is reported as failed and the batch goes on with the others;
+the exit code is non-zero if any video failed.
+
+With --cache-dir, landmarks are also kept in an InferenceCache keyed by video content and detector
+settings; running again on the same videos and settings (e.g. into a fresh output directory)
+reads them back without decoding or inference.
+"""
+import os
+import sys
+import glob
+import json
+import hashlib
+import time
+import argparse
+import multiprocessing as mproc
+
+import cv2
+
+import lib.core.PoseModule as pm
+import lib.core.PoseBackends as pb
+from lib.core.InferenceCache import InferenceCache
+
+_LIST_VIDEO_EXTENSIONS = ['.mp4', '.avi', '.mov', '.mkv', '.m4v', '.webm']
+_INT_LANDMARKS = 33
+_INT_FLUSH_EVERY = 100  # Frames between progress checkpoints
+_INT_NAME_HASH = 8  # Hex digits of the path hash in output names
+
+_detector = None  # One PoseDetector per worker process, created by _initWorker
+_cache = None  # InferenceCache of the worker process, None without --cache-dir
+
+
+def findVideos(inputs):
+    """
+    Expand directories and glob patterns to a sorted list of video files.
+    :param inputs: list of files, directories or glob patterns
+    :return: list of paths
+    """
+    videos = set()
+    for item in inputs:
+        if os.path.isdir(item):
+            candidates = glob.glob(os.path.join(item, '**', '*'), recursive=True)
+        else:
+            candidates = glob.glob(item, recursive=True)
+        for path in candidates:
+            if os.path.isfile(path) and os.path.splitext(path)[1].lower() in _LIST_VIDEO_EXTENSIONS:
+                videos.add(os.path.normpath(path))
+    return sorted(videos)
+
+
+def defaultWorkerCount(videoCount):
+    # MediaPipe runs a few threads of its own per graph, so leave one core for them and the OS
+    cpuCount = os.cpu_count() or 1
+    return max(1, min(videoCount, cpuCount - 1))
+
+
+def outputName(videoPath):
+    """
+    :return: '<name>-<hash>', unique per video file: <hash> is taken from its absolute path
+    """
+    name = os.path.splitext(os.path.basename(videoPath))[0]
+    digest = hashlib.sha1(os.path.abspath(videoPath).encode('utf-8')).hexdigest()[:_INT_NAME_HASH]
+    return '%s-%s' % (name, digest)
+
+
+def outputPaths(videoPath, outputDir):
+    name = outputName(videoPath)
+    return (os.path.join(outputDir, name + '.landmarks.csv'),
+            os.path.join(outputDir, name + '.progress.json'))
+
+
+def readProgress(progressPath):
+    if not os.path.exists(progressPath):
+        return {'frame': 0, 'bytes': 0, 'done': False}
+    with open(progressPath, 'r') as f:
+        return json.load(f)
+
+
+def writeProgress(progressPath, progress):
+    tmpPath = progressPath + '.tmp'
+    with open(tmpPath, 'w') as f:
+        json.dump(progress, f)
+    os.replace(tmpPath, progressPath)  # Atomic, a crash never leaves a half written progress file
+
+
+def csvHeader():
+    columns = ['frame']
+    for i in range(_INT_LANDMARKS):
+        columns += ['x%d' % i, 'y%d' % i, 'z%d' % i, 'v%d' % i]
+    return ','.join(columns) + '\n'
+
+
+def landmarksToCsvRow(frameIndex, lmNormalized):
+    if lmNormalized is None:
+        return '%d\n' % frameIndex
+    return '%d,%s\n' % (frameIndex, ','.join('%.6f' % v for v in lmNormalized.ravel()))
+
+
+def _initWorker(detectorKwargs, cacheDir=None, cacheBytes=None):
+    global _detector, _cache
+    _detector = pm.PoseDetector(**detectorKwargs)
+    if cacheDir is not None:
+        _cache = InferenceCache(cacheDir, maxBytes=cacheBytes)
+
+
+def _emptyStats(videoPath):
+    return {'video': videoPath, 'frames': 0, 'seconds': 0.0, 'pid': os.getpid(), 'skipped': False,
+            'failed': False, 'error': None, 'cacheHits': 0, 'cacheMisses': 0, 'cacheEvictions': 0}
+
+
+def processVideo(videoPath, outputDir):
+    """
+    Run the worker's PoseDetector over one video, appending landmarks from the last checkpoint.
+    :return: dict with the file, frames processed in this run, seconds spent and the worker pid
+    """
+    csvPath, progressPath = outputPaths(videoPath, outputDir)
+    progress = readProgress(progressPath)
+    stats = _emptyStats(videoPath)
+    if progress['done']:
+        stats['skipped'] = True
+        return stats
+
+    cap = cv2.VideoCapture(videoPath)
+    if not cap.isOpened():
+        raise IOError('Could not open video: ' + videoPath)
+
+    # Drop anything written after the last checkpoint, then continue from that frame
+    mode = 'r+b' if os.path.exists(csvPath) and progress['bytes'] > 0 else 'wb'
+    f = open(csvPath, mode)
+    if mode == 'wb':
+        f.write(csvHeader().encode())
+    else:
+        f.seek(progress['bytes'])
+        f.truncate()
+        cap.set(cv2.CAP_PROP_POS_FRAMES, progress['frame'])
+
+    _detector.MediaPipe_resetTracking()  # Tracking state must not leak from the previous video
+    frameIndex = progress['frame']
+    start = time.perf_counter()
+    entry = None
+    if _cache is not None:
+        before = _cache.stats()
+        entry = _cache.open(videoPath, _detector.backendName, _detector.inferenceParams(),
+                            fps=cap.get(cv2.CAP_PROP_FPS))
+    finished = False
+    try:
+        if entry is not None and entry.complete:
+            # Cached: no decoding, no inference
+            for frameIndex in range(frameIndex, len(entry)):
+                _, lmNormalized = entry.lookup(frameIndex)
+                f.write(landmarksToCsvRow(frameIndex, lmNormalized).encode())
+                stats['frames'] += 1
+            frameIndex = len(entry)
+        else:
+            while True:
+                success, img = cap.read()
+                if not success:
+                    break
+                _detector.MediaPipe_findPose(img, draw=False)
+                found = len(_detector.MediaPipe_findPosition(img, draw=False)) != 0
+                lmNormalized = _detector.lmNormalized if found else None
+                f.write(landmarksToCsvRow(frameIndex, lmNormalized).encode())
+                if entry is not None:
+                    entry.store(frameIndex, lmNormalized, img.shape[1], img.shape[0])
+                frameIndex += 1
+                stats['frames'] += 1
+                if frameIndex % _INT_FLUSH_EVERY == 0:
+                    f.flush()
+                    writeProgress(progressPath, {'frame': frameIndex, 'bytes': f.tell(), 'done': False})
+        f.flush()
+        writeProgress(progressPath, {'frame': frameIndex, 'bytes': f.tell(), 'done': True})
+        finished = True
+    finally:
+        if entry is not None:
+            entry.close(complete=finished)
+            after = _cache.stats()
+            for name, statsName in (('hits', 'cacheHits'), ('misses', 'cacheMisses'),
+                                    ('evictions', 'cacheEvictions')):
+                stats[statsName] = after[name] - before[name]
+        f.close()
+        cap.release()
+    stats['seconds'] = time.perf_counter() - start
+    return stats
+
+
+def _processVideoStar(args):
+    # One unreadable file must not take the pool and the rest of the batch down with it
+    try:
+        return processVideo(*args)
+    except (OSError, ValueError, RuntimeError, cv2.error) as e:
+        stats = _emptyStats(args[0])
+        stats['failed'] = True
+        stats['error'] = '%s: %s' % (type(e).__name__, e)
+        return stats
+
+
+def printSummary(allStats, wallSeconds):
+    perWorker = {}
+    for stats in allStats:
+        frames, seconds = perWorker.get(stats['pid'], (0, 0.0))
+        perWorker[stats['pid']] = (frames + stats['frames'], seconds + stats['seconds'])
+
+    print('\n----- Throughput -----')
+    for pid, (frames, seconds) in sorted(perWorker.items()):
+        fps = frames / seconds if seconds > 0 else 0.0
+        print('worker %-8d %10d frames %10.1f s %10.1f frames/s' % (pid, frames, seconds, fps))
+    totalFrames = sum(stats['frames'] for stats in allStats)
+    fps = totalFrames / wallSeconds if wallSeconds > 0 else 0.0
+    print('aggregate     %10d frames %10.1f s %10.1f frames/s (wall clock)' % (totalFrames, wallSeconds, fps))
+
+    hits = sum(stats['cacheHits'] for stats in allStats)
+    misses = sum(stats['cacheMisses'] for stats in allStats)
+    if hits or misses:
+        print('cache         %10d hits %11d misses %5.1f%% hit rate, %d evictions' % (
+            hits, misses, 100.0 * hits / (hits + misses), sum(stats['cacheEvictions'] for stats in allStats)))
+
+    failed = [stats for stats in allStats if stats['failed']]
+    if failed:
+        print('\n----- Failed (%d of %d videos) -----' % (len(failed), len(allStats)))
+        for stats in sorted(failed, key=lambda s: s['video']):
+            print('%s: %s' % (stats['video'], stats['error']))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Extract MediaPipe pose landmarks from many videos.')
+    parser.add_argument('inputs', nargs='+', help='video files, directories or glob patterns')
+    parser.add_argument('--output', '-o', required=True, help='output directory for the landmark files')
+    parser.add_argument('--workers', '-j', type=int, default=None,
+                        help='worker processes (default: cpu count - 1, at most one per video)')
+    parser.add_argument('--backend', default='mediapipe', choices=pb.availableBackends(),
+                        help='landmark backend ("stub" needs no model, useful to test the pipeline)')
+    parser.add_argument('--model-complexity', type=int, default=1, choices=[0, 1, 2])
+    parser.add_argument('--min-detection-confidence', type=float, default=0.5)
+    parser.add_argument('--min-tracking-confidence', type=float, default=0.5)
+    parser.add_argument('--cache-dir', help='inference cache directory, re-runs with the same settings skip inference')
+    parser.add_argument('--cache-size', type=int, default=2048, help='inference cache size limit in MB (LRU eviction)')
+    args = parser.parse_args(argv)
+
+    videos = findVideos(args.inputs)
+    if not videos:
+        print('No videos found.', file=sys.stderr)
+        return 1
+    os.makedirs(args.output, exist_ok=True)
+
+    workers = args.workers if args.workers else defaultWorkerCount(len(videos))
+    detectorKwargs = {'backend': args.backend,
+                      'model_complexity': args.model_complexity,
+                      'min_detection_confidence': args.min_detection_confidence,
+                      'min_tracking_confidence': args.min_tracking_confidence}
+    print('%d videos, %d workers' % (len(videos), workers))
+
+    allStats = []
+    start = time.perf_counter()
+    initArgs = (detectorKwargs, args.cache_dir, args.cache_size << 20)
+    with mproc.Pool(workers, initializer=_initWorker, initargs=initArgs) as pool:
+        jobs = [(video, args.output) for video in videos]
+        for stats in pool.imap_unordered(_processVideoStar, jobs, chunksize=1):
+            allStats.append(stats)
+            if stats['failed']:
+                print('[%d/%d] %s failed: %s' % (len(allStats), len(videos), stats['video'], stats['error']),
+                      file=sys.stderr)
+            elif stats['skipped']:
+                print('[%d/%d] %s already done' % (len(allStats), len(videos), stats['video']))
+            else:
+                print('[%d/%d] %s: %d frames in %.1f s' % (len(allStats), len(videos), stats['video'],
+                                                          stats['frames'], stats['seconds']))
+    printSummary(allStats, time.perf_counter() - start)
+    return 1 if any(stats['failed'] for stats in allStats) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,293 @@
+"""
+Pose landmarks of one long video with several worker processes: the video is split into chunks
+that are decoded and processed concurrently, each with its own PoseDetector, and the landmark
+streams are stitched back in frame order.
+
+    python -m lib.core.ChunkedVideoModule recording.mp4 --output landmarks/ --workers 4
+    python -m lib.core.ChunkedVideoModule recording.mp4 --output landmarks/ --compare-serial
+
+Each chunk starts decoding --warm-up frames before its first kept frame, so MediaPipe's tracking
+and landmark smoothing have settled when output starts; those frames are processed and dropped.
+Chunk starts are multiples of --align frames: with the keyframe interval of the video (e.g. 250
+for a typical H.264 GOP) every seek lands on a keyframe and costs no extra decoding.
+
+Chunk results go to <output>/<name>-<hash>.chunkNNN.plm (LandmarkRecording) as they finish, so a re-run
+only redoes the missing chunks; the stitched result is <output>/<name>-<hash>.landmarks.csv in the format
+of BatchPoseModule. The report gives per chunk throughput, the wall clock speedup and the
+accuracy at every chunk boundary: each chunk but the last runs --check frames past its end,
+those landmarks (found with fully settled tracking) are compared with the first frames the next
+chunk keeps. --compare-serial also runs the plain frame by frame loop and compares the whole
+stream with it.
+"""
+import os
+import sys
+import time
+import argparse
+import multiprocessing as mproc
+
+import cv2
+import numpy as np
+
+import lib.core.PoseModule as pm
+import lib.core.PoseBackends as pb
+from lib.core.LandmarkRecording import LandmarkRecorder, LandmarkReader
+from lib.core.BatchPoseModule import outputName, outputPaths, csvHeader, landmarksToCsvRow
+
+_INT_WARM_UP = 30  # Frames decoded before each chunk to let tracking settle
+_INT_CHECK = 10  # Frames each chunk runs past its end to measure the boundary error
+_INT_LANDMARKS = 33
+_INT_VISIBLE_CHANNEL = 3
+_FLOAT_VISIBILITY = 0.5  # Landmarks compared at boundaries must be at least this visible in both streams
+
+_detector = None  # One PoseDetector per worker process, created by _initWorker
+
+
+def planChunks(frameCount, chunkCount, warmUp=_INT_WARM_UP, align=1):
+    """
+    :param frameCount: frames in the video (CAP_PROP_FRAME_COUNT, may be approximate: the last chunk reads to the end)
+    :param chunkCount: chunks wanted, fewer are made for short videos
+    :param warmUp: frames to decode before the first kept frame of a chunk
+    :param align: chunk and decoding starts are multiples of it
+    :return: [(index, decodeStart, start, end)], end None for the last chunk
+    """
+    align = max(1, align)
+    bounds = sorted({(round(i * frameCount / chunkCount) // align) * align for i in range(max(1, chunkCount))})
+    chunks = []
+    for i, start in enumerate(bounds):
+        end = bounds[i + 1] if i + 1 < len(bounds) else None
+        decodeStart = (max(0, start - warmUp) // align) * align
+        chunks.append((i, decodeStart, start, end))
+    return chunks
+
+
+def chunkPath(videoPath, outputDir, index):
+    return os.path.join(outputDir, '%s.chunk%03d.plm' % (outputName(videoPath), index))
+
+
+def openAt(videoPath, frameIndex):
+    """
+    Open a video positioned on frameIndex. Falls back to decoding from the start when the
+    container does not seek exactly.
+    :return: cv2.VideoCapture
+    """
+    cap = cv2.VideoCapture(videoPath)
+    if not cap.isOpened():
+        raise IOError('Could not open video: ' + videoPath)
+    if frameIndex > 0:
+        cap.set(cv2.CAP_PROP_POS_FRAMES, frameIndex)
+        if int(cap.get(cv2.CAP_PROP_POS_FRAMES)) != frameIndex:
+            cap.release()
+            cap = cv2.VideoCapture(videoPath)
+            for _ in range(frameIndex):
+                if not cap.grab():
+                    break
+    return cap
+
+
+def _initWorker(detectorKwargs):
+    global _detector
+    _detector = pm.PoseDetector(**detectorKwargs)
+
+
+def processChunk(videoPath, chunk, outputPath=None, check=_INT_CHECK):
+    """
+    Run the worker's PoseDetector over one chunk.
+    :param chunk: (index, decodeStart, start, end) from planChunks
+    :param outputPath: LandmarkRecording of the kept frames, written through a temporary file; None keeps them in memory
+    :param check: frames to run past end, returned for the boundary comparison
+    :return: dict with index, frames, warmUpFrames, seconds, pid, check (landmarks (n, 33, 4), found (n,)),
+             and landmarks / found of the kept frames when outputPath is None
+    """
+    index, decodeStart, start, end = chunk
+    stats = {'index': index, 'frames': 0, 'warmUpFrames': 0, 'seconds': 0.0, 'pid': os.getpid()}
+    begin = time.perf_counter()
+    cap = openAt(videoPath, decodeStart)
+    fps = cap.get(cv2.CAP_PROP_FPS) or 30.0
+    _detector.MediaPipe_resetTracking()  # Nothing may leak from the previous chunk of this worker
+    recorder = None
+    kept, keptFound = [], []
+    checkLm, checkFound = [], []
+    stop = None if end is None else end + check
+    frameIndex = decodeStart
+    try:
+        while stop is None or frameIndex < stop:
+            success, img = cap.read()
+            if not success:
+                break
+            _detector.MediaPipe_findPose(img, draw=False)
+            found = len(_detector.MediaPipe_findPosition(img, draw=False)) != 0
+            lmNormalized = _detector.lmNormalized
+            if frameIndex < start:
+                stats['warmUpFrames'] += 1
+            elif end is None or frameIndex < end:
+                if outputPath is not None:
+                    if recorder is None:
+                        recorder = LandmarkRecorder(outputPath + '.tmp', width=img.shape[1], height=img.shape[0])
+                    recorder.append(lmNormalized if found else None, frameIndex / fps)
+                else:
+                    kept.append(lmNormalized.copy())
+                    keptFound.append(found)
+                stats['frames'] += 1
+            else:
+                checkLm.append(lmNormalized.copy())
+                checkFound.append(found)
+            frameIndex += 1
+    finally:
+        cap.release()
+        if recorder is not None:
+            recorder.close()
+    if outputPath is not None:
+        if recorder is None:
+            LandmarkRecorder(outputPath + '.tmp').close()  # Empty chunk (past the real end of the video)
+        os.replace(outputPath + '.tmp', outputPath)
+    else:
+        stats['landmarks'] = np.array(kept, dtype=np.float32).reshape(-1, _INT_LANDMARKS, 4)
+        stats['found'] = np.array(keptFound, dtype=bool)
+    stats['check'] = (np.array(checkLm, dtype=np.float32).reshape(-1, _INT_LANDMARKS, 4),
+                      np.array(checkFound, dtype=bool))
+    stats['seconds'] = time.perf_counter() - begin
+    return stats
+
+
+def _processChunkStar(args):
+    return processChunk(*args)
+
+
+def compareLandmarks(a, aFound, b, bFound, width, height):
+    """
+    Difference between two landmark streams of the same frames.
+    :return: dict with frames, agreement (share of frames where both or neither found a pose),
+             mean_px / max_px error over landmarks visible in both (None if there were none)
+    """
+    n = min(len(a), len(b))
+    if n == 0:
+        return {'frames': 0, 'agreement': None, 'mean_px': None, 'max_px': None}
+    a, b, aFound, bFound = a[:n], b[:n], aFound[:n], bFound[:n]
+    both = aFound & bFound
+    visible = (a[:, :, _INT_VISIBLE_CHANNEL] >= _FLOAT_VISIBILITY) & (b[:, :, _INT_VISIBLE_CHANNEL] >= _FLOAT_VISIBILITY)
+    visible &= both[:, None]
+    delta = (a[:, :, :2] - b[:, :, :2]) * np.array([width, height], dtype=np.float32)
+    errors = np.hypot(delta[:, :, 0], delta[:, :, 1])[visible]
+    return {'frames': n, 'agreement': float((aFound == bFound).mean()),
+            'mean_px': float(errors.mean()) if errors.size else None,
+            'max_px': float(errors.max()) if errors.size else None}
+
+
+def stitch(videoPath, outputDir, chunks, csvPath):
+    """
+    Concatenate the chunk recordings in frame order into the landmark CSV.
+    :return: (landmarks (n, 33, 4), found (n,), width, height) of the whole video
+    """
+    readers = [LandmarkReader(chunkPath(videoPath, outputDir, chunk[0])) for chunk in chunks]
+    try:
+        landmarks = np.concatenate([r.landmarks for r in readers]) if readers else np.zeros((0, _INT_LANDMARKS, 4))
+        found = np.concatenate([r.valid for r in readers]).astype(bool) if readers else np.zeros(0, dtype=bool)
+        width = max(r.width for r in readers) if readers else 0
+        height = max(r.height for r in readers) if readers else 0
+        landmarks = np.array(landmarks, dtype=np.float32)  # Copies out of the mappings before they close
+    finally:
+        for r in readers:
+            r.close()
+    tmpPath = csvPath + '.tmp'
+    with open(tmpPath, 'w') as f:
+        f.write(csvHeader())
+        for i in range(len(found)):
+            f.write(landmarksToCsvRow(i, landmarks[i] if found[i] else None))
+    os.replace(tmpPath, csvPath)
+    return landmarks, found, width, height
+
+
+def chunkIsDone(path):
+    return os.path.exists(path)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Extract pose landmarks of one long video with concurrent chunks.')
+    parser.add_argument('video')
+    parser.add_argument('--output', '-o', required=True, help='output directory')
+    parser.add_argument('--workers', '-j', type=int, default=None, help='worker processes (default: cpu count - 1)')
+    parser.add_argument('--chunks', type=int, default=None, help='chunks (default: 2 per worker, for load balancing)')
+    parser.add_argument('--warm-up', type=int, default=_INT_WARM_UP, help='frames decoded and dropped before each chunk')
+    parser.add_argument('--align', type=int, default=1, help='chunk starts are multiples of this (keyframe interval)')
+    parser.add_argument('--check', type=int, default=_INT_CHECK, help='frames compared at each chunk boundary')
+    parser.add_argument('--compare-serial', action='store_true', help='also run the serial loop, report speedup and error')
+    parser.add_argument('--backend', default='mediapipe', choices=pb.availableBackends())
+    parser.add_argument('--model-complexity', type=int, default=1, choices=[0, 1, 2])
+    args = parser.parse_args(argv)
+
+    cap = cv2.VideoCapture(args.video)
+    if not cap.isOpened():
+        print('Could not open video: ' + args.video, file=sys.stderr)
+        return 1
+    frameCount = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+    cap.release()
+    os.makedirs(args.output, exist_ok=True)
+
+    workers = args.workers if args.workers else max(1, (os.cpu_count() or 1) - 1)
+    chunks = planChunks(frameCount, args.chunks or 2 * workers, args.warm_up, args.align)
+    detectorKwargs = {'backend': args.backend, 'model_complexity': args.model_complexity}
+    csvPath, _ = outputPaths(args.video, args.output)
+    print('%s: %d frames, %d chunks, %d workers, %d warm-up frames' % (args.video, frameCount, len(chunks), workers,
+                                                                       args.warm_up))
+
+    jobs = [(args.video, chunk, chunkPath(args.video, args.output, chunk[0]), args.check) for chunk in chunks
+            if not chunkIsDone(chunkPath(args.video, args.output, chunk[0]))]
+    results = {}
+    start = time.perf_counter()
+    if jobs:
+        with mproc.Pool(min(workers, len(jobs)), initializer=_initWorker, initargs=(detectorKwargs,)) as pool:
+            for stats in pool.imap_unordered(_processChunkStar, jobs, chunksize=1):
+                results[stats['index']] = stats
+                print('chunk %3d: %6d frames (+%d warm-up) in %6.1f s, %6.1f frames/s' % (
+                    stats['index'], stats['frames'], stats['warmUpFrames'], stats['seconds'],
+                    (stats['frames'] + stats['warmUpFrames']) / max(stats['seconds'], 1e-9)))
+    landmarks, found, width, height = stitch(args.video, args.output, chunks, csvPath)
+    parallelSeconds = time.perf_counter() - start
+    for chunk in chunks:
+        os.remove(chunkPath(args.video, args.output, chunk[0]))
+
+    print('\n----- Throughput -----')
+    print('chunked       %10d frames %10.1f s %10.1f frames/s (wall clock, %d chunks resumed)' % (
+        len(found), parallelSeconds, len(found) / max(parallelSeconds, 1e-9), len(chunks) - len(jobs)))
+    warmUpFrames = sum(stats['warmUpFrames'] for stats in results.values())
+    print('overhead      %10d warm-up frames (%.1f%% extra inference)' % (warmUpFrames,
+                                                                         100.0 * warmUpFrames / max(len(found), 1)))
+
+    print('\n----- Chunk boundaries (next chunk vs. previous chunk run on) -----')
+    for chunk in chunks[1:]:
+        previous = results.get(chunk[0] - 1)
+        if previous is None:
+            continue  # Resumed, no check frames
+        checkLm, checkFound = previous['check']
+        first = chunk[2]
+        r = compareLandmarks(landmarks[first:first + len(checkLm)], found[first:first + len(checkLm)],
+                             checkLm, checkFound, width, height)
+        print('frame %8d: %3d frames, detection agreement %s, error mean %s px, max %s px' % (
+            first, r['frames'], _fmt(r['agreement'], '%.2f'), _fmt(r['mean_px']), _fmt(r['max_px'])))
+
+    if args.compare_serial:
+        _initWorker(detectorKwargs)
+        serial = processChunk(args.video, (0, 0, 0, None), None, 0)
+        print('\n----- Serial loop -----')
+        print('serial        %10d frames %10.1f s %10.1f frames/s' % (serial['frames'], serial['seconds'],
+                                                                    serial['frames'] / max(serial['seconds'], 1e-9)))
+        print('speedup       %10.2fx' % (serial['seconds'] / max(parallelSeconds, 1e-9)))
+        r = compareLandmarks(landmarks, found, serial['landmarks'], serial['found'], width, height)
+        print('whole video:  detection agreement %s, error mean %s px, max %s px' % (
+            _fmt(r['agreement'], '%.3f'), _fmt(r['mean_px']), _fmt(r['max_px'])))
+        for chunk in chunks[1:]:
+            first = chunk[2]
+            window = slice(first, first + max(args.check, 1))
+            r = compareLandmarks(landmarks[window], found[window], serial['landmarks'][window],
+                                 serial['found'][window], width, height)
+            print('frame %8d: detection agreement %s, error mean %s px, max %s px' % (
+                first, _fmt(r['agreement'], '%.2f'), _fmt(r['mean_px']), _fmt(r['max_px'])))
+    return 0
+
+
+def _fmt(value, fmt='%.2f'):
+    return 'n/a' if value is None else fmt % value
+
+
+if __name__ == "__main__":
+    sys.exit(main())
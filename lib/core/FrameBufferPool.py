@@ -0,0 +1,56 @@
+import threading
+
+import numpy as np
+
+_INT_POOL_SIZE = 5  # Frames in flight: being read, capture queue, in inference, render queue, shown
+
+
+class FrameBufferPool:
+    """
+    Preallocated frame buffers of one shape, reused instead of allocating a full-size image per frame.
+
+    acquire() hands out a free buffer and release() returns it, so a buffer is never overwritten
+    while a later pipeline stage still holds it (a plain ring would overwrite the frame the
+    inference worker is busy with once capture runs count frames ahead). If all buffers are in
+    use acquire() allocates one more instead of blocking; 'allocations' counts every buffer
+    created, it stays at the pool size in the steady state.
+    """
+    def __init__(self, count=_INT_POOL_SIZE):
+        self.count = count
+        self.shape = None
+        self.dtype = None
+        self.allocations = 0
+        self._free = []
+        self._lock = threading.Lock()
+
+    def acquire(self, shape, dtype=np.uint8):
+        """
+        :return: a buffer of the given shape, contents undefined
+        """
+        shape = tuple(shape)
+        dtype = np.dtype(dtype)
+        with self._lock:
+            if shape != self.shape or dtype != self.dtype:
+                # New frame size: drop the old buffers and preallocate the ring for the new one
+                self.shape = shape
+                self.dtype = dtype
+                self._free = [np.empty(shape, dtype) for _ in range(self.count - 1)]
+                self.allocations += self.count - 1
+            elif self._free:
+                return self._free.pop()
+            self.allocations += 1
+        return np.empty(shape, dtype)
+
+    def release(self, buffer):
+        """
+        Give a buffer back. Buffers of another shape, or beyond the pool size, are left to the GC.
+        """
+        if buffer is None:
+            return
+        with self._lock:
+            if buffer.shape == self.shape and buffer.dtype == self.dtype and len(self._free) < self.count:
+                self._free.append(buffer)
+
+    def free(self):
+        with self._lock:
+            return len(self._free)
@@ -0,0 +1,215 @@
+import threading
+import time
+
+import lib.core.StageMetrics as sm
+from lib.core.FrameBufferPool import FrameBufferPool
+
+_FLOAT_QUEUE_TIMEOUT = 0.1  # Seconds a stage waits for input before re-checking its stop flag
+_FLOAT_MAX_FRAME_AGE = 0.5  # Frames older than this (in seconds) are dropped before inference
+
+
+class Frame:
+    def __init__(self, seq, timestamp, image):
+        self.seq = seq  # Monotonic sequence number given by the capture stage
+        self.timestamp = timestamp  # time.monotonic() at capture
+        self.image = image  # Raw frame from capture, replaced by the finished frame after inference
+        self.landmarks = None  # Landmarks found by the inference stage
+        self.mask = None  # Low resolution uint8 person alpha, when segmentation compositing is on
+        self.overlay = None  # PoseOverlay drawn by the renderer over the frame, when not drawn into it
+        self.world = None  # (33, 4) world landmarks, when the 3D view is shown
+        self.fps = 0.0  # Finished frames per second at the moment this frame was finished
+        self._pool = None  # FrameBufferPool the image came from, see release()
+
+    def age(self):
+        return time.monotonic() - self.timestamp
+
+    def release(self):
+        """
+        Give the image buffer back to its pool. Call once the frame is dropped or no longer shown,
+        the image must not be used afterwards.
+        """
+        if self._pool is not None:
+            self._pool.release(self.image)
+            self._pool = None
+
+
+class LatestFrameQueue:
+    """
+    A bounded queue between two pipeline stages. When the queue is full, put() drops
+    the oldest frame instead of blocking, so the consumer always sees the newest frames.
+    """
+    def __init__(self, maxsize=1):
+        self._maxsize = max(1, maxsize)
+        self._frames = []
+        self._cond = threading.Condition()
+        self.dropped = 0  # Number of frames replaced before anyone consumed them
+
+    def put(self, frame: Frame):
+        with self._cond:
+            if len(self._frames) >= self._maxsize:
+                self._frames.pop(0).release()
+                self.dropped += 1
+            self._frames.append(frame)
+            self._cond.notify()
+
+    def get(self, timeout=None):
+        """
+        Wait for a frame and return it.
+        :param timeout: seconds to wait (None waits forever)
+        :return: the oldest queued frame or None on timeout
+        """
+        with self._cond:
+            if not self._frames:
+                self._cond.wait(timeout)
+            if not self._frames:
+                return None
+            return self._frames.pop(0)
+
+    def getLatest(self):
+        """
+        Non-blocking. Drop everything but the newest frame and return it.
+        :return: the newest frame or None if the queue is empty
+        """
+        with self._cond:
+            if not self._frames:
+                return None
+            self.dropped += len(self._frames) - 1
+            for old in self._frames[:-1]:
+                old.release()
+            frame = self._frames[-1]
+            self._frames = []
+            return frame
+
+    def clear(self):
+        with self._cond:
+            for frame in self._frames:
+                frame.release()
+            self._frames = []
+
+
+class CaptureThread(threading.Thread):
+    def __init__(self, videoCapture, outQueue: LatestFrameQueue, metrics=sm.DISABLED, pool=None):
+        super().__init__(daemon=True)
+        self.videoCapture = videoCapture
+        self.outQueue = outQueue
+        self.metrics = metrics
+        self.pool = pool  # FrameBufferPool decoded into with read(image=...), None: read() allocates
+        self._stopEvent = threading.Event()
+        self._seq = 0
+        self._shape = None  # Frame shape seen last, the pool buffers are allocated for it
+
+    def run(self):
+        while not self._stopEvent.is_set():
+            buffer = self.pool.acquire(self._shape) if self.pool is not None and self._shape else None
+            t0 = self.metrics.start()
+            ret, img = self.videoCapture.read(image=buffer)
+            timestamp = time.monotonic()
+            self.metrics.stop('capture', t0)
+            if not ret or img is None:
+                if self.pool is not None:
+                    self.pool.release(buffer)
+                # A video file reached its end or the camera dropped out.
+                # Wait a little instead of spinning on read().
+                self._stopEvent.wait(_FLOAT_QUEUE_TIMEOUT)
+                continue
+            self._seq += 1
+            frame = Frame(self._seq, timestamp, img)
+            if self.pool is not None:
+                if img is not buffer:
+                    # First frame or a new frame size: read() allocated, the pool follows the new shape
+                    self._shape = img.shape
+                    self.pool.release(buffer)
+                frame._pool = self.pool
+            self.outQueue.put(frame)
+
+    def stop(self):
+        self._stopEvent.set()
+
+
+class InferenceWorker(threading.Thread):
+    def __init__(self, inQueue: LatestFrameQueue, outQueue: LatestFrameQueue, processFrame,
+                 maxFrameAge=_FLOAT_MAX_FRAME_AGE):
+        super().__init__(daemon=True)
+        self.inQueue = inQueue
+        self.outQueue = outQueue
+        self.processFrame = processFrame  # Callable(frame: Frame) -> None, fills frame.image/landmarks
+        self.maxFrameAge = maxFrameAge
+        self.staleDropped = 0  # Frames dropped because they were too old or out of order
+        self._stopEvent = threading.Event()
+        self._lastSeq = 0
+        self._pTime = 0
+
+    def run(self):
+        while not self._stopEvent.is_set():
+            frame = self.inQueue.get(timeout=_FLOAT_QUEUE_TIMEOUT)
+            if frame is None:
+                continue
+            if frame.seq <= self._lastSeq or \
+                    (self.maxFrameAge is not None and frame.age() > self.maxFrameAge):
+                frame.release()
+                self.staleDropped += 1
+                continue
+            self._lastSeq = frame.seq
+
+            cTime = time.monotonic()
+            if self._pTime:
+                frame.fps = 1 / max(cTime - self._pTime, 1e-6)
+            self._pTime = cTime
+
+            self.processFrame(frame)
+            self.outQueue.put(frame)
+
+    def stop(self):
+        self._stopEvent.set()
+
+
+class FramePipeline:
+    """
+    capture thread -> [latest-frame queue] -> inference worker -> [latest-frame queue] -> render
+
+    The render stage is whoever calls getLatestFrame() (e.g. OpenGLWidget.paintGL). It only
+    ever sees the newest finished frame, so a slow detector lowers the pose rate but never
+    the responsiveness of the caller.
+
+    Frames are decoded into a FrameBufferPool. The render stage calls release() on a frame
+    once it shows a newer one; dropped frames are released by the pipeline.
+    """
+    def __init__(self, videoCapture, processFrame, queueSize=1, maxFrameAge=_FLOAT_MAX_FRAME_AGE,
+                 metrics=sm.DISABLED):
+        self.captureQueue = LatestFrameQueue(queueSize)
+        self.renderQueue = LatestFrameQueue(queueSize)
+        # Every frame in flight holds a buffer: one per queue slot, plus read, inference and render
+        self.bufferPool = FrameBufferPool(2 * queueSize + 3)
+        self.captureThread = CaptureThread(videoCapture, self.captureQueue, metrics, self.bufferPool)
+        self.inferenceWorker = InferenceWorker(self.captureQueue, self.renderQueue, processFrame,
+                                               maxFrameAge=maxFrameAge)
+        self._lastSeq = 0
+
+    def start(self):
+        self.captureThread.start()
+        self.inferenceWorker.start()
+
+    def stop(self):
+        self.captureThread.stop()
+        self.inferenceWorker.stop()
+        self.captureThread.join()
+        self.inferenceWorker.join()
+        self.captureQueue.clear()
+        self.renderQueue.clear()
+
+    def getLatestFrame(self):
+        """
+        Non-blocking. Return the newest finished frame if it is newer than the last one returned.
+        :return: Frame or None
+        """
+        frame = self.renderQueue.getLatest()
+        if frame is None:
+            return None
+        if frame.seq <= self._lastSeq:
+            frame.release()
+            return None
+        self._lastSeq = frame.seq
+        return frame
+
+    def droppedFrames(self):
+        return self.captureQueue.dropped + self.renderQueue.dropped + self.inferenceWorker.staleDropped
@@ -0,0 +1,210 @@
+"""
+On-disk cache of per-frame pose inference results for repeated offline runs.
+
+An entry holds the landmarks of every frame of one video for one backend and one set of detector
+parameters. It is keyed by a hash of the video *content* (renaming or copying a file keeps its
+entry), the backend name and the parameters, so changing model_complexity or a confidence
+threshold is a miss while re-running downstream logic on the same settings skips inference.
+
+Entries are LandmarkRecording files (<key>.plm), so a complete entry can also be replayed with
+the 'replay' backend. Least recently used entries are evicted once the cache exceeds maxBytes;
+an entry's file modification time is its last use, so the order survives across processes.
+
+Several processes may share a cache directory (BatchPoseModule workers): every file is written
+under a temporary name and moved in place with os.replace, and no file is ever read, changed
+and written back, so there is nothing to lock.
+"""
+import os
+import json
+import hashlib
+import threading
+
+from lib.core.LandmarkRecording import LandmarkRecorder, LandmarkReader
+
+_INT_CACHE_VERSION = 1  # Part of every key, bump when cached results are no longer comparable
+_INT_HASH_CHUNK = 1 << 20  # Bytes read at a time when hashing a video
+_INT_MAX_BYTES = 2 << 30  # Default cache size limit
+_STR_ENTRY_EXTENSION = '.plm'
+_STR_HASH_DIR = 'video_hashes'  # One small file per (path, size, mtime) with the content hash of that video
+
+
+def videoContentHash(path):
+    """
+    :return: SHA-1 hex digest of the file content
+    """
+    h = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(_INT_HASH_CHUNK), b''):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+class CacheEntry:
+    """
+    The cached landmarks of one video. lookup() serves frames of a complete entry; a missing
+    entry is filled by store() calls in frame order and published by close(complete=True).
+    The cache's hits count the frames lookup() served, its misses the frames given to store().
+    """
+    def __init__(self, cache, key, path, fps):
+        self.cache = cache
+        self.key = key
+        self.path = path  # <key>.plm, usable as replayPath once complete
+        self.fps = fps
+        self.reader = LandmarkReader(path) if os.path.exists(path) else None
+        self.complete = self.reader is not None
+        self._recorder = None
+        self._tmpPath = None
+
+    def __len__(self):
+        return len(self.reader) if self.reader is not None else 0
+
+    def lookup(self, frameIndex):
+        """
+        :return: (hit, normalized landmarks view or None); a frame that is not there is counted as a
+                 miss by the store() of its inference result, not here
+        """
+        if self.reader is not None and frameIndex < len(self.reader):
+            self.cache.hits += 1
+            return True, self.reader.frame(frameIndex)[1]
+        return False, None
+
+    def store(self, frameIndex, lmNormalized, width=0, height=0):
+        """
+        Record the result of frame frameIndex. Frames must come in order from 0; a run that starts
+        elsewhere (e.g. resumed from a checkpoint) is not cached. Every call counts as a miss.
+        """
+        self.cache.misses += 1
+        if self.complete:
+            return
+        if self._recorder is None:
+            if frameIndex != 0 or self._tmpPath is not None:
+                self._tmpPath = ''  # Abandoned for this run
+                return
+            self._tmpPath = '%s.%d.tmp' % (self.path, os.getpid())
+            self._recorder = LandmarkRecorder(self._tmpPath, width=width, height=height)
+        if frameIndex != self._recorder.frameCount:
+            self._discard()
+            return
+        self._recorder.append(lmNormalized, frameIndex / self.fps)
+
+    def _discard(self):
+        if self._recorder is not None:
+            self._recorder.close()
+            self._recorder = None
+            os.remove(self._tmpPath)
+        self._tmpPath = ''
+
+    def close(self, complete=False):
+        """
+        :param complete: the stored frames cover the whole video, publish them as the entry
+        """
+        if self.reader is not None:
+            self.reader.close()
+            self.reader = None
+        if self._recorder is None:
+            return
+        if not complete:
+            self._discard()
+            return
+        self._recorder.close()
+        self._recorder = None
+        os.replace(self._tmpPath, self.path)  # Atomic, readers never see a half written entry
+        self.cache.stored += 1
+        self.cache.evict(keep=self.path)
+
+
+class InferenceCache:
+    def __init__(self, cacheDir, maxBytes=_INT_MAX_BYTES):
+        self.cacheDir = cacheDir
+        self.maxBytes = maxBytes
+        os.makedirs(cacheDir, exist_ok=True)
+        self.hits = 0  # Frames served from the cache
+        self.misses = 0  # Frames that needed inference
+        self.stored = 0  # Entries written
+        self.evictions = 0  # Entries removed to stay under maxBytes
+        self._hashDir = os.path.join(cacheDir, _STR_HASH_DIR)
+        os.makedirs(self._hashDir, exist_ok=True)
+
+    def videoHash(self, videoPath):
+        """
+        Content hash of a video, memoized by (path, size, mtime) so unchanged files are read once.
+        """
+        st = os.stat(videoPath)
+        stamp = '%s|%d|%d' % (os.path.abspath(videoPath), st.st_size, st.st_mtime_ns)
+        memoPath = os.path.join(self._hashDir, hashlib.sha1(stamp.encode('utf-8')).hexdigest())
+        try:
+            with open(memoPath, 'r') as f:
+                memo = f.read()
+            if len(memo) == hashlib.sha1().digest_size * 2:
+                return memo
+        except FileNotFoundError:
+            pass
+        # Two processes hashing the same new video write the same content, the last replace wins
+        memo = videoContentHash(videoPath)
+        tmpPath = '%s.%d.%d.tmp' % (memoPath, os.getpid(), threading.get_ident())
+        with open(tmpPath, 'w') as f:
+            f.write(memo)
+        os.replace(tmpPath, memoPath)
+        return memo
+
+    def key(self, videoHash, backend, params):
+        description = json.dumps({'version': _INT_CACHE_VERSION, 'video': videoHash, 'backend': backend,
+                                  'params': params}, sort_keys=True)
+        return hashlib.sha1(description.encode()).hexdigest()
+
+    def open(self, videoPath, backend, params, fps=30.0):
+        """
+        :param backend: backend name, e.g. PoseDetector.backendName
+        :param params: JSON-serializable detector parameters, e.g. PoseDetector.inferenceParams()
+        :param fps: frame rate for the entry's timestamps
+        :return: CacheEntry (entry.complete tells whether inference can be skipped)
+        """
+        key = self.key(self.videoHash(videoPath), backend, params)
+        path = os.path.join(self.cacheDir, key + _STR_ENTRY_EXTENSION)
+        if os.path.exists(path):
+            os.utime(path)  # Mark as most recently used
+        return CacheEntry(self, key, path, fps if fps and fps > 0 else 30.0)
+
+    def entries(self):
+        """
+        :return: [(last use, size in bytes, path)], least recently used first
+        """
+        entries = []
+        for name in os.listdir(self.cacheDir):
+            if not name.endswith(_STR_ENTRY_EXTENSION):
+                continue
+            path = os.path.join(self.cacheDir, name)
+            try:
+                st = os.stat(path)
+            except FileNotFoundError:
+                continue  # Evicted by another process
+            entries.append((st.st_mtime, st.st_size, path))
+        return sorted(entries)
+
+    def sizeBytes(self):
+        return sum(size for _, size, _ in self.entries())
+
+    def evict(self, keep=None):
+        """
+        Remove least recently used entries until the cache fits in maxBytes.
+        :param keep: path never removed (the entry just written)
+        """
+        entries = self.entries()
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in entries:
+            if total <= self.maxBytes:
+                break
+            if path == keep:
+                continue
+            try:
+                os.remove(path)
+                self.evictions += 1
+            except FileNotFoundError:
+                pass
+            total -= size
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {'hits': self.hits, 'misses': self.misses,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+                'stored': self.stored, 'evictions': self.evictions}
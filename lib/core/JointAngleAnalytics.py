@@ -0,0 +1,371 @@
+"""
+Joint angles over whole recordings, computed for every frame and every joint in batched NumPy
+passes instead of one MediaPipe_findAngle call per joint and frame.
+
+    python -m lib.core.JointAngleAnalytics session.plm --reps left_knee right_knee
+    python -m lib.core.JointAngleAnalytics landmarks/session.landmarks.csv --mode 3d --angles-csv angles.csv
+
+Landmarks are a (frames, 33, C) array (x, y[, z[, visibility]]) such as LandmarkReader.landmarks
+or a stack of MediaPipe_worldLandmarks(). Frames are processed in blocks of _INT_BLOCK, so
+memory stays bounded on memory-mapped recordings of any length, and every block feeds:
+  - AngleAggregator: count, min, max, mean, std and percentiles (from a fixed 0.1 degree histogram)
+    per joint, updated block by block,
+  - RepCounter: repetitions / cycles of one joint with hysteresis between a low and a high
+    threshold, carrying an unfinished rep over to the next block.
+2D angles are the interior angle in the image plane (pixels, so the aspect ratio is right);
+signed=True gives the 0-360 convention of MediaPipe_findAngle. 3D angles use x, y, z: pass world
+landmarks for metric angles; normalized landmarks work too (MediaPipe scales z roughly like x).
+"""
+import sys
+import argparse
+
+import numpy as np
+
+_INT_BLOCK = 65536  # Frames per batched pass
+_FLOAT_VISIBILITY = 0.5  # All three landmarks must be at least this visible, else the angle is NaN
+_FLOAT_HISTOGRAM_STEP = 0.1  # Degrees per histogram bin, percentiles are exact to half of it
+_TUPLE_PERCENTILES = (5, 50, 95)
+_FLOAT_REP_BAND = 0.3  # Automatic rep thresholds: this share of the p5-p95 range inside each end
+_INT_MAX_REP_FRAMES = 1800  # Longer excursions are not counted as reps (one minute at 30 fps)
+_FLOAT_FPS = 30.0
+
+# (first, vertex, last) MediaPipe landmark indices, the angle is measured at the vertex
+JOINTS = {
+    'left_elbow': (11, 13, 15),
+    'right_elbow': (12, 14, 16),
+    'left_shoulder': (13, 11, 23),
+    'right_shoulder': (14, 12, 24),
+    'left_wrist': (13, 15, 19),
+    'right_wrist': (14, 16, 20),
+    'left_hip': (11, 23, 25),
+    'right_hip': (12, 24, 26),
+    'left_knee': (23, 25, 27),
+    'right_knee': (24, 26, 28),
+    'left_ankle': (25, 27, 31),
+    'right_ankle': (26, 28, 32),
+}
+
+
+def jointTable(joints=None):
+    """
+    :param joints: {name: (p1, p2, p3)}, default JOINTS
+    :return: (names, (3, joints) int index array)
+    """
+    joints = JOINTS if joints is None else joints
+    names = list(joints)
+    return names, np.array([joints[name] for name in names], dtype=np.intp).T.reshape(3, len(names))
+
+
+def jointAngles(landmarks, joints=None, mode='2d', width=1.0, height=1.0, valid=None, signed=False,
+                minVisibility=_FLOAT_VISIBILITY, out=None):
+    """
+    All joint angles of a block of frames in one pass.
+    :param landmarks: (frames, landmarks, C) array, x, y, then z for 3D, then visibility if C >= 4
+    :param joints: {name: (p1, p2, p3)}, default JOINTS
+    :param mode: '2d' (x, y scaled by width and height) or '3d' (x, y, z as they are)
+    :param valid: optional (frames,) bool, frames without a pose give NaN
+    :param signed: 2D only, angle from p1 to p3 in [0, 360) like MediaPipe_findAngle instead of [0, 180]
+    :param out: (frames, joints) float32 array to write into
+    :return: (frames, joints) float32 degrees, NaN where a landmark is missing or not visible enough
+    """
+    if mode not in ('2d', '3d'):
+        raise ValueError('Unknown angle mode "%s", available: 2d, 3d' % mode)
+    _, idx = jointTable(joints)
+    landmarks = np.asarray(landmarks)
+    dims = 2 if mode == '2d' else 3
+    # Only the 3 x joints landmarks used are gathered: (frames, joints, dims) each
+    p1 = landmarks[:, idx[0], :dims].astype(np.float32)
+    p2 = landmarks[:, idx[1], :dims].astype(np.float32)
+    p3 = landmarks[:, idx[2], :dims].astype(np.float32)
+    a = np.subtract(p1, p2, out=p1)
+    b = np.subtract(p3, p2, out=p3)
+    if dims == 2 and (width != 1.0 or height != 1.0):
+        scale = np.array([width, height], dtype=np.float32)
+        a *= scale
+        b *= scale
+    dot = np.einsum('fjd,fjd->fj', a, b)
+    if dims == 2:
+        cross = a[:, :, 0] * b[:, :, 1] - a[:, :, 1] * b[:, :, 0]
+        if not signed:
+            np.abs(cross, out=cross)
+    else:
+        if signed:
+            raise ValueError('Signed angles are 2D only')
+        cross = np.linalg.norm(np.cross(a, b), axis=-1)
+    if out is None:
+        out = np.empty(dot.shape, dtype=np.float32)
+    np.arctan2(cross, dot, out=out)
+    np.degrees(out, out=out)
+    if signed:
+        np.mod(out, 360.0, out=out)
+    missing = np.zeros(out.shape, dtype=bool)
+    if landmarks.shape[2] >= 4:
+        visibility = landmarks[:, :, 3]
+        missing |= (visibility[:, idx] < minVisibility).any(axis=1)
+    if valid is not None:
+        missing |= ~np.asarray(valid, dtype=bool)[:, None]
+    out[missing] = np.nan
+    return out
+
+
+class AngleAggregator:
+    """
+    Streaming per-joint statistics of angles in [0, 360), NaN ignored.
+    :param names: joint names, one per column of the angle blocks
+    """
+    def __init__(self, names, percentiles=_TUPLE_PERCENTILES, step=_FLOAT_HISTOGRAM_STEP):
+        self.names = list(names)
+        self.percentiles = tuple(percentiles)
+        self.step = step
+        n = len(self.names)
+        self.bins = int(np.ceil(360.0 / step))
+        self.count = np.zeros(n, dtype=np.int64)
+        self.sum = np.zeros(n, dtype=np.float64)
+        self.sumSq = np.zeros(n, dtype=np.float64)
+        self.min = np.full(n, np.inf)
+        self.max = np.full(n, -np.inf)
+        self.histogram = np.zeros((n, self.bins), dtype=np.int64)
+
+    def update(self, angles):
+        """
+        :param angles: (frames, joints) degrees
+        :return: Nothing
+        """
+        ok = ~np.isnan(angles)
+        values = np.where(ok, angles, 0.0).astype(np.float64)
+        self.count += ok.sum(axis=0)
+        self.sum += values.sum(axis=0)
+        self.sumSq += (values * values).sum(axis=0)
+        self.min = np.minimum(self.min, np.where(ok, values, np.inf).min(axis=0, initial=np.inf))
+        self.max = np.maximum(self.max, np.where(ok, values, -np.inf).max(axis=0, initial=-np.inf))
+        # One bincount for all joints: joint j owns bins [j * bins, (j + 1) * bins)
+        bins = np.clip((values / self.step).astype(np.int64), 0, self.bins - 1)
+        bins += np.arange(len(self.names), dtype=np.int64) * self.bins
+        self.histogram += np.bincount(bins[ok], minlength=self.histogram.size).reshape(self.histogram.shape)
+
+    def percentile(self, q):
+        """
+        :return: (joints,) q-th percentile (bin centre), NaN for joints without angles
+        """
+        cumulative = np.cumsum(self.histogram, axis=1)
+        target = np.ceil(q / 100.0 * self.count).clip(1)
+        result = np.full(len(self.names), np.nan)
+        for j in np.flatnonzero(self.count):
+            centre = (np.searchsorted(cumulative[j], target[j]) + 0.5) * self.step
+            result[j] = min(max(centre, self.min[j]), self.max[j])
+        return result
+
+    def summary(self):
+        """
+        :return: {joint: {count, min, max, mean, std, p<q>...}}, None values for joints without angles
+        """
+        count = np.maximum(self.count, 1)
+        mean = self.sum / count
+        std = np.sqrt(np.maximum(self.sumSq / count - mean * mean, 0.0))
+        percentiles = {q: self.percentile(q) for q in self.percentiles}
+        result = {}
+        for j, name in enumerate(self.names):
+            if not self.count[j]:
+                result[name] = dict({'count': 0, 'min': None, 'max': None, 'mean': None, 'std': None},
+                                    **{'p%g' % q: None for q in self.percentiles})
+                continue
+            result[name] = dict({'count': int(self.count[j]), 'min': float(self.min[j]), 'max': float(self.max[j]),
+                                 'mean': float(mean[j]), 'std': float(std[j])},
+                                **{'p%g' % q: float(percentiles[q][j]) for q in self.percentiles})
+        return result
+
+
+def repThresholds(stats, band=_FLOAT_REP_BAND):
+    """
+    :param stats: one joint of AngleAggregator.summary(), with p5 and p95
+    :return: (low, high) thresholds band * (p95 - p5) inside the joint's range, or None without angles or movement
+    """
+    if stats.get('p5') is None or stats.get('p95') is None:
+        return None
+    spread = stats['p95'] - stats['p5']
+    if spread <= 0:
+        return None
+    return stats['p5'] + band * spread, stats['p95'] - band * spread
+
+
+class RepCounter:
+    """
+    Counts repetitions of one joint angle. The joint rests on one side (rest='high': above high,
+    e.g. a straight knee) and a rep is an excursion past the other threshold and back. Angles
+    between the thresholds or NaN never change the state, so noise and dropouts do not count.
+    Blocks are fed in order; a rep that is not finished at the end of a block is kept.
+    :param low, high: hysteresis thresholds in degrees
+    """
+    def __init__(self, low, high, rest='high', maxFrames=_INT_MAX_REP_FRAMES):
+        if low >= high:
+            raise ValueError('Rep thresholds need low < high, got %g, %g' % (low, high))
+        if rest not in ('high', 'low'):
+            raise ValueError('rest is "high" or "low", got "%s"' % rest)
+        self.low = low
+        self.high = high
+        self.rest = rest
+        self.maxFrames = maxFrames
+        self.reps = []  # {start, peak, end frame, angle at the peak}
+        self._pending = np.zeros(0, dtype=np.float32)  # Angles since the last frame at rest
+        self._pendingStart = 0  # Frame index of _pending[0]
+
+    def update(self, angles, startFrame=None):
+        """
+        :param angles: (frames,) degrees of consecutive frames
+        :param startFrame: frame index of angles[0], default: right after the previous block
+        :return: the reps completed in this block
+        """
+        angles = np.asarray(angles, dtype=np.float32)
+        if startFrame is None:
+            startFrame = self._pendingStart + len(self._pending)
+        if len(self._pending) and startFrame != self._pendingStart + len(self._pending):
+            self._pending = self._pending[:0]  # Not contiguous: the open rep can not be finished
+        if not len(self._pending):
+            self._pendingStart = startFrame
+        data = np.concatenate((self._pending, angles))
+        base = self._pendingStart
+
+        state = np.zeros(len(data), dtype=np.int8)  # 1 at rest, -1 past the other threshold, 0 in between
+        state[data > self.high] = 1 if self.rest == 'high' else -1
+        state[data < self.low] = -1 if self.rest == 'high' else 1
+        known = np.flatnonzero(state)
+        states = state[known]
+        # Runs of equal states among the frames that have one
+        runStarts = np.flatnonzero(np.diff(states, prepend=0))
+        runEnds = np.append(runStarts[1:], len(states)) - 1
+        firstFrame = known[runStarts]
+        lastFrame = known[runEnds]
+        runStates = states[runStarts]
+
+        found = []
+        for k in np.flatnonzero(runStates[1:-1] == -1) + 1:  # Away runs between two rest runs
+            start, end = lastFrame[k - 1], firstFrame[k + 1]
+            if end - start > self.maxFrames:
+                continue
+            segment = data[start:end + 1]
+            peak = start + int(np.nanargmin(segment) if self.rest == 'high' else np.nanargmax(segment))
+            found.append({'start': base + int(start), 'peak': base + int(peak), 'end': base + int(end),
+                          'angle': float(data[peak])})
+        self.reps += found
+
+        # Keep from the last frame at rest: the next block may finish the rep that starts there
+        rest = np.flatnonzero(runStates == 1)
+        keepFrom = lastFrame[rest[-1]] if len(rest) else len(data)
+        if len(data) - keepFrom > self.maxFrames:
+            keepFrom = len(data)
+        self._pending = data[keepFrom:]
+        self._pendingStart = base + int(keepFrom)
+        return found
+
+
+def analyseLandmarks(landmarks, valid=None, joints=None, mode='2d', width=1.0, height=1.0, repJoints=(),
+                     thresholds=None, rest='high', block=_INT_BLOCK):
+    """
+    Angles, statistics and reps of a whole recording, a block of frames at a time.
+    :param landmarks: (frames, 33, C) array, may be memory-mapped
+    :param repJoints: joint names to count reps of
+    :param thresholds: {joint: (low, high)}, default: repThresholds() of each joint's statistics
+    :return: (angles (frames, joints) float32, AngleAggregator, {joint: [rep]})
+    """
+    names, _ = jointTable(joints)
+    frames = len(landmarks)
+    angles = np.empty((frames, len(names)), dtype=np.float32)
+    aggregator = AngleAggregator(names)
+    for start in range(0, frames, block):
+        end = min(start + block, frames)
+        jointAngles(landmarks[start:end], joints, mode, width, height,
+                    None if valid is None else valid[start:end], out=angles[start:end])
+        aggregator.update(angles[start:end])
+    stats = aggregator.summary()
+    reps = {}
+    for name in repJoints:
+        limits = (thresholds or {}).get(name) or repThresholds(stats[name])
+        if limits is None:
+            reps[name] = []
+            continue
+        counter = RepCounter(limits[0], limits[1], rest)
+        column = angles[:, names.index(name)]
+        for start in range(0, frames, block):
+            counter.update(column[start:start + block], start)
+        reps[name] = counter.reps
+    return angles, aggregator, reps
+
+
+def readLandmarkCsv(path):
+    """
+    Read a BatchPoseModule landmark CSV.
+    :return: (landmarks (frames, 33, 4) float32, valid (frames,) bool)
+    """
+    rows = []
+    with open(path) as f:
+        next(f)  # Header
+        for line in f:
+            rows.append(line.rstrip('\n').split(',')[1:])
+    landmarks = np.zeros((len(rows), 33, 4), dtype=np.float32)
+    valid = np.zeros(len(rows), dtype=bool)
+    for i, row in enumerate(rows):
+        if len(row) == 33 * 4:
+            landmarks[i] = np.array(row, dtype=np.float32).reshape(33, 4)
+            valid[i] = True
+    return landmarks, valid
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Joint angle statistics and rep counts of a landmark recording.')
+    parser.add_argument('input', help='LandmarkRecording (.plm) or BatchPoseModule landmark CSV')
+    parser.add_argument('--mode', default='2d', choices=['2d', '3d'])
+    parser.add_argument('--reps', nargs='*', default=[], choices=list(JOINTS), help='joints to count reps of')
+    parser.add_argument('--rest', default='high', choices=['high', 'low'],
+                        help='side the rep joints rest on (high: straight)')
+    parser.add_argument('--fps', type=float, default=_FLOAT_FPS, help='frame rate for rep durations')
+    parser.add_argument('--size', default=None, help='WxH the landmarks were found on (CSV input, default 1x1)')
+    parser.add_argument('--angles-csv', default=None, help='write the angles of every frame to this CSV')
+    args = parser.parse_args(argv)
+
+    reader = None
+    if args.input.endswith('.csv'):
+        landmarks, valid = readLandmarkCsv(args.input)
+        width, height = (float(v) for v in args.size.lower().split('x')) if args.size else (1.0, 1.0)
+    else:
+        from lib.core.LandmarkRecording import LandmarkReader
+        reader = LandmarkReader(args.input)
+        landmarks, valid = reader.landmarks, reader.valid.astype(bool)
+        width, height = float(reader.width or 1), float(reader.height or 1)
+    if args.mode == '3d' and (width, height) != (1.0, 1.0):
+        # Normalized x, y, z in pixels, z on the scale of x
+        landmarks = np.asarray(landmarks) * np.array([width, height, width, 1.0], dtype=np.float32)
+    try:
+        angles, aggregator, reps = analyseLandmarks(landmarks, valid, mode=args.mode, width=width, height=height,
+                                                    repJoints=args.reps, rest=args.rest)
+    finally:
+        if reader is not None:
+            reader.close()
+
+    print('%d frames, %d with a pose, %s angles' % (len(angles), int(np.count_nonzero(valid)), args.mode))
+    print('%-16s %8s %8s %8s %8s %8s %8s %8s %8s' % ('joint', 'count', 'min', 'p5', 'p50', 'p95', 'max', 'mean', 'std'))
+    for name, s in aggregator.summary().items():
+        if not s['count']:
+            print('%-16s %8d' % (name, 0))
+            continue
+        print('%-16s %8d %8.1f %8.1f %8.1f %8.1f %8.1f %8.1f %8.1f' % (name, s['count'], s['min'], s['p5'], s['p50'],
+                                                                     s['p95'], s['max'], s['mean'], s['std']))
+    for name, found in reps.items():
+        if not found:
+            print('\n%s: no reps' % name)
+            continue
+        durations = np.array([r['end'] - r['start'] for r in found]) / args.fps
+        peaks = np.array([r['angle'] for r in found])
+        print('\n%s: %d reps, duration mean %.2f s (min %.2f, max %.2f), peak angle mean %.1f (min %.1f, max %.1f)' % (
+            name, len(found), durations.mean(), durations.min(), durations.max(), peaks.mean(), peaks.min(),
+            peaks.max()))
+
+    if args.angles_csv:
+        names = list(aggregator.names)
+        frameIndex = np.arange(len(angles), dtype=np.float32)[:, None]
+        np.savetxt(args.angles_csv, np.hstack((frameIndex, angles)), fmt=['%d'] + ['%.2f'] * len(names),
+                   delimiter=',', header=','.join(['frame'] + names), comments='')
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,248 @@
+"""
+Compact memory-mapped recording of per-frame pose landmarks.
+
+File layout (little endian):
+    header, 64 bytes: magic b'PLMREC01', version, landmarks, channels, width, height, frame count
+    records, fixed size, one per frame: timestamp (f8), valid (u1), 7 pad bytes,
+                                        landmarks (f4, landmarks x channels)
+
+Records are fixed size, so frame i lives at a known offset (O(1) access), and the timestamp
+column doubles as the frame index for lookups by time. The file grows a chunk of records at a
+time; the frame count in the header is only advanced on flush(), so a crashed recording is
+still readable up to its last flush.
+"""
+import time
+import struct
+
+import numpy as np
+
+_BYTES_MAGIC = b'PLMREC01'
+_INT_VERSION = 1
+_INT_HEADER_SIZE = 64
+_STR_HEADER_FORMAT = '<8sIIIIIQ'  # magic, version, landmarks, channels, width, height, frames
+_INT_CHUNK_FRAMES = 4096  # Records added each time the file grows
+_INT_FLUSH_EVERY = 256  # Frames between header updates while recording
+_INT_BACKGROUND = 32  # Grey level of the ReplayCapture frames
+
+
+def recordDtype(landmarks, channels):
+    return np.dtype([('timestamp', '<f8'),
+                     ('valid', 'u1'),
+                     ('pad', 'u1', (7,)),
+                     ('landmarks', '<f4', (landmarks, channels))])
+
+
+class LandmarkRecorder:
+    """
+    Appends landmarks (normalized MediaPipe coordinates: x, y, z, visibility) of every frame.
+    """
+    def __init__(self, path, width=0, height=0, landmarks=33, channels=4, chunkFrames=_INT_CHUNK_FRAMES):
+        self.path = path
+        self.width = width  # Frame size the landmarks were found on, for mapping back to pixels
+        self.height = height
+        self.landmarks = landmarks
+        self.channels = channels
+        self.chunkFrames = chunkFrames
+        self.dtype = recordDtype(landmarks, channels)
+        self.frameCount = 0
+        self._capacity = 0
+        self._mm = None
+        self._file = open(path, 'w+b')
+        self._writeHeader()
+        self._grow()
+
+    def _writeHeader(self):
+        header = struct.pack(_STR_HEADER_FORMAT, _BYTES_MAGIC, _INT_VERSION, self.landmarks, self.channels,
+                             self.width, self.height, self.frameCount)
+        self._file.seek(0)
+        self._file.write(header.ljust(_INT_HEADER_SIZE, b'\0'))
+        self._file.flush()
+
+    def _grow(self):
+        if self._mm is not None:
+            self._mm.flush()
+            self._mm = None
+        self._capacity += self.chunkFrames
+        self._file.truncate(_INT_HEADER_SIZE + self._capacity * self.dtype.itemsize)
+        self._mm = np.memmap(self._file, dtype=self.dtype, mode='r+', offset=_INT_HEADER_SIZE,
+                             shape=(self._capacity,))
+
+    def append(self, landmarks, timestamp=None):
+        """
+        :param landmarks: (landmarks, channels) array, or None for a frame without a pose
+        :param timestamp: seconds (default: time.monotonic())
+        :return: the frame number of the record
+        """
+        if self.frameCount >= self._capacity:
+            self._grow()
+        record = self._mm[self.frameCount]
+        record['timestamp'] = time.monotonic() if timestamp is None else timestamp
+        if landmarks is None:
+            record['valid'] = 0
+        else:
+            record['valid'] = 1
+            record['landmarks'] = landmarks
+        self.frameCount += 1
+        if self.frameCount % _INT_FLUSH_EVERY == 0:
+            self.flush()
+        return self.frameCount - 1
+
+    def flush(self):
+        self._mm.flush()
+        self._writeHeader()
+
+    def close(self):
+        if self._file is None:
+            return
+        self.flush()
+        self._mm = None
+        self._file.truncate(_INT_HEADER_SIZE + self.frameCount * self.dtype.itemsize)  # Drop the unused chunk
+        self._file.close()
+        self._file = None
+
+
+class LandmarkReader:
+    """
+    Read-only memory-mapped view of a recording. Nothing is loaded up front; the columns are
+    NumPy views over the mapped file, so scans run at memory (or page cache) speed.
+    """
+    def __init__(self, path):
+        self.path = path
+        with open(path, 'rb') as f:
+            header = f.read(_INT_HEADER_SIZE)
+        if len(header) < _INT_HEADER_SIZE:
+            raise ValueError('Not a landmark recording: ' + path)
+        magic, version, self.landmarkCount, self.channels, self.width, self.height, frames = \
+            struct.unpack_from(_STR_HEADER_FORMAT, header)
+        if magic != _BYTES_MAGIC or version != _INT_VERSION:
+            raise ValueError('Not a landmark recording (or unsupported version): ' + path)
+        self.dtype = recordDtype(self.landmarkCount, self.channels)
+        # A recording still being written may have more records on disk than the header promises
+        self.frameCount = int(frames)
+        if self.frameCount:
+            self._mm = np.memmap(path, dtype=self.dtype, mode='r', offset=_INT_HEADER_SIZE,
+                                 shape=(self.frameCount,))
+        else:
+            self._mm = np.zeros(0, dtype=self.dtype)
+        self.timestamps = self._mm['timestamp']  # (frames,) view, the frame index
+        self.valid = self._mm['valid']  # (frames,) view
+        self.landmarks = self._mm['landmarks']  # (frames, landmarks, channels) view
+
+    def __len__(self):
+        return self.frameCount
+
+    def frame(self, index):
+        """
+        :return: (timestamp, landmarks view or None)
+        """
+        record = self._mm[index]
+        return float(record['timestamp']), (record['landmarks'] if record['valid'] else None)
+
+    def frameAtTime(self, t, relative=True):
+        """
+        Frame shown at time t: the last frame with timestamp <= t.
+        Starts from the frame rate estimate and corrects locally, so it is O(1) for steady rates.
+        :param relative: t counts from the first frame
+        :return: frame number (clamped to the recording)
+        """
+        n = self.frameCount
+        if n == 0:
+            raise IndexError('Empty recording')
+        ts = self.timestamps
+        t0, t1 = float(ts[0]), float(ts[n - 1])
+        if relative:
+            t += t0
+        if t <= t0:
+            return 0
+        if t >= t1:
+            return n - 1
+        i = min(n - 1, int((t - t0) / (t1 - t0) * (n - 1)))
+        # Local correction with galloping steps, bounded by log(n) for irregular recordings
+        step = 1
+        while ts[i] > t:
+            i = max(0, i - step)
+            step *= 2
+        step = 1
+        while i + 1 < n and ts[i + 1] <= t:
+            j = min(n - 1, i + step)
+            if ts[j] <= t:
+                i = j
+                step *= 2
+            else:
+                step = max(1, step // 2)
+        return i
+
+    def pixels(self, index, width=None, height=None):
+        """
+        Landmarks of a frame in pixel coordinates (x, y, z scaled like PoseDetector.lmPixels).
+        :return: new (landmarks, channels) float32 array or None
+        """
+        _, lm = self.frame(index)
+        if lm is None:
+            return None
+        w = width or self.width
+        h = height or self.height
+        scale = np.array([w, h, w] + [1] * (self.channels - 3), dtype=np.float32)
+        return lm * scale
+
+    def close(self):
+        self._mm = None
+        self.timestamps = self.valid = self.landmarks = None
+
+
+class ReplayCapture:
+    """
+    cv2.VideoCapture stand-in for FramePipeline that yields plain frames paced like the recording,
+    to be paired with a PoseDetector using the 'replay' backend on the same file.
+    """
+    def __init__(self, path, width=None, height=None, realtime=True, loop=True):
+        self.reader = LandmarkReader(path)
+        self.width = width or self.reader.width or 640
+        self.height = height or self.reader.height or 480
+        self.realtime = realtime
+        self.loop = loop
+        # Dark grey, not black: the detector and the widget skip all-zero frames
+        self._background = np.full((self.height, self.width, 3), _INT_BACKGROUND, dtype=np.uint8)
+        self._index = 0
+        self._startWall = None
+        self._startTs = None
+
+    def isOpened(self):
+        return len(self.reader) > 0
+
+    def frameIndex(self, seq):
+        """
+        Recording frame of the seq-th frame read (FramePipeline numbers the frames it reads from 1).
+        """
+        return (seq - 1) % max(1, len(self.reader))
+
+    def read(self, image=None):
+        n = len(self.reader)
+        if n == 0:
+            return False, None
+        if self._index >= n:
+            if not self.loop:
+                return False, None
+            self._index = 0
+            self._startWall = None
+        ts = float(self.reader.timestamps[self._index])
+        if self.realtime:
+            if self._startWall is None:
+                self._startWall, self._startTs = time.monotonic(), ts
+            delay = (ts - self._startTs) - (time.monotonic() - self._startWall)
+            if delay > 0:
+                time.sleep(delay)
+        self._index += 1
+        if image is not None and image.shape == self._background.shape:
+            image[:] = self._background
+            return True, image
+        return True, self._background.copy()  # The pipeline draws on the frame
+
+    def set(self, propId, value):
+        return False
+
+    def get(self, propId):
+        return 0.0
+
+    def release(self):
+        self.reader.close()
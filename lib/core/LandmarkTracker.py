@@ -0,0 +1,132 @@
+import cv2
+import numpy as np
+
+_INT_MP_LANDMARKS = 33
+_FLOAT_MIN_VISIBILITY = 0.5  # Landmarks below this visibility are not tracked
+_FLOAT_FB_MAX_ERROR = 2.0  # Max forward-backward optical flow error in pixels for a good track
+_FLOAT_MOTION_SMOOTHING = 0.3  # Exponential smoothing factor of the measured motion
+
+
+class KeyframeTracker:
+    """
+    Runs the full PoseDetector only on keyframes and moves the landmarks between them with sparse
+    pyramidal Lucas-Kanade optical flow. PoseDetector.setKeyframeTracking() puts one behind
+    MediaPipe_findPose; use it directly with a detector that has the mode off.
+
+    A new keyframe is taken when:
+      - the keyframe interval has passed; the interval adapts to the measured motion so the
+        expected drift between two keyframes stays near driftBudget (share of the body height)
+      - the tracking confidence (share of landmarks with a good forward-backward track)
+        drops below minTrackingConfidence, in which case the detector runs on that same frame
+    """
+    def __init__(self, detector, minInterval=1, maxInterval=10, driftBudget=0.05,
+                 minTrackingConfidence=0.7, winSize=(21, 21), maxLevel=3):
+        self.detector = detector
+        self.minInterval = max(1, minInterval)
+        self.maxInterval = max(self.minInterval, maxInterval)
+        self.driftBudget = driftBudget
+        self.minTrackingConfidence = minTrackingConfidence
+        self._lkParams = dict(winSize=winSize, maxLevel=maxLevel,
+                              criteria=(cv2.TERM_CRITERIA_EPS | cv2.TERM_CRITERIA_COUNT, 20, 0.03))
+
+        self.landmarks = np.zeros((_INT_MP_LANDMARKS, 4), dtype=np.float32)  # Like detector.lmPixels
+        self.hasLandmarks = False
+        self.interval = self.minInterval  # Current keyframe interval in frames
+        self.motion = 0.0  # Smoothed median landmark motion in body heights per frame
+        self.trackingConfidence = 0.0
+        self.keyframes = 0
+        self.trackedFrames = 0
+
+        self._prevGray = None
+        self._gray = None
+        self._sinceKeyframe = 0
+
+    def reset(self):
+        self.hasLandmarks = False
+        self._prevGray = None
+        self._sinceKeyframe = 0
+        self.interval = self.minInterval
+        self.motion = 0.0
+        self.detector.MediaPipe_resetTracking()
+
+    def _bodyHeight(self):
+        visible = self.landmarks[:, 3] >= _FLOAT_MIN_VISIBILITY
+        if not visible.any():
+            return 1.0
+        ys = self.landmarks[visible, 1]
+        return max(float(ys.max() - ys.min()), 1.0)
+
+    def _updateMotion(self, displacement):
+        # displacement: per-frame landmark motion in pixels
+        motion = displacement / self._bodyHeight()
+        self.motion += _FLOAT_MOTION_SMOOTHING * (motion - self.motion)
+        if self.motion <= 1e-6:
+            self.interval = self.maxInterval
+        else:
+            self.interval = int(np.clip(self.driftBudget / self.motion, self.minInterval, self.maxInterval))
+
+    def _detect(self, img):
+        self.detector.MediaPipe_findPose(img, draw=False)
+        lmPixels = self.detector.MediaPipe_findPosition(img, draw=False)
+        if len(lmPixels) == 0:
+            self.hasLandmarks = False
+            self.trackingConfidence = 0.0
+        else:
+            if self.hasLandmarks:
+                visible = (lmPixels[:, 3] >= _FLOAT_MIN_VISIBILITY) & \
+                          (self.landmarks[:, 3] >= _FLOAT_MIN_VISIBILITY)
+                if visible.any():
+                    # self.landmarks still hold the previous frame: one frame of motion plus any
+                    # drift the tracker accumulated, so drift also shortens the interval
+                    moved = np.linalg.norm(lmPixels[visible, :2] - self.landmarks[visible, :2], axis=1)
+                    self._updateMotion(float(np.median(moved)))
+            self.landmarks[:] = lmPixels
+            self.hasLandmarks = True
+            self.trackingConfidence = 1.0
+        self._sinceKeyframe = 0
+        self.keyframes += 1
+
+    def _track(self):
+        """
+        Move the visible landmarks from the previous frame to the current one.
+        :return: the tracking confidence
+        """
+        tracked = np.nonzero(self.landmarks[:, 3] >= _FLOAT_MIN_VISIBILITY)[0]
+        if tracked.size == 0:
+            return 0.0
+        prevPts = np.ascontiguousarray(self.landmarks[tracked, None, :2])
+        nextPts, status, _ = cv2.calcOpticalFlowPyrLK(self._prevGray, self._gray, prevPts, None, **self._lkParams)
+        backPts, backStatus, _ = cv2.calcOpticalFlowPyrLK(self._gray, self._prevGray, nextPts, None,
+                                                          **self._lkParams)
+        fbError = np.linalg.norm(backPts[:, 0] - prevPts[:, 0], axis=1)
+        good = (status[:, 0] == 1) & (backStatus[:, 0] == 1) & (fbError < _FLOAT_FB_MAX_ERROR)
+
+        if good.any():
+            moved = np.linalg.norm(nextPts[good, 0] - prevPts[good, 0], axis=1)
+            self._updateMotion(float(np.median(moved)))
+        self.landmarks[tracked[good], :2] = nextPts[good, 0]
+        return float(good.sum()) / tracked.size
+
+    def process(self, img):
+        """
+        Landmarks of img, from the detector on keyframes or from optical flow otherwise.
+        :return: (landmarks (33, 4) float32 array or None, True if the detector ran on this frame)
+        """
+        if img is None:
+            return None, False
+        self._gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY, dst=self._gray)
+
+        keyframe = not self.hasLandmarks or self._prevGray is None or self._sinceKeyframe + 1 >= self.interval
+        if not keyframe:
+            self._sinceKeyframe += 1
+            self.trackingConfidence = self._track()
+            if self.trackingConfidence < self.minTrackingConfidence:
+                keyframe = True
+            else:
+                self.trackedFrames += 1
+        if keyframe:
+            self._detect(img)
+
+        # Swap the gray buffers instead of allocating a new one every frame
+        self._prevGray, self._gray = self._gray, self._prevGray
+        return (self.landmarks if self.hasLandmarks else None), keyframe
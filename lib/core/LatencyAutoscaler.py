@@ -0,0 +1,140 @@
+"""
+Keeps pose inference within the frame budget of a target fps by stepping the MediaPipe model
+complexity and the inference resolution down on slow machines and back up on fast ones.
+
+    detector = PoseDetector()
+    LatencyAutoscaler(detector, targetFps=24).attach()
+
+The detector reports the inference time of every frame (PoseDetector.autoscaler). Once a window of
+frames has been seen since the last switch, the p90 latency is compared with the budget:
+  - above the budget: one level down,
+  - below upRatio * budget: one level up, unless that level was too slow recently. Every time a
+    level turns out too slow its back-off doubles (up to maxBackOff), so the controller settles
+    instead of oscillating between two levels.
+The new backend is created and warmed up on a background thread while frames keep going through
+the current one, then swapped in between two frames. Every switch is logged and kept in history.
+"""
+import time
+import logging
+import threading
+
+import numpy as np
+
+_LIST_LEVELS = [(0, 0.5), (0, 0.75), (0, 1.0), (1, 0.75), (1, 1.0), (2, 1.0)]  # (model_complexity, inputScale), cheap first
+_FLOAT_HEADROOM = 0.85  # Share of the frame period inference may use, the rest is capture, drawing and display
+_FLOAT_UP_RATIO = 0.6  # Step up only when p90 is below this share of the budget
+_FLOAT_QUANTILE = 0.9
+_INT_WINDOW = 30  # Frames measured before each decision
+_FLOAT_COOL_DOWN = 2.0  # Minimum seconds between two switches
+_FLOAT_BACK_OFF = 10.0  # Seconds a level that was too slow is not tried again, doubled each time
+_FLOAT_MAX_BACK_OFF = 300.0
+
+logger = logging.getLogger(__name__)
+
+
+class LatencyAutoscaler:
+    """
+    :param detector: the PoseDetector to control
+    :param targetFps: frame rate the stream should keep
+    :param levels: [(model_complexity, inputScale)] from the cheapest to the most expensive
+    :param level: starting level index, default: the level of the detector's current settings
+    """
+    def __init__(self, detector, targetFps=24.0, levels=None, level=None, headroom=_FLOAT_HEADROOM,
+                 upRatio=_FLOAT_UP_RATIO, window=_INT_WINDOW, coolDown=_FLOAT_COOL_DOWN, backOff=_FLOAT_BACK_OFF,
+                 maxBackOff=_FLOAT_MAX_BACK_OFF):
+        self.detector = detector
+        self.targetFps = targetFps
+        self.levels = list(levels or _LIST_LEVELS)
+        self.headroom = headroom
+        self.upRatio = upRatio
+        self.coolDown = coolDown
+        self.backOff = backOff
+        self.maxBackOff = maxBackOff
+        self.level = self._currentLevel() if level is None else level
+        self.history = []  # One dict per switch: time, from, to, p90_ms, budget_ms, reason
+        self._samples = np.zeros(window, dtype=np.float64)
+        self._count = 0
+        self._lastSwitch = time.monotonic()
+        self._switching = False
+        self._blockedUntil = [0.0] * len(self.levels)  # Monotonic time before which a level is not tried again
+        self._levelBackOff = [backOff] * len(self.levels)
+
+    def _currentLevel(self):
+        complexity = self.detector.model_complexity
+        scale = self.detector.backendParams.get('inputScale', 1.0)
+        distances = [abs(c - complexity) * 10 + abs(s - scale) for c, s in self.levels]
+        return int(np.argmin(distances))
+
+    @property
+    def budget(self):
+        # Seconds of inference per frame
+        return self.headroom / self.targetFps
+
+    def attach(self):
+        """
+        Apply the starting level if the detector is not at it, and start receiving latencies.
+        :return: self
+        """
+        complexity, scale = self.levels[self.level]
+        if (complexity, scale) != (self.detector.model_complexity, self.detector.backendParams.get('inputScale', 1.0)):
+            self._switch(self.level, 'initial level')
+        self.detector.autoscaler = self
+        return self
+
+    def detach(self):
+        self.detector.autoscaler = None
+
+    def observe(self, seconds):
+        """
+        Called by the detector with the inference time of each frame.
+        :return: Nothing
+        """
+        if self._switching:
+            return
+        self._samples[self._count % self._samples.size] = seconds
+        self._count += 1
+        if self._count < self._samples.size:
+            return
+        now = time.monotonic()
+        if now - self._lastSwitch < self.coolDown:
+            return
+        latency = float(np.quantile(self._samples, _FLOAT_QUANTILE))
+        if latency > self.budget and self.level > 0:
+            # The current level can not keep up: keep away from it for a while, longer every time
+            self._blockedUntil[self.level] = now + self._levelBackOff[self.level]
+            self._levelBackOff[self.level] = min(2 * self._levelBackOff[self.level], self.maxBackOff)
+            self._switch(self.level - 1, 'too slow', latency)
+        elif latency < self.upRatio * self.budget and self.level + 1 < len(self.levels) \
+                and now >= self._blockedUntil[self.level + 1]:
+            self._switch(self.level + 1, 'headroom', latency)
+
+    def _switch(self, level, reason, latency=None):
+        self._switching = True
+        thread = threading.Thread(target=self._rebuild, args=(level, reason, latency), daemon=True)
+        thread.start()
+
+    def _rebuild(self, level, reason, latency):
+        # Background thread: the stream keeps running on the current backend until the swap
+        complexity, scale = self.levels[level]
+        backendParams = dict(self.detector.backendParams, inputScale=scale)
+        previous = self.level
+        try:
+            backend = self.detector.createBackend(model_complexity=complexity, backendParams=backendParams)
+            backend.warmUp(background=False)
+            self.detector.swapBackend(backend, model_complexity=complexity, backendParams=backendParams)
+        except Exception as e:
+            logger.warning('Pose autoscaler: could not switch to model_complexity=%d inputScale=%.2f: %s',
+                           complexity, scale, e)
+            self._blockedUntil[level] = time.monotonic() + self.maxBackOff
+        else:
+            self.level = level
+            entry = {'time': time.time(), 'from': self.levels[previous], 'to': self.levels[level],
+                     'p90_ms': None if latency is None else 1000 * latency, 'budget_ms': 1000 * self.budget,
+                     'reason': reason}
+            self.history.append(entry)
+            logger.info('Pose autoscaler: model_complexity %d -> %d, inputScale %.2f -> %.2f (%s%s, budget %.1f ms)',
+                        self.levels[previous][0], complexity, self.levels[previous][1], scale, reason,
+                        '' if latency is None else ', p90 %.1f ms' % (1000 * latency), 1000 * self.budget)
+        self._count = 0
+        self._lastSwitch = time.monotonic()
+        self._switching = False
@@ -0,0 +1,272 @@
+"""
+Several capture sources sharing a bounded pool of inference workers:
+
+    capture thread 0 -> [latest-frame queue] --\                         /--> [render queue 0]
+    capture thread 1 -> [latest-frame queue] ----> inference workers (N) ----> [render queue 1]
+    ...                                        --/                         \--> ...
+
+Every source keeps its own PoseDetector, since MediaPipe tracks the pose from one frame of a stream
+to the next. A source is processed by at most one worker at a time (frames of a stream stay in
+order, a detector is never used by two threads) and the workers take the sources round-robin, so
+a fast camera can not starve the others. Each source reports its pose fps and dropped frames.
+
+Headless sizing run:
+
+    python -m lib.core.MultiCameraScheduler 0 1 2 clip.mp4 --workers 2 --seconds 30
+"""
+import sys
+import time
+import argparse
+import threading
+
+import cv2
+
+import lib.core.PoseModule as pm
+from lib.core.FrameBufferPool import FrameBufferPool
+from lib.core.FramePipeline import CaptureThread, LatestFrameQueue
+
+_FLOAT_QUEUE_TIMEOUT = 0.1  # Seconds a worker waits for a frame before re-checking its stop flag
+_FLOAT_MAX_FRAME_AGE = 0.5  # Frames older than this (in seconds) are dropped before inference
+_FLOAT_FPS_SMOOTHING = 0.1  # Weight of the newest frame interval in the fps average
+_FLOAT_IDLE_TIME = 1.0  # Seconds without a frame after which a source reports 0 fps
+_INT_WORKERS = 2
+_FLOAT_RENDER_PERIOD = 1 / 60  # Seconds between render queue checks of the headless run
+
+
+def parseSource(source):
+    """
+    :return: int device index for '0', '1', ..., the string otherwise (video file or stream URL)
+    """
+    return int(source) if isinstance(source, str) and source.isdigit() else source
+
+
+class _SchedulerQueue(LatestFrameQueue):
+    # Capture queue that wakes the scheduler's workers when a frame arrives
+    def __init__(self, maxsize, scheduler):
+        super().__init__(maxsize)
+        self._scheduler = scheduler
+
+    def put(self, frame):
+        super().put(frame)
+        self._scheduler._notify()
+
+
+class CameraSource:
+    """
+    One capture source: its capture thread, buffer pool, queues, detector and counters.
+    """
+    def __init__(self, index, source, videoCapture, detector, queueSize=1):
+        self.index = index
+        self.source = source
+        self.videoCapture = videoCapture
+        self.detector = detector
+        self.queueSize = queueSize
+        self.bufferPool = FrameBufferPool(2 * queueSize + 3)
+        self.captureQueue = None  # Created by the scheduler, it has to notify the workers
+        self.renderQueue = LatestFrameQueue(queueSize)
+        self.captureThread = None
+        self.busy = False  # A worker is processing a frame of this source
+        self.processed = 0
+        self.staleDropped = 0
+        self.fps = 0.0  # Smoothed pose fps
+        self._lastSeq = 0  # Last seq processed
+        self._shownSeq = 0  # Last seq returned by getLatestFrame()
+        self._pTime = 0
+
+    @property
+    def captured(self):
+        return self.captureThread._seq if self.captureThread is not None else 0
+
+    def droppedFrames(self):
+        dropped = self.renderQueue.dropped + self.staleDropped
+        return dropped + (self.captureQueue.dropped if self.captureQueue is not None else 0)
+
+    def getLatestFrame(self):
+        """
+        Non-blocking. Return the newest finished frame of this source if it is newer than the last one returned.
+        :return: Frame or None
+        """
+        frame = self.renderQueue.getLatest()
+        if frame is None:
+            return None
+        if frame.seq <= self._shownSeq:
+            frame.release()
+            return None
+        self._shownSeq = frame.seq
+        return frame
+
+    def stats(self):
+        idle = not self._pTime or time.monotonic() - self._pTime > _FLOAT_IDLE_TIME
+        return {'source': str(self.source), 'fps': 0.0 if idle else self.fps, 'captured': self.captured,
+                'processed': self.processed, 'dropped': self.droppedFrames()}
+
+
+class MultiCameraScheduler:
+    """
+    :param sources: device indices, video paths or already opened captures (anything with read(image=))
+    :param processFrame: callable(source: CameraSource, frame) run on a worker thread, fills frame.image and
+                         frame.landmarks using source.detector. The default finds the pose and draws it.
+    :param workers: inference threads shared by all sources
+    :param detectorFactory: callable() -> PoseDetector, called once per source
+    """
+    def __init__(self, sources, processFrame=None, workers=_INT_WORKERS, detectorFactory=None, queueSize=1,
+                 maxFrameAge=_FLOAT_MAX_FRAME_AGE):
+        self.processFrame = processFrame or self.findPose
+        self.workers = max(1, workers)
+        self.maxFrameAge = maxFrameAge
+        detectorFactory = detectorFactory or pm.PoseDetector
+        self.sources = []
+        for i, source in enumerate(sources):
+            source = parseSource(source)
+            capture = cv2.VideoCapture(source) if isinstance(source, (int, str)) else source
+            self.sources.append(CameraSource(i, source, capture, detectorFactory(), queueSize))
+        self._cond = threading.Condition()
+        self._stopEvent = threading.Event()
+        self._threads = []
+        self._next = 0  # Round-robin cursor over the sources
+
+    @staticmethod
+    def findPose(source, frame):
+        img = source.detector.MediaPipe_findPose(frame.image)
+        if img is not None:
+            lmPixels = source.detector.MediaPipe_findPosition(img, draw=True)
+            frame.landmarks = lmPixels.copy() if len(lmPixels) != 0 else None
+        frame.image = img
+
+    def _notify(self):
+        with self._cond:
+            self._cond.notify()
+
+    def start(self):
+        self._stopEvent.clear()
+        for source in self.sources:
+            source.captureQueue = _SchedulerQueue(source.queueSize, self)
+            source.captureThread = CaptureThread(source.videoCapture, source.captureQueue, pool=source.bufferPool)
+            source.captureThread.start()
+        for _ in range(self.workers):
+            thread = threading.Thread(target=self._work, daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def _take(self):
+        # Under self._cond: the first idle source after the cursor with a frame waiting, and its frame
+        count = len(self.sources)
+        for offset in range(count):
+            source = self.sources[(self._next + offset) % count]
+            if source.busy:
+                continue
+            frame = source.captureQueue.getLatest()
+            if frame is None:
+                continue
+            source.busy = True
+            self._next = (source.index + 1) % count
+            return source, frame
+        return None, None
+
+    def _work(self):
+        while not self._stopEvent.is_set():
+            with self._cond:
+                source, frame = self._take()
+                if source is None:
+                    self._cond.wait(_FLOAT_QUEUE_TIMEOUT)
+                    continue
+            try:
+                if frame.seq <= source._lastSeq or \
+                        (self.maxFrameAge is not None and frame.age() > self.maxFrameAge):
+                    frame.release()
+                    source.staleDropped += 1
+                    continue
+                source._lastSeq = frame.seq
+                cTime = time.monotonic()
+                if source._pTime:
+                    interval = max(cTime - source._pTime, 1e-6)
+                    source.fps += _FLOAT_FPS_SMOOTHING * (1 / interval - source.fps) if source.fps else 1 / interval
+                    frame.fps = source.fps
+                source._pTime = cTime
+                self.processFrame(source, frame)
+                source.processed += 1
+                source.renderQueue.put(frame)
+            finally:
+                with self._cond:
+                    source.busy = False
+                    self._cond.notify()  # Its next frame may already be waiting
+
+    def stop(self):
+        self._stopEvent.set()
+        for source in self.sources:
+            if source.captureThread is not None:
+                source.captureThread.stop()
+        for source in self.sources:
+            if source.captureThread is not None:
+                source.captureThread.join()
+        self._notify()
+        for thread in self._threads:
+            thread.join()
+        self._threads = []
+        for source in self.sources:
+            source.captureQueue.clear()
+            source.renderQueue.clear()
+
+    def release(self):
+        # Stop first; releases the captures opened by the scheduler and the detectors
+        for source in self.sources:
+            source.videoCapture.release()
+            source.detector.backend.close()
+
+    def stats(self):
+        """
+        :return: [{'source', 'fps', 'captured', 'processed', 'dropped'}] in source order
+        """
+        return [source.stats() for source in self.sources]
+
+    def report(self):
+        lines = ['%-4s %-28s %8s %9s %9s %9s' % ('#', 'source', 'fps', 'captured', 'processed', 'dropped')]
+        for i, stat in enumerate(self.stats()):
+            lines.append('%-4d %-28s %8.1f %9d %9d %9d' % (i, stat['source'][-28:], stat['fps'], stat['captured'],
+                                                            stat['processed'], stat['dropped']))
+        return '\n'.join(lines)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Run pose estimation on several sources and report fps and drops.')
+    parser.add_argument('sources', nargs='+', help='camera indices or video files')
+    parser.add_argument('--workers', type=int, default=_INT_WORKERS, help='shared inference threads')
+    parser.add_argument('--seconds', type=float, default=10.0, help='run time')
+    parser.add_argument('--interval', type=float, default=2.0, help='seconds between reports')
+    parser.add_argument('--backend', default='mediapipe')
+    parser.add_argument('--model-complexity', type=int, default=1)
+    args = parser.parse_args(argv)
+
+    def detectorFactory():
+        return pm.PoseDetector(backend=args.backend, model_complexity=args.model_complexity)
+
+    def processFrame(source, frame):
+        source.detector.MediaPipe_findPose(frame.image, draw=False)
+        source.detector.MediaPipe_findPosition(frame.image, draw=False)
+
+    scheduler = MultiCameraScheduler(args.sources, processFrame, workers=args.workers,
+                                     detectorFactory=detectorFactory)
+    for source in scheduler.sources:
+        source.detector.backend.warmUp(background=False)
+    scheduler.start()
+    start = time.monotonic()
+    nextReport = start + args.interval
+    try:
+        while time.monotonic() < start + args.seconds:
+            time.sleep(_FLOAT_RENDER_PERIOD)
+            for source in scheduler.sources:
+                frame = source.getLatestFrame()  # Stands in for the render stage
+                if frame is not None:
+                    frame.release()
+            if time.monotonic() >= nextReport and nextReport < start + args.seconds:  # The last one follows
+                print(scheduler.report() + '\n')
+                nextReport += args.interval
+        print(scheduler.report())
+    finally:
+        scheduler.stop()
+        scheduler.release()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,199 @@
+import numpy as np
+
+_INT_PARTS = 18  # COCO keypoints, the 19th heatmap is the background
+
+# Limbs as (part from, part to), in the order of PoseDetector._POSE_PAIRS
+LIMBS = np.array([[1, 2], [1, 5], [2, 3], [3, 4], [5, 6], [6, 7], [1, 8], [8, 9], [9, 10], [1, 11],
+                  [11, 12], [12, 13], [1, 0], [0, 14], [14, 16], [0, 15], [15, 17]], dtype=np.int64)
+
+# Part affinity field channels (x, y) of each limb above, counted from the first PAF channel
+# (network output channel 19) of the graph_opt.pb model
+PAF_CHANNELS = np.array([[12, 13], [20, 21], [14, 15], [16, 17], [22, 23], [24, 25], [0, 1], [2, 3],
+                         [4, 5], [6, 7], [8, 9], [10, 11], [28, 29], [30, 31], [34, 35], [32, 33],
+                         [36, 37]], dtype=np.int64)
+
+# One row per detected person. keypoints: (x, y, confidence) per part in heatmap cells,
+# x = y = nan and confidence = 0 for parts that were not found
+PERSON_DTYPE = np.dtype([('keypoints', np.float32, (_INT_PARTS, 3)),
+                         ('score', np.float32),
+                         ('count', np.int32)])
+
+
+class OpenPoseDecoder:
+    """
+    Multi-person decoding of the OpenPose heatmaps and part affinity fields (PAFs).
+
+    1. all local maxima of the 18 heatmaps in one vectorized pass (with subpixel refinement)
+    2. every candidate limb of every limb type scored at once by sampling the PAFs along it
+    3. greedy matching per limb type and skeleton assembly, linear in the number of connections
+    """
+    def __init__(self, peakThreshold=0.1, pafThreshold=0.05, samples=10, minSampleRatio=0.8,
+                 minParts=4, minMeanScore=0.4):
+        self.peakThreshold = peakThreshold
+        self.pafThreshold = pafThreshold
+        self.samples = samples
+        self.minSampleRatio = minSampleRatio  # Share of PAF samples that must point along the limb
+        self.minParts = minParts
+        self.minMeanScore = minMeanScore
+        self._t = np.linspace(0.0, 1.0, samples)
+
+    def findPeaks(self, heatmaps):
+        """
+        :param heatmaps: (parts, H, W) float array
+        :return: (part, x, y, score) arrays of all local maxima above peakThreshold, sorted by part
+        """
+        parts, h, w = heatmaps.shape
+        padded = np.pad(heatmaps, ((0, 0), (1, 1), (1, 1)), mode='constant', constant_values=-np.inf)
+        isPeak = heatmaps > self.peakThreshold
+        for dy in range(3):
+            for dx in range(3):
+                if dy == 1 and dx == 1:
+                    continue
+                neighbour = padded[:, dy:dy + h, dx:dx + w]
+                # >= for the neighbours before, > for the ones after: one peak per plateau
+                if dy < 1 or (dy == 1 and dx < 1):
+                    isPeak &= heatmaps >= neighbour
+                else:
+                    isPeak &= heatmaps > neighbour
+        part, y, x = np.nonzero(isPeak)
+        score = heatmaps[part, y, x]
+
+        # Subpixel refinement with a parabola through the peak and its two neighbours per axis
+        edge = np.pad(heatmaps, ((0, 0), (1, 1), (1, 1)), mode='edge')
+        c = score
+        left, right = edge[part, y + 1, x], edge[part, y + 1, x + 2]
+        up, down = edge[part, y, x + 1], edge[part, y + 2, x + 1]
+        with np.errstate(divide='ignore', invalid='ignore'):
+            dx = 0.5 * (right - left) / (2 * c - left - right)
+            dy = 0.5 * (down - up) / (2 * c - up - down)
+        dx = np.clip(np.nan_to_num(dx, nan=0.0, posinf=0.0, neginf=0.0), -0.5, 0.5)
+        dy = np.clip(np.nan_to_num(dy, nan=0.0, posinf=0.0, neginf=0.0), -0.5, 0.5)
+        return part, x + dx, y + dy, score
+
+    def scoreLimbs(self, pafs, part, xy):
+        """
+        Score every (peak of part A, peak of part B) pair of every limb type in one batch.
+        :param pafs: (38, H, W) PAF channels
+        :param part: (n,) part of each peak, sorted
+        :param xy: (n, 2) peak positions
+        :return: (limb, a, b, score) arrays of the candidates that pass the PAF criterion
+        """
+        h, w = pafs.shape[1:]
+        starts = np.searchsorted(part, np.arange(_INT_PARTS), side='left')
+        ends = np.searchsorted(part, np.arange(_INT_PARTS), side='right')
+
+        limbIds, candA, candB = [], [], []
+        for k, (partA, partB) in enumerate(LIMBS):
+            idsA = np.arange(starts[partA], ends[partA])
+            idsB = np.arange(starts[partB], ends[partB])
+            if idsA.size == 0 or idsB.size == 0:
+                continue
+            gridA, gridB = np.meshgrid(idsA, idsB, indexing='ij')
+            candA.append(gridA.ravel())
+            candB.append(gridB.ravel())
+            limbIds.append(np.full(gridA.size, k, dtype=np.int64))
+        if not limbIds:
+            empty = np.empty(0, dtype=np.int64)
+            return empty, empty, empty, np.empty(0, dtype=np.float32)
+        limbIds = np.concatenate(limbIds)
+        candA = np.concatenate(candA)
+        candB = np.concatenate(candB)
+
+        vec = xy[candB] - xy[candA]
+        norm = np.linalg.norm(vec, axis=1)
+        norm = np.maximum(norm, 1e-6)
+        unit = vec / norm[:, None]
+
+        # (candidates, samples) points on each segment, rounded to PAF cells
+        samples = xy[candA][:, None, :] + self._t[None, :, None] * vec[:, None, :]
+        sx = np.clip(np.rint(samples[..., 0]), 0, w - 1).astype(np.int64)
+        sy = np.clip(np.rint(samples[..., 1]), 0, h - 1).astype(np.int64)
+        channels = PAF_CHANNELS[limbIds]
+        pafX = pafs[channels[:, 0:1], sy, sx]
+        pafY = pafs[channels[:, 1:2], sy, sx]
+        dots = pafX * unit[:, 0:1] + pafY * unit[:, 1:2]
+
+        # Mean alignment, penalised for limbs longer than half the map height
+        score = dots.mean(axis=1) + np.minimum(0.0, 0.5 * h / norm - 1.0)
+        valid = ((dots > self.pafThreshold).mean(axis=1) >= self.minSampleRatio) & (score > 0)
+        return limbIds[valid], candA[valid], candB[valid], score[valid]
+
+    def decode(self, heatmaps, pafs):
+        """
+        :param heatmaps: (18 or 19, H, W) heatmaps, a 19th background map is ignored
+        :param pafs: (38, H, W) part affinity fields
+        :return: PERSON_DTYPE array, one row per person, coordinates in heatmap cells
+        """
+        heatmaps = heatmaps[:_INT_PARTS]
+        part, x, y, peakScore = self.findPeaks(heatmaps)
+        xy = np.stack([x, y], axis=1)
+        limb, candA, candB, limbScore = self.scoreLimbs(pafs, part, xy)
+
+        # Greedy matching: per limb type, best scores first, each peak used once per limb type
+        order = np.lexsort((-limbScore, limb))
+        nPeaks = part.size
+        owner = np.full(nPeaks, -1, dtype=np.int64)  # Person index of each peak
+        people = []  # [peak id per part], kept as lists while assembling
+        scores = []
+        usedA = set()
+        usedB = set()
+        currentLimb = -1
+        for i in order:
+            k = limb[i]
+            if k != currentLimb:
+                currentLimb = k
+                usedA.clear()
+                usedB.clear()
+            a, b = candA[i], candB[i]
+            if a in usedA or b in usedB:
+                continue
+            usedA.add(a)
+            usedB.add(b)
+
+            partA, partB = LIMBS[k]
+            pa, pb = owner[a], owner[b]
+            if pa == -1 and pb == -1:
+                person = [-1] * _INT_PARTS
+                person[partA] = a
+                person[partB] = b
+                owner[a] = owner[b] = len(people)
+                people.append(person)
+                scores.append(peakScore[a] + peakScore[b] + limbScore[i])
+            elif pb == -1:
+                if people[pa][partB] == -1:
+                    people[pa][partB] = b
+                    owner[b] = pa
+                    scores[pa] += peakScore[b] + limbScore[i]
+            elif pa == -1:
+                if people[pb][partA] == -1:
+                    people[pb][partA] = a
+                    owner[a] = pb
+                    scores[pb] += peakScore[a] + limbScore[i]
+            elif pa != pb:
+                # Two partial skeletons joined by this limb: merge them if they do not overlap
+                first, second = people[pa], people[pb]
+                if all(p1 == -1 or p2 == -1 for p1, p2 in zip(first, second)):
+                    for j in range(_INT_PARTS):
+                        if second[j] != -1:
+                            first[j] = second[j]
+                            owner[second[j]] = pa
+                    scores[pa] += scores[pb] + limbScore[i]
+                    people[pb] = None
+
+        keep = [i for i, person in enumerate(people) if person is not None]
+        result = np.zeros(len(keep), dtype=PERSON_DTYPE)
+        if not keep:
+            return result
+        ids = np.array([people[i] for i in keep], dtype=np.int64)  # (people, parts)
+        found = ids >= 0
+        safeIds = np.where(found, ids, 0)
+        kp = result['keypoints']
+        kp[..., 0] = np.where(found, xy[safeIds, 0], np.nan)
+        kp[..., 1] = np.where(found, xy[safeIds, 1], np.nan)
+        kp[..., 2] = np.where(found, peakScore[safeIds], 0.0)
+        result['count'] = found.sum(axis=1)
+        result['score'] = np.array([scores[i] for i in keep], dtype=np.float32)
+
+        good = (result['count'] >= self.minParts) & \
+               (result['score'] / np.maximum(result['count'], 1) >= self.minMeanScore)
+        return result[good]
@@ -0,0 +1,374 @@
+import threading
+import math
+
+import cv2
+import numpy as np
+
+import lib.core.StageMetrics as sm
+
+_STR_OPENPOSE_NET_PATH = "../dnn_model/graph_opt.pb"
+_INT_WARM_UP_SIZE = 256  # Width and height of the blank frame used for warm-up inference
+
+_BACKENDS = {}  # name -> PoseBackend subclass
+
+
+def registerBackend(name, backendClass):
+    _BACKENDS[name] = backendClass
+
+
+def availableBackends():
+    return sorted(_BACKENDS.keys())
+
+
+def createBackend(name, **params):
+    """
+    Create (but do not load) a backend by name.
+    :param name: a name given to registerBackend
+    :param params: backend specific parameters, unknown ones are ignored by the backend
+    :return: PoseBackend
+    """
+    if name not in _BACKENDS:
+        raise ValueError('Unknown pose backend "%s", available: %s' % (name, ', '.join(availableBackends())))
+    return _BACKENDS[name](**params)
+
+
+class PoseBackend:
+    """
+    Base class of the pose backends. Models are loaded on the first process() call (or by
+    warmUp()), so creating a backend is cheap and a backend that is never used costs nothing.
+
+    process() returns the raw result of the backend: a MediaPipe-like results object for the
+    landmark backends ("mediapipe", "stub") or the network output for "openpose".
+    """
+    def __init__(self, **params):
+        self.params = params
+        self.isLoaded = False
+        self.retired = False  # Replaced by PoseDetector.swapBackend, see retire()
+        self.replacement = None  # The backend taking over the frames of a retired one
+        self._lock = threading.Lock()  # Serializes loading, warm-up, inference and closing
+        self._warmUpThread = None
+        self.metrics = sm.DISABLED  # PoseDetector shares its StageMetrics here
+
+    # ----- To implement ----- #
+    def _load(self):
+        raise NotImplementedError
+
+    def _process(self, img):
+        raise NotImplementedError
+
+    def _unload(self):
+        pass
+
+    # ----- Public ----- #
+    def ensureLoaded(self):
+        if not self.isLoaded:
+            with self._lock:
+                if not self.isLoaded:
+                    self._load()
+                    self.isLoaded = True
+
+    def process(self, img):
+        # Loading and inference under one lock acquisition: close() can not slip in between
+        with self._lock:
+            replacement = self.replacement if self.retired and not self.isLoaded else None
+            if replacement is None:
+                if not self.isLoaded:
+                    self._load()
+                    self.isLoaded = True
+                try:
+                    return self._process(img)
+                finally:
+                    if self.retired:
+                        # A frame that picked this backend before it was swapped out: finish it, but do not keep the model
+                        self._unload()
+                        self.isLoaded = False
+        # Retired and unloaded already: loading the model again for one frame would stall it, the new backend is warm
+        return replacement.process(img)
+
+    def warmUp(self, background=True):
+        """
+        Load the model and run one inference on a blank frame, so the first real frame does not
+        pay the cold-start latency.
+        :param background: run in a daemon thread and return immediately
+        :return: Nothing
+        """
+        if background:
+            if self._warmUpThread is None:
+                self._warmUpThread = threading.Thread(target=self.warmUp, args=(False,), daemon=True)
+                self._warmUpThread.start()
+            return
+        self.process(np.zeros((_INT_WARM_UP_SIZE, _INT_WARM_UP_SIZE, 3), dtype=np.uint8))
+        self._clearWarmUpState()
+
+    def _clearWarmUpState(self):
+        # The blank frame must not leave any state behind (frame counters, tracking)
+        self.reset()
+
+    def reset(self):
+        """
+        Forget any state kept between frames (tracking, smoothing).
+        :return: Nothing
+        """
+        pass
+
+    def close(self):
+        with self._lock:
+            if self.isLoaded:
+                self._unload()
+                self.isLoaded = False
+
+    def retire(self, replacement):
+        """
+        Close for good, once replaced: a frame already running on this backend finishes and the model is
+        unloaded right after; a frame that picked this backend but arrives once it is unloaded is handed
+        to the replacement instead of loading the model again.
+        :param replacement: the PoseBackend taking over
+        :return: Nothing
+        """
+        self.replacement = replacement
+        self.retired = True
+        self.close()
+
+    def draw(self, img, results):
+        pass
+
+
+class MediaPipeBackend(PoseBackend):
+    def __init__(self,
+                 static_image_mode=False,
+                 model_complexity=1,
+                 smooth_landmarks=True,
+                 enable_segmentation=False,
+                 smooth_segmentation=True,
+                 min_detection_confidence=0.5,
+                 min_tracking_confidence=0.5,
+                 inputScale=1.0,
+                 **params):
+        super().__init__(**params)
+        self.static_image_mode = static_image_mode
+        self.model_complexity = model_complexity
+        self.smooth_landmarks = smooth_landmarks
+        self.enable_segmentation = enable_segmentation
+        self.smooth_segmentation = smooth_segmentation
+        self.min_detection_confidence = min_detection_confidence
+        self.min_tracking_confidence = min_tracking_confidence
+        self.mpDraw = None
+        self.mpPose = None
+        self.pose = None
+        self.inputScale = inputScale  # < 1: frames are shrunk before inference, the landmarks are normalized anyway
+        self._imgRGB = None  # Reused colour conversion output, MediaPipe copies its input
+        self._imgSmall = None  # Reused resize output when inputScale < 1
+
+    def _createPose(self):
+        return self.mpPose.Pose(self.static_image_mode,
+                                self.model_complexity,
+                                self.smooth_landmarks,
+                                self.enable_segmentation,
+                                self.smooth_segmentation,
+                                self.min_detection_confidence,
+                                self.min_tracking_confidence)
+
+    def _load(self):
+        import mediapipe as mp  # Imported here, MediaPipe is slow to import and large in memory
+        self.mpDraw = mp.solutions.drawing_utils
+        self.mpPose = mp.solutions.pose
+        self.pose = self._createPose()
+
+    def _process(self, img):
+        t0 = self.metrics.start()
+        if self.inputScale < 1.0:
+            h, w = img.shape[:2]
+            size = (max(1, int(round(w * self.inputScale))), max(1, int(round(h * self.inputScale))))
+            if self._imgSmall is None or self._imgSmall.shape[1::-1] != size:
+                self._imgSmall = np.empty((size[1], size[0]) + img.shape[2:], dtype=img.dtype)
+            cv2.resize(img, size, dst=self._imgSmall, interpolation=cv2.INTER_AREA)
+            img = self._imgSmall
+        if self._imgRGB is None or self._imgRGB.shape != img.shape:
+            self._imgRGB = np.empty_like(img)
+        cv2.cvtColor(img, cv2.COLOR_BGR2RGB, dst=self._imgRGB)
+        self.metrics.stop('color_conversion', t0)
+        t0 = self.metrics.start()
+        results = self.pose.process(self._imgRGB)
+        self.metrics.stop('inference', t0)
+        return results
+
+    def _unload(self):
+        self.pose.close()
+        self.pose = None
+
+    def reset(self):
+        with self._lock:
+            if self.isLoaded:
+                self.pose.close()
+                self.pose = self._createPose()
+
+    def _clearWarmUpState(self):
+        # Nothing to clear: MediaPipe finds no pose in a blank frame, so it tracks and smooths nothing yet.
+        # reset() would throw the warmed graph away and build a cold one.
+        pass
+
+    def draw(self, img, results):
+        if results.pose_landmarks:
+            self.mpDraw.draw_landmarks(img, results.pose_landmarks, self.mpPose.POSE_CONNECTIONS)
+
+
+class OpenPoseBackend(PoseBackend):
+    def __init__(self, netPath=None, **params):
+        super().__init__(**params)
+        self.netPath = netPath if netPath is not None else _STR_OPENPOSE_NET_PATH
+        self.net = None
+
+    def _load(self):
+        self.net = cv2.dnn.readNetFromTensorflow(self.netPath)
+
+    def _process(self, blob):
+        # blob: the output of cv2.dnn.blobFromImage, PoseDetector decides the input size
+        t0 = self.metrics.start()
+        self.net.setInput(blob)
+        out = self.net.forward()
+        self.metrics.stop('inference', t0)
+        return out
+
+    def _unload(self):
+        self.net = None
+
+    def warmUp(self, background=True):
+        if background:
+            super().warmUp(background)
+            return
+        self.process(cv2.dnn.blobFromImage(np.zeros((_INT_WARM_UP_SIZE, _INT_WARM_UP_SIZE, 3), dtype=np.uint8),
+                                           1.0, (_INT_WARM_UP_SIZE, _INT_WARM_UP_SIZE),
+                                           (127.5, 127.5, 127.5), swapRB=True, crop=False))
+
+    def getPerfProfile(self):
+        return self.net.getPerfProfile()
+
+
+# ----- Stub ----- #
+class _Landmark:
+    def __init__(self, x, y, z, visibility):
+        self.x = x
+        self.y = y
+        self.z = z
+        self.visibility = visibility
+
+
+class _LandmarkList:
+    def __init__(self, landmark):
+        self.landmark = landmark
+
+
+class _Results:
+    def __init__(self, pose_landmarks, pose_world_landmarks=None, segmentation_mask=None):
+        self.pose_landmarks = pose_landmarks
+        self.pose_world_landmarks = pose_world_landmarks
+        self.segmentation_mask = segmentation_mask
+
+
+def _drawLandmarkDots(img, results):
+    h, w = img.shape[:2]
+    for lm in results.pose_landmarks.landmark:
+        cv2.circle(img, (int(lm.x * w), int(lm.y * h)), 3, (0, 255, 0), cv2.FILLED)
+
+
+# Normalized (x, y) of a person standing in the middle of the frame, in MediaPipe landmark order
+_STUB_POSE = [(0.50, 0.20), (0.51, 0.18), (0.52, 0.18), (0.53, 0.18), (0.49, 0.18), (0.48, 0.18),
+              (0.47, 0.18), (0.55, 0.19), (0.45, 0.19), (0.52, 0.23), (0.48, 0.23), (0.58, 0.30),
+              (0.42, 0.30), (0.62, 0.42), (0.38, 0.42), (0.64, 0.53), (0.36, 0.53), (0.65, 0.56),
+              (0.35, 0.56), (0.64, 0.56), (0.36, 0.56), (0.63, 0.55), (0.37, 0.55), (0.55, 0.55),
+              (0.45, 0.55), (0.56, 0.70), (0.44, 0.70), (0.56, 0.85), (0.44, 0.85), (0.56, 0.87),
+              (0.44, 0.87), (0.58, 0.89), (0.42, 0.89)]
+
+
+class StubBackend(PoseBackend):
+    """
+    Deterministic MediaPipe-like backend for tests and benchmarks: no model, no import cost.
+    The n-th process() call always returns the same pose, swaying slowly from frame to frame.
+    With enable_segmentation, the mask is an ellipse around the pose at a quarter of the frame size.
+    """
+    def __init__(self, enable_segmentation=False, **params):
+        super().__init__(**params)
+        self.enable_segmentation = enable_segmentation
+        self.frameIndex = 0
+
+    def _load(self):
+        pass
+
+    def _process(self, img):
+        t0 = self.metrics.start()
+        sway = 0.02 * math.sin(self.frameIndex * 0.1)
+        self.frameIndex += 1
+        landmarks = [_Landmark(x + sway, y, 0.0, 1.0) for x, y in _STUB_POSE]
+        world = [_Landmark(x - 0.5, y - 0.5, 0.0, 1.0) for x, y in _STUB_POSE]
+        mask = self._mask(img, sway) if self.enable_segmentation else None
+        results = _Results(_LandmarkList(landmarks), _LandmarkList(world), mask)
+        self.metrics.stop('inference', t0)
+        return results
+
+    @staticmethod
+    def _mask(img, sway):
+        h, w = img.shape[0] // 4, img.shape[1] // 4
+        mask = np.zeros((h, w), dtype=np.float32)
+        cv2.ellipse(mask, (int((0.5 + sway) * w), int(0.55 * h)), (int(0.16 * w), int(0.4 * h)), 0, 0, 360, 1.0,
+                    cv2.FILLED)
+        return cv2.GaussianBlur(mask, (5, 5), 0)
+
+    def reset(self):
+        self.frameIndex = 0
+
+    def draw(self, img, results):
+        _drawLandmarkDots(img, results)
+
+
+class ReplayBackend(PoseBackend):
+    """
+    MediaPipe-like results read from a LandmarkRecording file instead of a model.
+    Each process() call returns the next recorded frame (the image is ignored); seek() jumps.
+    """
+    def __init__(self, replayPath=None, loop=False, **params):
+        super().__init__(**params)
+        self.replayPath = replayPath
+        self.loop = loop
+        self.reader = None
+        self.frameIndex = 0
+
+    def _load(self):
+        from lib.core.LandmarkRecording import LandmarkReader
+        self.reader = LandmarkReader(self.replayPath)
+
+    def _unload(self):
+        self.reader.close()
+        self.reader = None
+
+    def seek(self, frameIndex):
+        self.frameIndex = frameIndex
+
+    def _process(self, img):
+        t0 = self.metrics.start()
+        n = len(self.reader)
+        if self.frameIndex >= n and self.loop and n:
+            self.frameIndex %= n
+        if self.frameIndex >= n:
+            return _Results(None)
+        _, lm = self.reader.frame(self.frameIndex)
+        self.frameIndex += 1
+        landmarks = None
+        if lm is not None:
+            landmarks = _LandmarkList([_Landmark(float(x), float(y), float(z), float(v)) for x, y, z, v in lm[:, :4]])
+        self.metrics.stop('inference', t0)
+        return _Results(landmarks)
+
+    def warmUp(self, background=True):
+        self.ensureLoaded()  # Nothing to warm up, opening the file is enough
+
+    def reset(self):
+        self.frameIndex = 0
+
+    def draw(self, img, results):
+        _drawLandmarkDots(img, results)
+
+
+registerBackend('mediapipe', MediaPipeBackend)
+registerBackend('openpose', OpenPoseBackend)
+registerBackend('stub', StubBackend)
+registerBackend('replay', ReplayBackend)
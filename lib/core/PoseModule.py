@@ -1,7 +1,34 @@
 import cv2
-import mediapipe as mp
+import numpy as np
 import time
 import math
+from itertools import chain
+from operator import attrgetter
+
+import lib.core.PoseBackends as pb
+import lib.core.StageMetrics as sm
+from lib.core.OpenPoseDecoder import OpenPoseDecoder
+from lib.core.InferenceCache import InferenceCache
+from lib.core.LandmarkTracker import KeyframeTracker
+
+_INT_MP_LANDMARKS = 33  # MediaPipe Pose landmarks per person
+_INT_DRAW_SHIFT = 4  # Fractional bits for cv2 drawing, keeps subpixel landmark positions
+_INT_DRAW_SCALE = 1 << _INT_DRAW_SHIFT
+_INT_OPENPOSE_STRIDE = 8  # The OpenPose heatmaps are 1/8 of the network input size
+_INT_OPENPOSE_PAD_VALUE = 127  # Letterbox padding, ~0 after the blob mean subtraction
+_INT_ROI_MIN_PARTS = 4  # Keypoints needed to keep a region of interest for the next frame
+_LANDMARK_FIELDS = attrgetter('x', 'y', 'z', 'visibility')  # One lmNormalized row from a MediaPipe landmark
+
+# Bones between MediaPipe Pose landmarks (mediapipe.solutions.pose.POSE_CONNECTIONS, without importing MediaPipe)
+MEDIAPIPE_CONNECTIONS = [(0, 1), (1, 2), (2, 3), (3, 7), (0, 4), (4, 5), (5, 6), (6, 8), (9, 10), (11, 12),
+                         (11, 13), (13, 15), (15, 17), (15, 19), (15, 21), (17, 19), (12, 14), (14, 16), (16, 18),
+                         (16, 20), (16, 22), (18, 20), (11, 23), (12, 24), (23, 24), (23, 25), (24, 26), (25, 27),
+                         (26, 28), (27, 29), (28, 30), (29, 31), (30, 32), (27, 31), (28, 32)]
+
+
+def _drawPoint(x, y):
+    # Fixed point coordinates for cv2 drawing functions called with shift=_INT_DRAW_SHIFT
+    return int(round(x * _INT_DRAW_SCALE)), int(round(y * _INT_DRAW_SCALE))
 
 
 class PoseDetector:
@@ -12,7 +39,15 @@ class PoseDetector:
                  enable_segmentation=False,
                  smooth_segmentation=True,
                  min_detection_confidence=0.5,
-                 min_tracking_confidence=0.5
+                 min_tracking_confidence=0.5,
+                 backend='mediapipe',
+                 backendParams=None,
+                 openPoseBackend='openpose',
+                 netPath=None,
+                 openPoseInputSize=(368, 368),
+                 openPoseRoi=False,
+                 metrics=None,
+                 warmUp=False
                  ):
 
         # MediaPipe Variables
@@ -24,23 +59,45 @@ class PoseDetector:
         self.min_detection_confidence = min_detection_confidence
         self.min_tracking_confidence = min_tracking_confidence
 
-        self.mpDraw = mp.solutions.drawing_utils
-        self.mpPose = mp.solutions.pose
-        self.pose = self.mpPose.Pose(self.static_image_mode,
-                                     self.model_complexity,
-                                     self.smooth_landmarks,
-                                     self.enable_segmentation,
-                                     self.smooth_segmentation,
-                                     self.min_detection_confidence,
-                                     self.min_tracking_confidence)
+        # Backends are created here but load their models on first use (see PoseBackends)
+        self.backendName = backend
+        self.backendParams = dict(backendParams or {})
+        # Per-stage latency timers, shared with the backends (disabled unless given)
+        self.metrics = metrics if metrics is not None else sm.DISABLED
+        self.backend = self.createBackend()
         self.results = None
-        self.lmList = []
+        self.autoscaler = None  # LatencyAutoscaler fed with the inference time of every frame
+
+        # Landmark arrays, one row per landmark: x, y, z, visibility. Allocated once and overwritten
+        # every frame, copy them if they must outlive the next MediaPipe_findPosition call.
+        self.lmNormalized = np.zeros((_INT_MP_LANDMARKS, 4), dtype=np.float32)  # x, y in [0, 1]
+        self.lmPixels = np.zeros((_INT_MP_LANDMARKS, 4), dtype=np.float32)  # x, y (and z) in pixels
+        self._pixelScale = np.ones(4, dtype=np.float32)  # w, h, w, 1
+        self.lmList = []  # self.lmPixels when the last frame had a pose, else an empty list
+        self.angles = []  # (p1, p2, p3, degrees) of the MediaPipe_findAngle calls since the last findPosition
+        self.keyframeTracker = None  # See setKeyframeTracking()
+        self._trackerRunning = False  # The tracker is calling back into this detector on a keyframe
+        self._trackedFrame = False  # The last MediaPipe_findPose was tracked, lmNormalized holds its landmarks
 
         # OpenPose Variables
-        self._NET_PATH = "../dnn_model/graph_opt.pb"
+        self._NET_PATH = netPath  # None: the OpenPose backend default
         self._IMG_WIDTH = 368
         self._IMG_HEIGHT = 368
         self._IMG_THREAD = 0.2
+        self._letterboxCanvas = None  # Reused network input image
+        self._batchCanvases = []  # Reused network input images of OpenPose_findPeopleBatch
+        self.OpenPose_setInputSize(*openPoseInputSize)
+        self.opPoints = []  # Keypoints of the last OpenPose_findPose call
+        self.opDecoder = OpenPoseDecoder()
+        self.opPeople = None  # OpenPoseDecoder.PERSON_DTYPE array of the last OpenPose_findPeople call
+
+        # OpenPose region of interest: run the network only around the previous frame's keypoints
+        self.opRoiEnabled = openPoseRoi
+        self.opRoiPadding = 0.25  # Padding on each side, as a share of the keypoints' box size
+        self.opRoiMinConfidence = 0.3  # Mean keypoint confidence needed to keep the region
+        self.opRoiRefreshEvery = 30  # Frames between full frame runs, to notice new people/parts
+        self.opRoi = None  # (x0, y0, x1, y1) in frame pixels, None: full frame
+        self._opFramesSinceFull = 0
 
         self._BODY_PARTS = {"Nose": 0, "Neck": 1, "RShoulder": 2, "RElbow": 3, "RWrist": 4,
                             "LShoulder": 5, "LElbow": 6, "LWrist": 7, "RHip": 8, "RKnee": 9,
@@ -53,37 +110,194 @@ class PoseDetector:
                             ["LHip", "LKnee"], ["LKnee", "LAnkle"], ["Neck", "Nose"], ["Nose", "REye"],
                             ["REye", "REar"], ["Nose", "LEye"], ["LEye", "LEar"]]
 
-        self.net = cv2.dnn.readNetFromTensorflow(self._NET_PATH)
+        self.opConnections = [(self._BODY_PARTS[a], self._BODY_PARTS[b]) for a, b in self._POSE_PAIRS]
+
+        self.openPose = pb.createBackend(openPoseBackend, netPath=self._NET_PATH)
+        self.openPose.metrics = self.metrics
+
+        if warmUp:
+            self.backend.warmUp(background=True)
+
+    def createBackend(self, model_complexity=None, backendParams=None):
+        """
+        Create (but do not load) a backend with the settings of this detector.
+        :param model_complexity: overrides self.model_complexity
+        :param backendParams: overrides self.backendParams
+        :return: PoseBackend
+        """
+        backend = pb.createBackend(self.backendName,
+                                   **(self.backendParams if backendParams is None else backendParams),
+                                   static_image_mode=self.static_image_mode,
+                                   model_complexity=self.model_complexity if model_complexity is None else model_complexity,
+                                   smooth_landmarks=self.smooth_landmarks,
+                                   enable_segmentation=self.enable_segmentation,
+                                   smooth_segmentation=self.smooth_segmentation,
+                                   min_detection_confidence=self.min_detection_confidence,
+                                   min_tracking_confidence=self.min_tracking_confidence)
+        backend.metrics = self.metrics
+        return backend
+
+    def swapBackend(self, backend, model_complexity=None, backendParams=None):
+        """
+        Replace the backend by one made with createBackend() (and warmed up, so the next frame does not wait).
+        The frame being processed finishes on the old backend, which is retired afterwards.
+        :return: Nothing
+        """
+        old = self.backend
+        self.backend = backend
+        if model_complexity is not None:
+            self.model_complexity = model_complexity
+        if backendParams is not None:
+            self.backendParams = dict(backendParams)
+        old.retire(backend)  # Waits for the frame in progress
+
+    def inferenceParams(self):
+        """
+        :return: the parameters that change the landmarks of MediaPipe_findPose (e.g. for InferenceCache keys)
+        """
+        return {'static_image_mode': self.static_image_mode,
+                'model_complexity': self.model_complexity,
+                'smooth_landmarks': self.smooth_landmarks,
+                'min_detection_confidence': self.min_detection_confidence,
+                'min_tracking_confidence': self.min_tracking_confidence,
+                'backendParams': self.backendParams}
+
+    def setKeyframeTracking(self, enabled=True, **trackerKwargs):
+        """
+        Opt-in keyframe mode: MediaPipe_findPose runs inference only on keyframes and moves the landmarks
+        with optical flow in between (KeyframeTracker, see KeyframeTrackingBenchmark for the cost in accuracy).
+        MediaPipe_findPosition then returns the tracked landmarks; the segmentation mask and the world
+        landmarks stay those of the last keyframe, and only the landmark dots are drawn.
+        :param trackerKwargs: KeyframeTracker arguments (minInterval, maxInterval, driftBudget, ...)
+        :return: Nothing
+        """
+        self.keyframeTracker = KeyframeTracker(self, **trackerKwargs) if enabled else None
+        self._trackedFrame = False
+
+    def MediaPipe_resetTracking(self):
+        # MediaPipe tracks the pose between frames, start over when the input changes stream
+        self.backend.reset()
+        self.results = None
+        self.lmList = []
+        self._trackedFrame = False
+        if self.keyframeTracker is not None and not self._trackerRunning:
+            self._trackerRunning = True
+            try:
+                self.keyframeTracker.reset()  # Calls back into this method
+            finally:
+                self._trackerRunning = False
+
+    def _MediaPipe_trackPose(self, tracker, img):
+        # Keyframe mode: the tracker calls MediaPipe_findPose / MediaPipe_findPosition of this detector on keyframes
+        self._trackerRunning = True
+        try:
+            landmarks, keyframe = tracker.process(img)
+        finally:
+            self._trackerRunning = False
+        self._trackedFrame = not keyframe
+        if self._trackedFrame:
+            h, w = img.shape[:2]
+            self._pixelScale[:3] = (w, h, w)
+            np.divide(landmarks, self._pixelScale, out=self.lmNormalized)
+        return img
 
     def MediaPipe_findPose(self, img, draw=True):
+        tracker = self.keyframeTracker  # Read once: setKeyframeTracking() may be called from another thread
+        if tracker is not None and not self._trackerRunning:
+            if img is not None and img.any():
+                self._MediaPipe_trackPose(tracker, img)
+            return img
         if img is not None and img.any():
-            imgRGB = cv2.cvtColor(img, cv2.COLOR_BGR2RGB)
-            self.results = self.pose.process(imgRGB)
+            backend = self.backend  # Read once: swapBackend() may replace it during this frame
+            if self.autoscaler is not None:
+                t0 = time.perf_counter()
+                self.results = backend.process(img)
+                self.autoscaler.observe(time.perf_counter() - t0)
+            else:
+                self.results = backend.process(img)
             if self.results.pose_landmarks:
                 if draw:
-                    self.mpDraw.draw_landmarks(img, self.results.pose_landmarks,
-                                               self.mpPose.POSE_CONNECTIONS)
+                    t0 = self.metrics.start()
+                    backend.draw(img, self.results)
+                    self.metrics.stop('drawing', t0)
         return img
 
+    def MediaPipe_segmentationMask(self):
+        """
+        :return: the float32 person probability mask of the last MediaPipe_findPose call, at the inference
+                 resolution, or None (enable_segmentation off or no pose)
+        """
+        if self.results is None or getattr(self.results, 'segmentation_mask', None) is None:
+            return None
+        return self.results.segmentation_mask
+
+    def MediaPipe_worldLandmarks(self):
+        """
+        :return: (33, 4) float32 world landmarks (x, y, z in metres around the hip centre, visibility) of the last
+                 MediaPipe_findPose call, or None without a pose; for 3D angles (JointAngleAnalytics)
+        """
+        world = None if self.results is None else getattr(self.results, 'pose_world_landmarks', None)
+        if not world:
+            return None
+        return np.array([(lm.x, lm.y, lm.z, lm.visibility) for lm in world.landmark], dtype=np.float32)
+
     def MediaPipe_findPosition(self, img, draw=True):
+        """
+        Convert the landmarks of the last MediaPipe_findPose call to pixel coordinates of img.
+        :return: self.lmPixels, a (33, 4) float32 array (x, y, z, visibility), or [] without a pose
+                 (test with len(), as for the list this used to return)
+        """
+        if self._trackedFrame and not self._trackerRunning:
+            return self.MediaPipe_positionFromLandmarks(img, self.lmNormalized, draw)
         self.lmList = []
-        if img is not None and img.any():
-            if self.results is not None and self.results.pose_landmarks:
-                for id, lm in enumerate(self.results.pose_landmarks.landmark):
-                    h, w, c = img.shape
-                    # print(id, lm)
-                    cx, cy = int(lm.x * w), int(lm.y * h)
-                    self.lmList.append([id, cx, cy])
-                    if draw:
-                        cv2.circle(img, (cx, cy), 5, (255, 0, 0), cv2.FILLED)
+        self.angles = []
+        if img is None or self.results is None or not self.results.pose_landmarks:
+            return self.lmList
+
+        t0 = self.metrics.start()
+        # One pass over the landmarks into a flat float32 array, no per-landmark numpy call
+        lmNorm = self.lmNormalized
+        lmNorm.reshape(-1)[:] = np.fromiter(chain.from_iterable(map(_LANDMARK_FIELDS,
+                                                                    self.results.pose_landmarks.landmark)),
+                                            dtype=np.float32, count=lmNorm.size)
+        return self._MediaPipe_toPixels(img, draw, t0)
+
+    def MediaPipe_positionFromLandmarks(self, img, lmNormalized, draw=True):
+        """
+        Like MediaPipe_findPosition, for landmarks found elsewhere (another process, a recording).
+        :param lmNormalized: (33, 4) array as PoseDetector.lmNormalized, or None
+        :return: self.lmPixels or []
+        """
+        self.lmList = []
+        self.angles = []
+        if img is None or lmNormalized is None:
+            return self.lmList
+        t0 = self.metrics.start()
+        self.lmNormalized[:] = lmNormalized
+        return self._MediaPipe_toPixels(img, draw, t0)
+
+    def _MediaPipe_toPixels(self, img, draw, t0):
+        # t0: start of the 'landmarks' stage
+        h, w = img.shape[:2]
+        self._pixelScale[:3] = (w, h, w)  # MediaPipe z uses roughly the same scale as x
+        np.multiply(self.lmNormalized, self._pixelScale, out=self.lmPixels)
+        self.lmList = self.lmPixels
+        self.metrics.stop('landmarks', t0)
+
+        if draw:
+            t0 = self.metrics.start()
+            for x, y in self.lmPixels[:, :2]:
+                cv2.circle(img, _drawPoint(x, y), 5 * _INT_DRAW_SCALE, (255, 0, 0), cv2.FILLED,
+                           shift=_INT_DRAW_SHIFT)
+            self.metrics.stop('drawing', t0)
         return self.lmList
 
     def MediaPipe_findAngle(self, img, p1, p2, p3, draw=True):
 
         # Get the landmarks
-        x1, y1 = self.lmList[p1][1:]
-        x2, y2 = self.lmList[p2][1:]
-        x3, y3 = self.lmList[p3][1:]
+        x1, y1 = self.lmList[p1, :2]
+        x2, y2 = self.lmList[p2, :2]
+        x3, y3 = self.lmList[p3, :2]
 
         # Calculate the Angle
         angle = math.degrees(math.atan2(y3 - y2, x3 - x2) -
@@ -92,31 +306,124 @@ class PoseDetector:
             angle += 360
 
         # print(angle)
+        self.angles.append((p1, p2, p3, angle))  # For overlays drawn outside the frame (SkeletonRenderer)
 
         # Draw
         if draw:
-            cv2.line(img, (x1, y1), (x2, y2), (255, 255, 255), 3)
-            cv2.line(img, (x3, y3), (x2, y2), (255, 255, 255), 3)
-            cv2.circle(img, (x1, y1), 10, (0, 0, 255), cv2.FILLED)
-            cv2.circle(img, (x1, y1), 15, (0, 0, 255), 2)
-            cv2.circle(img, (x2, y2), 10, (0, 0, 255), cv2.FILLED)
-            cv2.circle(img, (x2, y2), 15, (0, 0, 255), 2)
-            cv2.circle(img, (x3, y3), 10, (0, 0, 255), cv2.FILLED)
-            cv2.circle(img, (x3, y3), 15, (0, 0, 255), 2)
-            cv2.putText(img, str(int(angle)), (x2 - 50, y2 + 50),
+            pt1, pt2, pt3 = _drawPoint(x1, y1), _drawPoint(x2, y2), _drawPoint(x3, y3)
+            r10, r15 = 10 * _INT_DRAW_SCALE, 15 * _INT_DRAW_SCALE
+            cv2.line(img, pt1, pt2, (255, 255, 255), 3, shift=_INT_DRAW_SHIFT)
+            cv2.line(img, pt3, pt2, (255, 255, 255), 3, shift=_INT_DRAW_SHIFT)
+            for pt in (pt1, pt2, pt3):
+                cv2.circle(img, pt, r10, (0, 0, 255), cv2.FILLED, shift=_INT_DRAW_SHIFT)
+                cv2.circle(img, pt, r15, (0, 0, 255), 2, shift=_INT_DRAW_SHIFT)
+            cv2.putText(img, str(int(angle)), (int(x2) - 50, int(y2) + 50),
                         cv2.FONT_HERSHEY_PLAIN, 2, (0, 0, 255), 2)
         return angle
 
-    def OpenPose_findPose(self, img):
-        imgWidth = img.shape[1]
-        imgHeight = img.shape[0]
-        self.net.setInput(cv2.dnn.blobFromImage(img, 1.0, (imgWidth, imgHeight), (127.5, 127.5, 127.5), swapRB=True, crop=False))
-        out = self.net.forward()
+    def OpenPose_setInputSize(self, width, height=None):
+        """
+        Set the network input size. The frame is letterboxed into it (aspect ratio kept), so the
+        network cost depends on this size only, not on the camera resolution.
+        :param width: input width in pixels, rounded up to the network stride (8)
+        :param height: input height in pixels (default: width)
+        :return: Nothing
+        """
+        if height is None:
+            height = width
+        self._IMG_WIDTH = -(-int(width) // _INT_OPENPOSE_STRIDE) * _INT_OPENPOSE_STRIDE
+        self._IMG_HEIGHT = -(-int(height) // _INT_OPENPOSE_STRIDE) * _INT_OPENPOSE_STRIDE
+        self._letterboxCanvas = None
+        self._batchCanvases = []
+
+    def _OpenPose_fit(self, img, canvas):
+        """
+        Draw img into canvas (the network input size), keeping the aspect ratio and padding the rest.
+        :return: (scale, padX, padY), where netCoord = imgCoord * scale + pad
+        """
+        imgHeight, imgWidth = img.shape[:2]
+        scale = min(self._IMG_WIDTH / imgWidth, self._IMG_HEIGHT / imgHeight)
+        newWidth = max(1, int(round(imgWidth * scale)))
+        newHeight = max(1, int(round(imgHeight * scale)))
+        padX = (self._IMG_WIDTH - newWidth) // 2
+        padY = (self._IMG_HEIGHT - newHeight) // 2
+
+        # Padding with the mean value makes it zero after the blob's mean subtraction
+        canvas[:] = _INT_OPENPOSE_PAD_VALUE
+        interpolation = cv2.INTER_AREA if scale < 1 else cv2.INTER_LINEAR
+        canvas[padY:padY + newHeight, padX:padX + newWidth] = cv2.resize(img, (newWidth, newHeight),
+                                                                         interpolation=interpolation)
+        return scale, padX, padY
+
+    def _OpenPose_letterbox(self, img):
+        """
+        Fit img into the network input size, keeping the aspect ratio and padding the rest.
+        :return: (blob, scale, padX, padY), where netCoord = imgCoord * scale + pad
+        """
+        canvas = self._letterboxCanvas
+        if canvas is None or canvas.shape != (self._IMG_HEIGHT, self._IMG_WIDTH, 3):
+            canvas = np.empty((self._IMG_HEIGHT, self._IMG_WIDTH, 3), dtype=np.uint8)
+            self._letterboxCanvas = canvas
+        scale, padX, padY = self._OpenPose_fit(img, canvas)
+        blob = cv2.dnn.blobFromImage(canvas, 1.0, (self._IMG_WIDTH, self._IMG_HEIGHT),
+                                     (127.5, 127.5, 127.5), swapRB=True, crop=False)
+        return blob, scale, padX, padY
+
+    def _OpenPose_forward(self, img, roi=None):
+        """
+        Run the network on img, or only on the roi (x0, y0, x1, y1) crop of it.
+        :return: (out, scale, padX, padY), where frameCoord = (netCoord - pad) / scale
+        """
+        t0 = self.metrics.start()
+        if roi is None:
+            blob, scale, padX, padY = self._OpenPose_letterbox(img)
+            self.metrics.stop('preprocess', t0)
+            return self.openPose.process(blob), scale, padX, padY
+        x0, y0, x1, y1 = roi
+        blob, scale, padX, padY = self._OpenPose_letterbox(img[y0:y1, x0:x1])
+        self.metrics.stop('preprocess', t0)
+        # Fold the crop offset into the padding so callers map coordinates the same way
+        return self.openPose.process(blob), scale, padX - x0 * scale, padY - y0 * scale
+
+    def _OpenPose_nextRoi(self):
+        if not self.opRoiEnabled or self.opRoi is None or self._opFramesSinceFull >= self.opRoiRefreshEvery:
+            self._opFramesSinceFull = 0
+            return None
+        self._opFramesSinceFull += 1
+        return self.opRoi
+
+    def _OpenPose_roiFromKeypoints(self, xy, conf, imgShape):
+        """
+        :param xy: (n, 2) frame coordinates of the found keypoints
+        :param conf: (n,) their confidences
+        :return: padded (x0, y0, x1, y1) box around them, or None if they are too few or too weak
+        """
+        if len(xy) < _INT_ROI_MIN_PARTS or float(np.mean(conf)) < self.opRoiMinConfidence:
+            return None
+        imgHeight, imgWidth = imgShape[:2]
+        (xMin, yMin), (xMax, yMax) = np.min(xy, axis=0), np.max(xy, axis=0)
+        pad = self.opRoiPadding * max(xMax - xMin, yMax - yMin)
+        x0, y0 = max(0, int(xMin - pad)), max(0, int(yMin - pad))
+        x1, y1 = min(imgWidth, int(np.ceil(xMax + pad))), min(imgHeight, int(np.ceil(yMax + pad)))
+        if x1 - x0 < _INT_OPENPOSE_STRIDE or y1 - y0 < _INT_OPENPOSE_STRIDE:
+            return None
+        return x0, y0, x1, y1
+
+    def _OpenPose_decodeSingle(self, out, scale, padX, padY):
+        """
+        Global maximum of each heatmap, mapped to frame coordinates.
+        :return: (points, confidences), points[i] is (x, y) or None
+        """
+        t0 = self.metrics.start()
         out = out[:, :19, :, :]
-
         assert(len(self._BODY_PARTS) == out.shape[1])
 
+        # Heatmap cell -> network input pixel -> original frame pixel
+        stepX = self._IMG_WIDTH / out.shape[3]
+        stepY = self._IMG_HEIGHT / out.shape[2]
+
         points = []
+        confidences = []
         for i in range(len(self._BODY_PARTS)):
             # Slice heatmap of corresponding body's part.
             heatMap = out[0, i, :, :]
@@ -125,48 +432,196 @@ class PoseDetector:
             # we just find a global one. However only a single pose at the same time
             # could be detected this way.
             _, conf, _, point = cv2.minMaxLoc(heatMap)
-            x = (imgWidth * point[0]) / out.shape[3]
-            y = (imgHeight * point[1]) / out.shape[2]
+            x = (point[0] * stepX - padX) / scale
+            y = (point[1] * stepY - padY) / scale
 
             # Add a point if it's confidence is higher than threshold.
-            points.append((int(x), int(y)) if conf > self._IMG_THREAD else None)
-
-        for pair in self._POSE_PAIRS:
-            partFrom = pair[0]
-            partTo = pair[1]
-            assert (partFrom in self._BODY_PARTS)
-            assert (partTo in self._BODY_PARTS)
-
-            idFrom = self._BODY_PARTS[partFrom]
-            idTo = self._BODY_PARTS[partTo]
-
-            if points[idFrom] and points[idTo]:
-                cv2.line(img, points[idFrom], points[idTo], (0, 255, 0), 3)
-                cv2.ellipse(img, points[idFrom], (3, 3), 0, 0, 360, (0, 0, 255), cv2.FILLED)
-                cv2.ellipse(img, points[idTo], (3, 3), 0, 0, 360, (0, 0, 255), cv2.FILLED)
+            points.append((x, y) if conf > self._IMG_THREAD else None)
+            confidences.append(conf)
+        self.metrics.stop('landmarks', t0)
+        return points, confidences
+
+    def _OpenPose_findPoseRoi(self, img):
+        # Background is not a keypoint, leave it out of the region of interest
+        partCount = len(self._BODY_PARTS) - 1
+        roi = self._OpenPose_nextRoi()
+        while True:
+            points, confidences = self._OpenPose_decodeSingle(*self._OpenPose_forward(img, roi))
+            found = [i for i in range(partCount) if points[i] is not None]
+            xy = np.array([points[i] for i in found], dtype=np.float64).reshape(-1, 2)
+            newRoi = self._OpenPose_roiFromKeypoints(xy, [confidences[i] for i in found], img.shape)
+            if newRoi is None and roi is not None:
+                # Lost the person inside the crop: retry this frame on the full frame
+                roi = None
+                self._opFramesSinceFull = 0
+                continue
+            self.opRoi = newRoi
+            return points
+
+    def OpenPose_findPose(self, img, draw=True):
+        """
+        Find the keypoints of one person with the OpenPose network.
+        The keypoints are stored in self.opPoints as (x, y) float frame coordinates, or None per part.
+        :return: img
+        """
+        self.opPoints = []
+        if img is None:
+            return img
+
+        if self.opRoiEnabled:
+            points = self._OpenPose_findPoseRoi(img)
+        else:
+            points, _ = self._OpenPose_decodeSingle(*self._OpenPose_forward(img))
+        self.opPoints = points
 
-        t, _ = self.net.getPerfProfile()
-        freq = cv2.getTickFrequency() / 1000
-        cv2.putText(img, '%.2fms' % (t / freq), (10, 20), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 0, 0))
+        if draw:
+            t0 = self.metrics.start()
+            for pair in self._POSE_PAIRS:
+                partFrom = pair[0]
+                partTo = pair[1]
+                assert (partFrom in self._BODY_PARTS)
+                assert (partTo in self._BODY_PARTS)
+
+                idFrom = self._BODY_PARTS[partFrom]
+                idTo = self._BODY_PARTS[partTo]
+
+                if points[idFrom] and points[idTo]:
+                    ptFrom = _drawPoint(*points[idFrom])
+                    ptTo = _drawPoint(*points[idTo])
+                    cv2.line(img, ptFrom, ptTo, (0, 255, 0), 3, shift=_INT_DRAW_SHIFT)
+                    cv2.ellipse(img, ptFrom, (3 * _INT_DRAW_SCALE, 3 * _INT_DRAW_SCALE), 0, 0, 360,
+                                (0, 0, 255), cv2.FILLED, shift=_INT_DRAW_SHIFT)
+                    cv2.ellipse(img, ptTo, (3 * _INT_DRAW_SCALE, 3 * _INT_DRAW_SCALE), 0, 0, 360,
+                                (0, 0, 255), cv2.FILLED, shift=_INT_DRAW_SHIFT)
+
+            t, _ = self.openPose.getPerfProfile()
+            freq = cv2.getTickFrequency() / 1000
+            cv2.putText(img, '%.2fms' % (t / freq), (10, 20), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 0, 0))
+            self.metrics.stop('drawing', t0)
 
         return img
 
+    def _OpenPose_decodePeople(self, out, scale, padX, padY):
+        """
+        :param out: network output of one image, (1, 57, h, w)
+        :return: OpenPoseDecoder.PERSON_DTYPE array, keypoints in frame pixels
+        """
+        t0 = self.metrics.start()
+        people = self.opDecoder.decode(out[0, :19], out[0, 19:57])
+        self.metrics.stop('landmarks', t0)
+
+        # Heatmap cell -> network input pixel -> original frame pixel, for every person at once
+        kp = people['keypoints']
+        kp[..., 0] = (kp[..., 0] * (self._IMG_WIDTH / out.shape[3]) - padX) / scale
+        kp[..., 1] = (kp[..., 1] * (self._IMG_HEIGHT / out.shape[2]) - padY) / scale
+        return people
+
+    def OpenPose_findPeopleBatch(self, images):
+        """
+        Find the people of several frames (of any sizes) with a single forward pass: every frame is
+        letterboxed into the input size and the network runs once on cv2.dnn.blobFromImages.
+        No region of interest and no drawing, the frames need not come from the same stream.
+        :return: list of OpenPoseDecoder.PERSON_DTYPE arrays, one per image, keypoints in its pixels
+        """
+        if not images:
+            return []
+        t0 = self.metrics.start()
+        while len(self._batchCanvases) < len(images):
+            self._batchCanvases.append(np.empty((self._IMG_HEIGHT, self._IMG_WIDTH, 3), dtype=np.uint8))
+        canvases = self._batchCanvases[:len(images)]
+        fits = [self._OpenPose_fit(img, canvas) for img, canvas in zip(images, canvases)]
+        blob = cv2.dnn.blobFromImages(canvases, 1.0, (self._IMG_WIDTH, self._IMG_HEIGHT),
+                                      (127.5, 127.5, 127.5), swapRB=True, crop=False)
+        self.metrics.stop('preprocess', t0)
+        out = self.openPose.process(blob)
+        return [self._OpenPose_decodePeople(out[i:i + 1], *fit) for i, fit in enumerate(fits)]
+
+    def OpenPose_findPeople(self, img, draw=True):
+        """
+        Find every person in the frame with the heatmaps and the part affinity fields.
+        :return: OpenPoseDecoder.PERSON_DTYPE array (also in self.opPeople), keypoints in frame pixels
+        """
+        self.opPeople = None
+        if img is None:
+            return self.opPeople
+
+        roi = self._OpenPose_nextRoi()
+        while True:
+            people = self._OpenPose_decodePeople(*self._OpenPose_forward(img, roi))
+            kp = people['keypoints']
+            if not self.opRoiEnabled:
+                break
+            # One region around everybody found
+            found = kp[..., 2] > 0
+            newRoi = self._OpenPose_roiFromKeypoints(kp[found][:, :2], kp[found][:, 2], img.shape)
+            if newRoi is None and roi is not None:
+                roi = None  # Lost everybody inside the crop: retry this frame on the full frame
+                self._opFramesSinceFull = 0
+                continue
+            self.opRoi = newRoi
+            break
+        self.opPeople = people
 
-def MediaPipe_main():
-    cap = cv2.VideoCapture('../../PoseVideos/pv_05.mp4')
+        if draw:
+            t0 = self.metrics.start()
+            for person in people:
+                points = person['keypoints']
+                for pair in self._POSE_PAIRS:
+                    idFrom = self._BODY_PARTS[pair[0]]
+                    idTo = self._BODY_PARTS[pair[1]]
+                    if points[idFrom, 2] > 0 and points[idTo, 2] > 0:
+                        ptFrom = _drawPoint(*points[idFrom, :2])
+                        ptTo = _drawPoint(*points[idTo, :2])
+                        cv2.line(img, ptFrom, ptTo, (0, 255, 0), 3, shift=_INT_DRAW_SHIFT)
+                        cv2.ellipse(img, ptFrom, (3 * _INT_DRAW_SCALE, 3 * _INT_DRAW_SCALE), 0, 0, 360,
+                                    (0, 0, 255), cv2.FILLED, shift=_INT_DRAW_SHIFT)
+                        cv2.ellipse(img, ptTo, (3 * _INT_DRAW_SCALE, 3 * _INT_DRAW_SCALE), 0, 0, 360,
+                                    (0, 0, 255), cv2.FILLED, shift=_INT_DRAW_SHIFT)
+            self.metrics.stop('drawing', t0)
+        return self.opPeople
+
+
+def MediaPipe_main(cacheDir=None, recordPath=None):
+    videoPath = '../../PoseVideos/pv_05.mp4'
+    cap = cv2.VideoCapture(videoPath)
     pTime = 0
     detector = PoseDetector()
+    recorder = None
+    if recordPath is not None:
+        from lib.core.VideoRecorder import VideoRecorder
+        # Every frame of the video is wanted: wait for the encoder rather than drop
+        recorder = VideoRecorder(recordPath, fps=cap.get(cv2.CAP_PROP_FPS) or 30.0, policy='block').start()
+    cache = cacheEntry = None
+    if cacheDir is not None:
+        cache = InferenceCache(cacheDir)
+        cacheEntry = cache.open(videoPath, detector.backendName, detector.inferenceParams(),
+                                fps=cap.get(cv2.CAP_PROP_FPS))
+    frameIndex = 0
     while True:
         success, img = cap.read()
-        img = detector.MediaPipe_findPose(img)
+        hit = False
+        if success and cacheEntry is not None:
+            # Same video and settings as a previous run: its landmarks instead of running MediaPipe
+            hit, lmNormalized = cacheEntry.lookup(frameIndex)
+        if not hit:
+            img = detector.MediaPipe_findPose(img)
         if img is not None and img.any():
-            _ = detector.MediaPipe_findPosition(img, draw=True)
+            if hit:
+                detector.MediaPipe_positionFromLandmarks(img, lmNormalized, draw=True)
+            else:
+                lmPixels = detector.MediaPipe_findPosition(img, draw=True)
+                if cacheEntry is not None:
+                    h, w = img.shape[:2]
+                    cacheEntry.store(frameIndex, detector.lmNormalized if len(lmPixels) != 0 else None, w, h)
+            frameIndex += 1
             cTime = time.time()
             fps = 1 / (cTime - pTime)
             pTime = cTime
 
             cv2.putText(img, str(int(fps)), (70, 50), cv2.FONT_HERSHEY_PLAIN, 3,
                         (255, 0, 0), 3)
+            if recorder is not None:
+                recorder.submit(img)
 
             scale_percent = 30  # percent of original size
             width = int(img.shape[1] * scale_percent / 100)
@@ -180,6 +635,11 @@ def MediaPipe_main():
             cv2.waitKey(1)
         else:
             break
+    if cacheEntry is not None:
+        cacheEntry.close(complete=not success)  # Only a run to the end of the video is cached
+        print(cache.stats())
+    if recorder is not None:
+        print(recorder.stop())
 
 
 def OpenPose_main():
@@ -188,6 +648,8 @@ def OpenPose_main():
     detector = PoseDetector()
     while True:
         success, img = cap.read()
+        if not success:
+            break
         img = detector.OpenPose_findPose(img)
         if img is not None and img.any():
             cTime = time.time()
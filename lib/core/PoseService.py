@@ -0,0 +1,431 @@
+"""
+Local pose inference service: one process holds the models, other processes on the host send
+frames and get landmark arrays back.
+
+    python -m lib.core.PoseService --socket /tmp/pose.sock --workers 2 --net dnn_model/graph_opt.pb
+    python -m lib.core.PoseService --address 127.0.0.1:8765 --backend stub
+
+    client = PoseClient('/tmp/pose.sock')
+    lmNormalized = client.landmarks(img)  # (33, 4) float32 (x, y in [0, 1], z, visibility) or None
+    people = client.people(img)  # OpenPoseDecoder.PERSON_DTYPE array, keypoints in img pixels
+    client.stats()
+
+MediaPipe requests are served by a pool of worker threads, each with its own PoseDetector
+(MediaPipe runs its graph outside the GIL). OpenPose requests go through one batcher that waits
+up to maxWaitMs for more requests and runs them as a single blobFromImages forward pass.
+
+Wire format, both directions: a 4-byte little endian header length, a JSON header, then
+header['nbytes'] bytes of payload (the raw frame, JPEG bytes or the result array).
+"""
+import os
+import sys
+import json
+import time
+import queue
+import socket
+import struct
+import argparse
+import threading
+import socketserver
+
+import cv2
+import numpy as np
+
+import lib.core.PoseModule as pm
+import lib.core.PoseBackends as pb
+import lib.core.StageMetrics as sm
+from lib.core.OpenPoseDecoder import PERSON_DTYPE
+
+_STR_DEFAULT_SOCKET = '/tmp/pose_service.sock'
+_STR_HEADER_FORMAT = '<I'
+_INT_HEADER_SIZE = struct.calcsize(_STR_HEADER_FORMAT)
+_INT_MAX_BATCH = 8  # OpenPose frames per forward pass
+_FLOAT_MAX_WAIT_MS = 5.0  # How long the first request of a batch waits for company
+_FLOAT_REQUEST_TIMEOUT = 30.0  # Seconds a connection waits for its result, covers the model load of the first request
+_INT_MP_LANDMARKS = 33
+
+
+# ---------------------- #
+# ----- Wire Format ----- #
+# ---------------------- #
+def _recvExactly(sock, nbytes):
+    buffer = bytearray(nbytes)
+    view = memoryview(buffer)
+    received = 0
+    while received < nbytes:
+        n = sock.recv_into(view[received:], nbytes - received)
+        if n == 0:
+            raise ConnectionError('Connection closed')
+        received += n
+    return buffer
+
+
+def sendMessage(sock, header, payload=b''):
+    header = dict(header, nbytes=memoryview(payload).nbytes)
+    headerBytes = json.dumps(header).encode()
+    sock.sendall(struct.pack(_STR_HEADER_FORMAT, len(headerBytes)) + headerBytes)
+    if header['nbytes']:
+        sock.sendall(payload)
+
+
+def recvMessage(sock):
+    """
+    :return: (header dict, payload bytearray)
+    """
+    headerSize, = struct.unpack(_STR_HEADER_FORMAT, _recvExactly(sock, _INT_HEADER_SIZE))
+    header = json.loads(_recvExactly(sock, headerSize).decode())  # ValueError when not JSON
+    if not isinstance(header, dict) or not isinstance(header.get('nbytes'), int) or header['nbytes'] < 0:
+        raise ValueError('Malformed message header')
+    payload = _recvExactly(sock, header['nbytes']) if header['nbytes'] else bytearray()
+    return header, payload
+
+
+def _decodeImage(header, payload):
+    if header.get('encoding') == 'jpeg':
+        return cv2.imdecode(np.frombuffer(payload, dtype=np.uint8), cv2.IMREAD_COLOR)
+    return np.frombuffer(payload, dtype=np.uint8).reshape(header['shape'])
+
+
+def _parseAddress(address):
+    # 'host:port' is TCP on localhost, anything else a Unix socket path
+    host, _, port = address.rpartition(':')
+    if host and port.isdigit():
+        return socket.AF_INET, (host, int(port))
+    return socket.AF_UNIX, address
+
+
+# ------------------ #
+# ----- Server ----- #
+# ------------------ #
+class _Request:
+    def __init__(self, op, img):
+        self.op = op
+        self.img = img
+        self.received = time.perf_counter()
+        self.result = None
+        self.error = None
+        self.done = threading.Event()
+
+
+class PoseService:
+    """
+    :param workers: MediaPipe worker threads, each with its own PoseDetector
+    :param detectorKwargs: PoseDetector arguments of the workers (static_image_mode defaults to True,
+                           requests of different clients interleave, so there is no stream to track)
+    :param netPath: OpenPose graph, None: the backend default (loaded on the first 'people' request)
+    :param requestTimeout: seconds a request waits for its result before it is answered with an error
+    """
+    def __init__(self, address=_STR_DEFAULT_SOCKET, workers=2, detectorKwargs=None, netPath=None,
+                 openPoseInputSize=(368, 368), maxBatch=_INT_MAX_BATCH, maxWaitMs=_FLOAT_MAX_WAIT_MS,
+                 requestTimeout=_FLOAT_REQUEST_TIMEOUT):
+        self.address = address
+        self.requestTimeout = requestTimeout
+        self.maxBatch = max(1, maxBatch)
+        self.maxWait = maxWaitMs / 1000.0
+        self.metrics = sm.StageMetrics(enabled=True)  # Latencies: queue wait, inference, request total
+        self._lock = threading.Lock()  # Many threads write the same stages and counters
+        self.requests = 0
+        self.errors = 0
+        self.batches = 0
+        self.batchedFrames = 0
+        self._mpQueue = queue.Queue()
+        self._opQueue = queue.Queue()
+        self._queues = {'landmarks': self._mpQueue, 'people': self._opQueue}
+        self._alive = {'landmarks': max(1, workers), 'people': 1}  # Threads still serving each queue
+        self._exitReasons = {}  # Why the last thread of a queue stopped
+        self._stopEvent = threading.Event()
+        self._server = None
+
+        detectorKwargs = dict(detectorKwargs or {})
+        detectorKwargs.setdefault('static_image_mode', True)
+        self._workers = [threading.Thread(target=self._mediaPipeWorker, args=(pm.PoseDetector(**detectorKwargs),),
+                                          daemon=True) for _ in range(max(1, workers))]
+        # MediaPipe is never used by the batcher, the stub keeps it from being loaded there. The batcher
+        # thread is the only writer of the preprocess/inference/landmarks stages.
+        self._opDetector = pm.PoseDetector(backend='stub', netPath=netPath, openPoseInputSize=openPoseInputSize,
+                                           metrics=self.metrics)
+        self._batcher = threading.Thread(target=self._openPoseBatcher, daemon=True)
+
+    # ----- Workers ----- #
+    def _record(self, stage, t0):
+        with self._lock:
+            self.metrics.stop(stage, t0)
+
+    def _finish(self, request, result=None, error=None):
+        request.result = result
+        request.error = error
+        request.done.set()
+
+    def _exit(self, op, reason):
+        # Once the last thread serving a queue is gone nobody answers it: fail what waits there and what comes later
+        with self._lock:
+            self._alive[op] -= 1
+            if self._alive[op] > 0:
+                return
+            self._exitReasons[op] = reason
+        while True:
+            try:
+                self._finish(self._queues[op].get_nowait(), error=reason)
+            except queue.Empty:
+                break
+
+    def _mediaPipeWorker(self, detector):
+        try:
+            detector.backend.warmUp(background=False)
+        except Exception as e:
+            self._exit('landmarks', 'MediaPipe worker could not load its model: %s' % e)
+            return
+        try:
+            self._serveMediaPipe(detector)
+        finally:
+            self._exit('landmarks', 'Pose service stopped')
+
+    def _serveMediaPipe(self, detector):
+        while not self._stopEvent.is_set():
+            try:
+                request = self._mpQueue.get(timeout=0.1)
+            except queue.Empty:
+                continue
+            self._record('mediapipe_queue_wait', request.received)
+            t0 = self.metrics.start()
+            try:
+                detector.results = None  # Never answer with the previous client's pose
+                detector.MediaPipe_findPose(request.img, draw=False)
+                found = len(detector.MediaPipe_findPosition(request.img, draw=False)) != 0
+                self._finish(request, detector.lmNormalized.copy() if found else None)
+            except Exception as e:
+                self._finish(request, error=str(e))
+            self._record('mediapipe', t0)
+
+    def _openPoseBatcher(self):
+        try:
+            self._serveOpenPose()
+        finally:
+            self._exit('people', 'Pose service stopped')
+
+    def _serveOpenPose(self):
+        while not self._stopEvent.is_set():
+            try:
+                batch = [self._opQueue.get(timeout=0.1)]
+            except queue.Empty:
+                continue
+            # Collect what arrives within maxWait of the first request, up to maxBatch
+            deadline = time.perf_counter() + self.maxWait
+            while len(batch) < self.maxBatch:
+                remaining = deadline - time.perf_counter()
+                try:
+                    batch.append(self._opQueue.get(timeout=remaining) if remaining > 0 else self._opQueue.get_nowait())
+                except queue.Empty:
+                    break
+            for request in batch:
+                self._record('openpose_queue_wait', request.received)
+            t0 = self.metrics.start()
+            try:
+                people = self._opDetector.OpenPose_findPeopleBatch([request.img for request in batch])
+                for request, result in zip(batch, people):
+                    self._finish(request, result)
+            except Exception as e:
+                for request in batch:
+                    self._finish(request, error=str(e))
+            self._record('openpose_batch', t0)
+            with self._lock:
+                self.batches += 1
+                self.batchedFrames += len(batch)
+
+    # ----- Requests ----- #
+    def submit(self, op, img):
+        """
+        Queue a frame and wait for its result (called by the connection threads).
+        Raises RuntimeError when the request failed, timed out or nothing serves its queue any more.
+        :return: lmNormalized copy or None for 'landmarks', a PERSON_DTYPE array for 'people'
+        """
+        if op not in self._queues:
+            raise ValueError('Unknown request: %s' % op)
+        request = _Request(op, img)
+        with self._lock:
+            # Under the lock _exit() takes: a request is either queued before the queue is drained or refused
+            if not self._alive[op]:
+                raise RuntimeError(self._exitReasons[op])
+            self._queues[op].put(request)
+        if request.done.wait(self.requestTimeout):
+            error = request.error
+        else:
+            error = 'No result after %.1f s' % self.requestTimeout  # A late result is dropped with the request
+        with self._lock:
+            self.metrics.stop('request', request.received)
+            self.requests += 1
+            if error is not None:
+                self.errors += 1
+        if error is not None:
+            raise RuntimeError(error)
+        return request.result
+
+    def stats(self):
+        latency = {}
+        with self._lock:
+            stages = self.metrics.stages()
+        for stage, hist in stages:
+            p50, p95, p99 = hist.quantiles()
+            latency[stage] = {'count': hist.count, 'mean_ms': 1000 * hist.mean(),
+                              'p50_ms': 1000 * p50, 'p95_ms': 1000 * p95, 'p99_ms': 1000 * p99}
+        return {'queue_depth': {'landmarks': self._mpQueue.qsize(), 'people': self._opQueue.qsize()},
+                'workers': dict(self._alive), 'stopped': dict(self._exitReasons),
+                'requests': self.requests, 'errors': self.errors, 'batches': self.batches,
+                'mean_batch_size': self.batchedFrames / self.batches if self.batches else 0.0,
+                'latency': latency}
+
+    def _handle(self, sock):
+        while not self._stopEvent.is_set():
+            try:
+                header, payload = recvMessage(sock)
+            except (ConnectionError, OSError):
+                return
+            except ValueError as e:
+                # Without a valid header the payload size is unknown: answer, then drop the connection
+                sendMessage(sock, {'ok': False, 'error': str(e)})
+                return
+            op = header.get('op')
+            try:
+                if op == 'stats':
+                    sendMessage(sock, {'ok': True, 'stats': self.stats()})
+                    continue
+                result = self.submit(op, _decodeImage(header, payload))
+                if result is None:
+                    sendMessage(sock, {'ok': True, 'found': False})
+                else:
+                    sendMessage(sock, {'ok': True, 'found': True, 'shape': list(result.shape)}, result.tobytes())
+            except (KeyError, TypeError, ValueError, RuntimeError, cv2.error) as e:
+                # KeyError / TypeError: a header without or with a wrong 'shape' or 'op'
+                sendMessage(sock, {'ok': False, 'error': '%s: %s' % (type(e).__name__, e)})
+
+    # ----- Lifecycle ----- #
+    def start(self):
+        family, address = _parseAddress(self.address)
+        service = self
+
+        class Handler(socketserver.BaseRequestHandler):
+            def handle(self):
+                service._handle(self.request)
+
+        if family == socket.AF_UNIX:
+            if os.path.exists(address):
+                os.remove(address)  # Left over by a service that did not shut down cleanly
+            self._server = socketserver.ThreadingUnixStreamServer(address, Handler)
+        else:
+            self._server = socketserver.ThreadingTCPServer(address, Handler)
+        self._server.daemon_threads = True
+        for worker in self._workers:
+            worker.start()
+        self._batcher.start()
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+
+    def stop(self):
+        self._stopEvent.set()
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            family, address = _parseAddress(self.address)
+            if family == socket.AF_UNIX and os.path.exists(address):
+                os.remove(address)
+        for worker in self._workers:
+            worker.join()
+        self._batcher.join()
+
+
+# ------------------ #
+# ----- Client ----- #
+# ------------------ #
+class PoseClient:
+    """
+    One connection to a PoseService, one request at a time. Use one client per thread.
+    :param jpeg: send frames JPEG-encoded (less to copy over TCP, slower than raw over a Unix socket)
+    """
+    def __init__(self, address=_STR_DEFAULT_SOCKET, jpeg=False, jpegQuality=90):
+        family, sockAddress = _parseAddress(address)
+        self.sock = socket.socket(family, socket.SOCK_STREAM)
+        self.sock.connect(sockAddress)
+        if family == socket.AF_INET:
+            self.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self.jpeg = jpeg
+        self.jpegQuality = jpegQuality
+
+    def _request(self, op, img):
+        if self.jpeg:
+            _, encoded = cv2.imencode('.jpg', img, [cv2.IMWRITE_JPEG_QUALITY, self.jpegQuality])
+            sendMessage(self.sock, {'op': op, 'encoding': 'jpeg'}, encoded.tobytes())
+        else:
+            img = np.ascontiguousarray(img)
+            sendMessage(self.sock, {'op': op, 'encoding': 'raw', 'shape': list(img.shape)}, img.data)
+        header, payload = recvMessage(self.sock)
+        if not header['ok']:
+            raise RuntimeError('Pose service: ' + header['error'])
+        return header, payload
+
+    def landmarks(self, img):
+        """
+        :return: (33, 4) float32 normalized landmarks (as PoseDetector.lmNormalized) or None
+        """
+        header, payload = self._request('landmarks', img)
+        if not header['found']:
+            return None
+        return np.frombuffer(payload, dtype=np.float32).reshape(_INT_MP_LANDMARKS, 4)
+
+    def people(self, img):
+        """
+        :return: OpenPoseDecoder.PERSON_DTYPE array, keypoints in img pixels
+        """
+        header, payload = self._request('people', img)
+        if not header['found']:
+            return np.zeros(0, dtype=PERSON_DTYPE)
+        return np.frombuffer(payload, dtype=PERSON_DTYPE)
+
+    def stats(self):
+        sendMessage(self.sock, {'op': 'stats'})
+        header, _ = recvMessage(self.sock)
+        return header['stats']
+
+    def close(self):
+        self.sock.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Serve pose landmarks to local processes.')
+    parser.add_argument('--socket', default=_STR_DEFAULT_SOCKET, help='Unix socket path')
+    parser.add_argument('--address', help='host:port to listen on TCP instead (e.g. 127.0.0.1:8765)')
+    parser.add_argument('--workers', '-j', type=int, default=2, help='MediaPipe worker threads')
+    parser.add_argument('--backend', default='mediapipe', choices=pb.availableBackends())
+    parser.add_argument('--model-complexity', type=int, default=1, choices=[0, 1, 2])
+    parser.add_argument('--net', help='OpenPose graph_opt.pb path')
+    parser.add_argument('--openpose-size', type=int, default=368)
+    parser.add_argument('--max-batch', type=int, default=_INT_MAX_BATCH, help='OpenPose frames per forward pass')
+    parser.add_argument('--max-wait-ms', type=float, default=_FLOAT_MAX_WAIT_MS,
+                        help='how long an OpenPose request waits for others to batch with')
+    parser.add_argument('--request-timeout', type=float, default=_FLOAT_REQUEST_TIMEOUT,
+                        help='seconds a request waits for its result before it gets an error')
+    parser.add_argument('--metrics-prom', help='rewrite this Prometheus text file with the latencies')
+    args = parser.parse_args(argv)
+
+    service = PoseService(args.address or args.socket, workers=args.workers,
+                          detectorKwargs={'backend': args.backend, 'model_complexity': args.model_complexity},
+                          netPath=args.net, openPoseInputSize=(args.openpose_size, args.openpose_size),
+                          maxBatch=args.max_batch, maxWaitMs=args.max_wait_ms, requestTimeout=args.request_timeout)
+    exporter = None
+    if args.metrics_prom:
+        exporter = sm.MetricsExporter(service.metrics, promPath=args.metrics_prom, prefix='pose_service')
+        exporter.start()
+    service.start()
+    print('Pose service listening on %s' % service.address)
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        service.stop()
+        if exporter is not None:
+            exporter.stop()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
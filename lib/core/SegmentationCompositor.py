@@ -0,0 +1,97 @@
+"""
+Background blur / replacement with the MediaPipe segmentation mask.
+
+The mask only ever exists at low resolution: maskToAlpha() shrinks it to a uint8 alpha of
+_INT_ALPHA_WIDTH pixels across. The GL path (TextureRenderer.setMask) uploads that as an alpha
+texture and lets the texture sampler scale it up. The CPU path (SegmentationCompositor, used by
+VideoRecorder for the recorded video) scales it up as uint8 and blends in uint8 with saturating
+OpenCV arithmetic into preallocated buffers. No full-resolution float array is ever made. The
+blurred background is blurred at 1/_INT_BLUR_DIVISOR of the frame size.
+"""
+import cv2
+import numpy as np
+
+_INT_ALPHA_WIDTH = 256  # Width of the alpha mask, the height follows the frame aspect ratio
+_INT_BLUR_DIVISOR = 8  # The background is blurred at 1/8 of the frame size
+_INT_BLUR_KERNEL = 5  # Gaussian kernel at that size, about 40 px of blur on the full frame
+_FLOAT_UINT8_SCALE = 1 / 255
+
+MODES = ('none', 'blur', 'replace')
+
+
+def maskToAlpha(mask, width=_INT_ALPHA_WIDTH, out=None):
+    """
+    :param mask: float32 (h, w) person probabilities in [0, 1], any resolution
+    :param width: width of the alpha, the mask is never made larger than it is
+    :param out: uint8 array to reuse when its shape matches
+    :return: uint8 (h', w') alpha, 255 on the person
+    """
+    h, w = mask.shape[:2]
+    if w > width:
+        size = (width, max(1, int(round(h * width / w))))
+        mask = cv2.resize(mask, size, interpolation=cv2.INTER_LINEAR)
+    if out is None or out.shape != mask.shape:
+        out = np.empty(mask.shape, dtype=np.uint8)
+    cv2.convertScaleAbs(mask, dst=out, alpha=255.0)
+    return out
+
+
+class SegmentationCompositor:
+    """
+    CPU compositing, for outputs without the GL renderer: VideoRecorder applies it to the recorded frames.
+    :param mode: 'none', 'blur' or 'replace'
+    :param background: BGR image shown behind the person in 'replace' mode
+    """
+    def __init__(self, mode='blur', background=None):
+        if mode not in MODES:
+            raise ValueError('Unknown compositing mode "%s", available: %s' % (mode, ', '.join(MODES)))
+        self.mode = mode
+        self.background = background
+        self._shape = None
+        self._alphaGray = None  # Full size uint8 alpha
+        self._alpha = None  # The same, 3 channels
+        self._back = None  # Full size background
+        self._small = None  # Blur buffer
+
+    def _allocate(self, shape):
+        self._shape = shape
+        self._alphaGray = np.empty(shape[:2], dtype=np.uint8)
+        self._alpha = np.empty(shape, dtype=np.uint8)
+        self._back = np.empty(shape, dtype=np.uint8)
+        h, w = shape[:2]
+        self._small = np.empty((max(1, h // _INT_BLUR_DIVISOR), max(1, w // _INT_BLUR_DIVISOR)) + shape[2:], dtype=np.uint8)
+        if self.mode == 'replace' and self.background is not None:
+            cv2.resize(self.background, (w, h), dst=self._back, interpolation=cv2.INTER_AREA)  # Once per size
+
+    def setBackground(self, background):
+        self.background = background
+        self._shape = None
+
+    def composite(self, img, alpha):
+        """
+        Blend img over the blurred or replaced background, in place.
+        The blend is several cheap uint8 passes rather than one fused cv2.blendLinear: blendLinear needs
+        full resolution float32 weights and is about twice as slow (SegmentationBenchmark).
+        :param img: uint8 BGR frame
+        :param alpha: uint8 low resolution alpha from maskToAlpha, in the frame orientation, or None
+        :return: img
+        """
+        if self.mode == 'none' or alpha is None or (self.mode == 'replace' and self.background is None):
+            return img
+        if img.shape != self._shape:
+            self._allocate(img.shape)
+        h, w = img.shape[:2]
+        if self.mode == 'blur':
+            # Subsampling aliases, but the blur below hides it and it is 15x cheaper than INTER_AREA
+            cv2.resize(img, self._small.shape[1::-1], dst=self._small, interpolation=cv2.INTER_LINEAR)
+            cv2.GaussianBlur(self._small, (_INT_BLUR_KERNEL, _INT_BLUR_KERNEL), 0, dst=self._small)
+            cv2.resize(self._small, (w, h), dst=self._back, interpolation=cv2.INTER_LINEAR)
+        # img = img * a + back * (1 - a) in uint8
+        cv2.resize(alpha, (w, h), dst=self._alphaGray, interpolation=cv2.INTER_LINEAR)
+        cv2.cvtColor(self._alphaGray, cv2.COLOR_GRAY2BGR, dst=self._alpha)
+        cv2.multiply(img, self._alpha, dst=img, scale=_FLOAT_UINT8_SCALE)
+        cv2.bitwise_not(self._alpha, dst=self._alpha)
+        # The replacement background is resized once per frame size and must survive: write into _alpha
+        cv2.multiply(self._back, self._alpha, dst=self._alpha, scale=_FLOAT_UINT8_SCALE)
+        cv2.add(img, self._alpha, dst=img)
+        return img
@@ -0,0 +1,335 @@
+"""
+Multiprocess frame pipeline over shared memory:
+
+    capture process --[frame ring]--> inference processes --[landmark ring]--> compose thread -> render
+
+Frames and landmarks never go through pickling: the capture process decodes straight into a slot
+of a multiprocessing.shared_memory ring, the inference processes read the slot zero-copy, and
+write their (33, 4) landmark arrays into a second, small ring. The compose thread in the GUI
+process copies the frame of the newest result into a pooled buffer, hands it to processFrame
+(drawing and mirroring) and queues it for the render stage, so capture, inference and rendering
+each get their own core.
+
+Every slot carries a sequence number used as a seqlock: a writer sets it to -1, writes the slot,
+then stores the new sequence number. A reader checks the number before and after using a slot and
+drops what it read if the slot was rewritten meanwhile (with a few slots more than readers this
+only happens when a reader falls a whole ring behind).
+
+Capture starts once the inference processes have loaded their models. A camera then delivers
+frames at its own rate; a video file is read at the rate it was recorded at, so the ring is not
+overwritten faster than the workers read it.
+"""
+import os
+import time
+import threading
+import multiprocessing as mproc
+from multiprocessing import shared_memory
+
+import numpy as np
+
+import lib.core.PoseModule as pm
+from lib.core.FrameBufferPool import FrameBufferPool
+from lib.core.FramePipeline import Frame, LatestFrameQueue
+
+_INT_FRAME_SLOTS = 8
+_INT_RESULT_SLOTS = 16
+_INT_MP_LANDMARKS = 33
+_INT_META_ALIGN = 64  # Slot data starts on a cache line
+_FLOAT_POLL = 0.001  # Seconds between checks for new slots (no cross-process condition variable)
+_FLOAT_START_TIMEOUT = 10.0  # Seconds to wait for the capture process to report its frame size
+_FLOAT_JOIN_TIMEOUT = 2.0
+_FLOAT_READY_TIMEOUT = 30.0  # Seconds a file source waits for the inference processes to load their models
+_FLOAT_FILE_FPS = 30.0  # Pace of a video file that does not tell its frame rate
+
+_META_DTYPE = np.dtype([('seq', '<i8'), ('timestamp', '<f8'), ('aux', '<i8')])
+
+
+class SharedRing:
+    """
+    Ring of equally shaped array slots in shared memory. Create it with a shape in one process,
+    attach to it by spec() in the others.
+    """
+    def __init__(self, shape, dtype=np.uint8, slots=_INT_FRAME_SLOTS, name=None):
+        self.itemShape = tuple(shape)
+        self.dtype = np.dtype(dtype)
+        self.slots = slots
+        dataOffset = -(-slots * _META_DTYPE.itemsize // _INT_META_ALIGN) * _INT_META_ALIGN
+        itemBytes = int(np.prod(self.itemShape)) * self.dtype.itemsize
+        self.owner = name is None
+        if self.owner:
+            self.shm = shared_memory.SharedMemory(create=True, size=dataOffset + slots * itemBytes)
+        else:
+            self.shm = shared_memory.SharedMemory(name=name)
+        self.meta = np.ndarray((slots,), dtype=_META_DTYPE, buffer=self.shm.buf)
+        self.items = np.ndarray((slots,) + self.itemShape, dtype=self.dtype, buffer=self.shm.buf, offset=dataOffset)
+        if self.owner:
+            self.meta[:] = 0  # seq 0: empty
+
+    def spec(self):
+        """
+        :return: picklable arguments to attach with SharedRing.attach() in another process
+        """
+        return self.shm.name, self.itemShape, self.dtype.str, self.slots
+
+    @classmethod
+    def attach(cls, spec):
+        name, shape, dtype, slots = spec
+        return cls(shape, dtype, slots, name=name)
+
+    def beginWrite(self, seq):
+        """
+        :return: the slot of seq, to be filled in place before endWrite()
+        """
+        slot = seq % self.slots
+        self.meta['seq'][slot] = -1
+        return self.items[slot]
+
+    def endWrite(self, seq, timestamp, aux=0):
+        slot = seq % self.slots
+        self.meta['timestamp'][slot] = timestamp
+        self.meta['aux'][slot] = aux
+        self.meta['seq'][slot] = seq  # Last: publishes the slot
+
+    def write(self, seq, array, timestamp, aux=0):
+        np.copyto(self.beginWrite(seq), array)
+        self.endWrite(seq, timestamp, aux)
+
+    def latestSeq(self, residue=0, modulus=1):
+        """
+        :return: the newest published sequence number with seq % modulus == residue, 0 if none
+        """
+        seqs = self.meta['seq'].copy()
+        seqs = seqs[(seqs > 0) & (seqs % modulus == residue)]
+        return int(seqs.max()) if seqs.size else 0
+
+    def read(self, seq):
+        """
+        :return: (zero-copy view, timestamp, aux), or None if the slot no longer holds seq.
+                 Check isValid(seq) after using the view.
+        """
+        slot = seq % self.slots
+        if self.meta['seq'][slot] != seq:
+            return None
+        return self.items[slot], float(self.meta['timestamp'][slot]), int(self.meta['aux'][slot])
+
+    def isValid(self, seq):
+        return self.meta['seq'][seq % self.slots] == seq
+
+    def close(self):
+        # The views must go before the mapping
+        self.meta = None
+        self.items = None
+        self.shm.close()
+        if self.owner:
+            self.shm.unlink()
+
+
+# ------------------------------- #
+# ----- Process entry points ----- #
+# ------------------------------- #
+def _isFileSource(source):
+    return isinstance(source, str) and os.path.isfile(source)
+
+
+def _captureMain(source, conn, stopEvent, ready, realtime):
+    import cv2
+    cap = cv2.VideoCapture(source)
+    success, img = cap.read()
+    conn.send(img.shape if success else None)  # The parent creates the ring for this frame size
+    if not success:
+        cap.release()
+        return
+    ring = SharedRing.attach(conn.recv())
+    try:
+        ready.wait(_FLOAT_READY_TIMEOUT)  # Frames before the models are loaded would only be overwritten
+    except threading.BrokenBarrierError:
+        pass  # A worker failed or took too long: go on anyway
+    period = 0.0
+    if realtime and _isFileSource(source):
+        period = 1.0 / (cap.get(cv2.CAP_PROP_FPS) or _FLOAT_FILE_FPS)  # One frame per frame period, as a camera
+    seq = 1
+    ring.write(seq, img, time.monotonic())
+    due = time.monotonic() + period
+    while not stopEvent.is_set():
+        if period:
+            delay = due - time.monotonic()
+            if delay > 0 and stopEvent.wait(delay):
+                break
+            due = max(due, time.monotonic() - period) + period  # A late frame does not make the next ones burst
+        slot = ring.beginWrite(seq + 1)
+        success, img = cap.read(image=slot)  # Decodes into shared memory when the size matches
+        if not success:
+            stopEvent.wait(0.1)  # End of a file or a camera drop out; the slot stays unpublished
+            continue
+        seq += 1
+        if img is not slot:
+            np.copyto(slot, img)
+        ring.endWrite(seq, time.monotonic())
+    cap.release()
+    ring.close()
+
+
+def _inferenceMain(frameSpec, resultSpec, index, count, detectorKwargs, stopEvent, ready):
+    frames = SharedRing.attach(frameSpec)
+    results = SharedRing.attach(resultSpec)
+    detector = pm.PoseDetector(**detectorKwargs)
+    try:
+        detector.backend.warmUp(background=False)
+    except Exception:
+        ready.abort()  # Do not keep the capture process waiting for this worker
+        raise
+    try:
+        ready.wait(_FLOAT_READY_TIMEOUT)
+    except threading.BrokenBarrierError:
+        pass  # Another worker failed or the capture process stopped waiting
+    lastSeq = 0
+    while not stopEvent.is_set():
+        # Worker i of n takes the frames with seq % n == i, newest first
+        seq = frames.latestSeq(index, count)
+        if seq <= lastSeq:
+            time.sleep(_FLOAT_POLL)
+            continue
+        slot = frames.read(seq)
+        if slot is None:
+            continue
+        img, timestamp, _ = slot
+        detector.results = None
+        detector.MediaPipe_findPose(img, draw=False)  # Read only, the frame slot is shared
+        found = len(detector.MediaPipe_findPosition(img, draw=False)) != 0
+        img = None
+        if frames.isValid(seq):  # Otherwise the frame was overwritten during inference
+            results.write(seq, detector.lmNormalized, timestamp, aux=int(found))
+        lastSeq = seq
+    frames.close()
+    results.close()
+
+
+class MultiprocessPipeline:
+    """
+    Drop-in for FramePipeline with inference in separate processes.
+    :param source: camera index or video path, opened by the capture process
+    :param processFrame: callable(frame) run in the GUI process on the newest result: frame.image is a
+                         private copy of the frame, frame.landmarks the (33, 4) normalized landmarks or None
+    :param workers: inference processes
+    :param detectorKwargs: PoseDetector arguments of the inference processes
+    :param realtime: read a video file at its frame rate (False: as fast as it decodes, the workers then
+                     only see some of the frames)
+    """
+    def __init__(self, source, processFrame, workers=2, detectorKwargs=None, slots=_INT_FRAME_SLOTS,
+                 queueSize=1, realtime=True):
+        self.source = source
+        self.processFrame = processFrame
+        self.workers = max(1, workers)
+        self.detectorKwargs = dict(detectorKwargs or {})
+        self.realtime = realtime
+        self.slots = max(slots, 2 * self.workers + 2)  # A slot per worker in use, plus the ones being written
+        self.renderQueue = LatestFrameQueue(queueSize)
+        self.bufferPool = FrameBufferPool(queueSize + 3)  # Composing, queued, shown, spare
+        self.frameRing = None
+        self.resultRing = None
+        self.composed = 0
+        self._context = mproc.get_context('spawn')  # No fork of a process running Qt and GL threads
+        self._stopEvent = self._context.Event()
+        self._ready = self._context.Barrier(self.workers + 1)  # The workers after warm-up and the capture process
+        self._processes = []
+        self._composeThread = None
+        self._composeStop = threading.Event()
+        self._lastSeq = 0
+
+    def start(self):
+        parentConn, childConn = self._context.Pipe()
+        capture = self._context.Process(target=_captureMain,
+                                        args=(self.source, childConn, self._stopEvent, self._ready, self.realtime),
+                                        daemon=True)
+        capture.start()
+        self._processes.append(capture)
+        if not parentConn.poll(_FLOAT_START_TIMEOUT):
+            self.stop()
+            raise IOError('The capture process did not start: %s' % self.source)
+        shape = parentConn.recv()
+        if shape is None:
+            self.stop()
+            raise IOError('Could not read from video source: %s' % self.source)
+        self.frameRing = SharedRing(shape, np.uint8, self.slots)
+        self.resultRing = SharedRing((_INT_MP_LANDMARKS, 4), np.float32, _INT_RESULT_SLOTS)
+        parentConn.send(self.frameRing.spec())
+        for i in range(self.workers):
+            worker = self._context.Process(target=_inferenceMain,
+                                           args=(self.frameRing.spec(), self.resultRing.spec(), i, self.workers,
+                                                 self.detectorKwargs, self._stopEvent, self._ready), daemon=True)
+            worker.start()
+            self._processes.append(worker)
+        self._composeThread = threading.Thread(target=self._compose, daemon=True)
+        self._composeThread.start()
+
+    def _compose(self):
+        lastSeq = 0
+        pTime = time.monotonic()
+        while not self._composeStop.is_set():
+            seq = self.resultRing.latestSeq()
+            if seq <= lastSeq:
+                time.sleep(_FLOAT_POLL)
+                continue
+            result = self.resultRing.read(seq)
+            slot = self.frameRing.read(seq)
+            if result is None or slot is None:
+                lastSeq = seq
+                continue
+            landmarks, _, found = result
+            landmarks = landmarks.copy() if found else None
+            img, timestamp, _ = slot
+            buffer = self.bufferPool.acquire(img.shape)
+            np.copyto(buffer, img)
+            img = None
+            if not self.frameRing.isValid(seq) or not self.resultRing.isValid(seq):
+                self.bufferPool.release(buffer)  # Torn copy
+                lastSeq = seq
+                continue
+            frame = Frame(seq, timestamp, buffer)
+            frame._pool = self.bufferPool
+            frame.landmarks = landmarks
+            cTime = time.monotonic()
+            frame.fps = 1 / max(cTime - pTime, 1e-6)
+            pTime = cTime
+            self.processFrame(frame)
+            self.renderQueue.put(frame)
+            self.composed += 1
+            lastSeq = seq
+
+    def stop(self):
+        self._stopEvent.set()
+        self._ready.abort()  # Nobody keeps waiting for a process that is going away
+        self._composeStop.set()
+        if self._composeThread is not None:
+            self._composeThread.join()
+            self._composeThread = None
+        for process in self._processes:
+            process.join(_FLOAT_JOIN_TIMEOUT)
+            if process.is_alive():
+                process.terminate()
+        self._processes = []
+        self.renderQueue.clear()
+        for ring in (self.frameRing, self.resultRing):
+            if ring is not None:
+                ring.close()
+        self.frameRing = None
+        self.resultRing = None
+
+    def getLatestFrame(self):
+        """
+        Non-blocking. Return the newest finished frame if it is newer than the last one returned.
+        :return: Frame or None
+        """
+        frame = self.renderQueue.getLatest()
+        if frame is None:
+            return None
+        if frame.seq <= self._lastSeq:
+            frame.release()
+            return None
+        self._lastSeq = frame.seq
+        return frame
+
+    def droppedFrames(self):
+        # Captured frames that were never shown (skipped by the workers or replaced before rendering)
+        captured = self.frameRing.latestSeq() if self.frameRing is not None else 0
+        return max(0, captured - self.composed) + self.renderQueue.dropped
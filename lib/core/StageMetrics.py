@@ -0,0 +1,154 @@
+import os
+import time
+import threading
+
+import numpy as np
+
+_INT_WINDOW = 512  # Samples kept per stage for the rolling percentiles
+_LIST_QUANTILES = [0.5, 0.95, 0.99]
+_FLOAT_EXPORT_INTERVAL = 5.0  # Seconds between CSV/Prometheus flushes
+
+
+class RollingHistogram:
+    """
+    Latency samples of one stage: a fixed-size ring of the last samples for percentiles,
+    plus lifetime count and sum. Writers never allocate; readers copy the ring.
+    """
+    def __init__(self, window=_INT_WINDOW):
+        self._samples = np.zeros(window, dtype=np.float64)
+        self._index = 0
+        self.count = 0
+        self.total = 0.0
+
+    def add(self, seconds):
+        self._samples[self._index] = seconds
+        self._index = (self._index + 1) % self._samples.size
+        self.count += 1
+        self.total += seconds
+
+    def window(self):
+        return self._samples[:min(self.count, self._samples.size)].copy()
+
+    def quantiles(self, qs=_LIST_QUANTILES):
+        samples = self.window()
+        if samples.size == 0:
+            return [0.0] * len(qs)
+        return list(np.quantile(samples, qs))
+
+    def mean(self):
+        samples = self.window()
+        return float(samples.mean()) if samples.size else 0.0
+
+
+class StageMetrics:
+    """
+    Per-stage latency timers. Usage on a hot path:
+
+        t0 = metrics.start()
+        ...
+        metrics.stop('inference', t0)
+
+    When disabled, start() returns None and stop() returns at once, so the cost is two calls.
+    One writer thread per stage is assumed; readers (overlay, exporter) may run on any thread.
+    """
+    def __init__(self, enabled=False, window=_INT_WINDOW):
+        self.enabled = enabled
+        self._window = window
+        self._stages = {}  # name -> RollingHistogram, in first-seen order
+        self._lock = threading.Lock()  # Only taken when a new stage shows up
+
+    def start(self):
+        return time.perf_counter() if self.enabled else None
+
+    def stop(self, stage, t0):
+        if t0 is None:
+            return
+        elapsed = time.perf_counter() - t0
+        hist = self._stages.get(stage)
+        if hist is None:
+            with self._lock:
+                hist = self._stages.setdefault(stage, RollingHistogram(self._window))
+        hist.add(elapsed)
+
+    def stages(self):
+        return list(self._stages.items())
+
+    def reset(self):
+        with self._lock:
+            self._stages = {}
+
+    def overlayLines(self):
+        """
+        :return: one short 'stage p50/p95 ms' text line per stage, for an on-screen overlay
+        """
+        lines = []
+        for name, hist in self.stages():
+            p50, p95 = hist.quantiles([0.5, 0.95])
+            lines.append('%s %.1f/%.1f ms' % (name, 1000 * p50, 1000 * p95))
+        return lines
+
+    def csvRows(self, timestamp):
+        rows = []
+        for name, hist in self.stages():
+            p50, p95, p99 = hist.quantiles()
+            rows.append('%.3f,%s,%d,%.6f,%.6f,%.6f,%.6f\n' % (timestamp, name, hist.count, hist.mean(),
+                                                               p50, p95, p99))
+        return rows
+
+    def prometheusText(self, prefix='pose'):
+        """
+        :return: the metrics in the Prometheus text exposition format (a summary per stage)
+        """
+        name = prefix + '_stage_latency_seconds'
+        lines = ['# HELP %s Per-stage frame latency (rolling window quantiles).' % name,
+                 '# TYPE %s summary' % name]
+        for stage, hist in self.stages():
+            for q, value in zip(_LIST_QUANTILES, hist.quantiles()):
+                lines.append('%s{stage="%s",quantile="%g"} %.9f' % (name, stage, q, value))
+            lines.append('%s_sum{stage="%s"} %.9f' % (name, stage, hist.total))
+            lines.append('%s_count{stage="%s"} %d' % (name, stage, hist.count))
+        return '\n'.join(lines) + '\n'
+
+
+# Shared disabled instance for objects created without metrics
+DISABLED = StageMetrics(enabled=False)
+
+
+class MetricsExporter(threading.Thread):
+    """
+    Periodically appends the stage statistics to a CSV file and rewrites a Prometheus text file
+    (e.g. for the node_exporter textfile collector). Either path may be None.
+    """
+    _CSV_HEADER = 'timestamp,stage,count,mean_s,p50_s,p95_s,p99_s\n'
+
+    def __init__(self, metrics: StageMetrics, csvPath=None, promPath=None, interval=_FLOAT_EXPORT_INTERVAL,
+                 prefix='pose'):
+        super().__init__(daemon=True)
+        self.metrics = metrics
+        self.csvPath = csvPath
+        self.promPath = promPath
+        self.interval = interval
+        self.prefix = prefix
+        self._stopEvent = threading.Event()
+
+    def flush(self):
+        if self.csvPath:
+            newFile = not os.path.exists(self.csvPath)
+            with open(self.csvPath, 'a') as f:
+                if newFile:
+                    f.write(self._CSV_HEADER)
+                f.writelines(self.metrics.csvRows(time.time()))
+        if self.promPath:
+            tmpPath = self.promPath + '.tmp'
+            with open(tmpPath, 'w') as f:
+                f.write(self.metrics.prometheusText(self.prefix))
+            os.replace(tmpPath, self.promPath)  # Scrapers never read a half written file
+
+    def run(self):
+        while not self._stopEvent.wait(self.interval):
+            self.flush()
+        self.flush()
+
+    def stop(self):
+        self._stopEvent.set()
+        self.join()
@@ -0,0 +1,251 @@
+"""
+Saves the annotated output (optionally the raw frames and the landmarks too) without slowing the
+live loop down: submit() only copies the frame into a pooled buffer and queues it, a background
+thread encodes. cv2.VideoWriter.write releases the GIL, so encoding runs next to capture and
+inference instead of adding its time to every frame.
+
+    recorder = VideoRecorder('session.mp4', fps=30, policy='drop', segmentSeconds=600).start()
+    recorder.submit(img, timestamp, landmarks=detector.lmNormalized)  # for every finished frame
+    recorder.stop()  # Encodes what is queued and closes the files
+    print(recorder.stats())
+
+The queue is bounded. When the encoder falls behind, policy 'drop' skips the new frame (counted
+in 'dropped', the live loop never waits) and 'block' waits for room (nothing is lost, the live
+loop slows down to the encoding rate). With segmentSeconds / segmentBytes the output is split
+into session_000.mp4, session_001.mp4, ... each with its _raw video and .plm landmarks.
+
+Background blur / replacement is done on screen by the GL renderer; for the recorded video a
+SegmentationCompositor does the same on the encoder thread, with the alpha given to submit().
+"""
+import os
+import time
+import queue
+import logging
+import threading
+
+import cv2
+
+from lib.core.FrameBufferPool import FrameBufferPool
+from lib.core.LandmarkRecording import LandmarkRecorder
+
+_INT_QUEUE = 32  # Frames waiting for the encoder, about a second at 30 fps
+_FLOAT_FPS = 30.0
+_STR_FOURCC = 'mp4v'
+_INT_SIZE_CHECK = 30  # Frames between two checks of the segment file size
+_FLOAT_BLOCK_POLL = 0.1  # Seconds between checks for stop() while blocked on a full queue
+
+POLICIES = ('drop', 'block')
+
+logger = logging.getLogger(__name__)
+
+
+class VideoRecorder:
+    """
+    :param path: output video, the segment number is added before the extension when segmenting
+    :param fps: frame rate written in the file
+    :param queueSize: frames waiting for the encoder before the policy applies
+    :param policy: 'drop' or 'block', see the module docstring
+    :param segmentSeconds: start a new segment after this much frame time, None for no limit
+    :param segmentBytes: start a new segment once the video file reaches this size, None for no limit
+    :param recordRaw: also write the raw frames given to submit() to <name>_raw<ext>
+    :param recordLandmarks: also write the landmarks given to submit() to <name>.plm (LandmarkRecording)
+    :param compositor: SegmentationCompositor applied to the frames submitted with an alpha, may be replaced
+                       while recording (only the encoder thread uses it)
+    """
+    def __init__(self, path, fps=_FLOAT_FPS, fourcc=_STR_FOURCC, queueSize=_INT_QUEUE, policy='drop',
+                 segmentSeconds=None, segmentBytes=None, recordRaw=False, recordLandmarks=False, compositor=None):
+        if policy not in POLICIES:
+            raise ValueError('Unknown recording policy "%s", available: %s' % (policy, ', '.join(POLICIES)))
+        self.path = path
+        self.fps = fps
+        self.fourcc = fourcc
+        self.policy = policy
+        self.segmentSeconds = segmentSeconds
+        self.segmentBytes = segmentBytes
+        self.recordRaw = recordRaw
+        self.recordLandmarks = recordLandmarks
+        self.compositor = compositor
+        self.segmentPaths = []  # Annotated video of every segment started so far
+        self.error = None  # Set when the encoder had to stop, submit() refuses frames from then on
+        # Counters, each written by one thread only: submitted and dropped by the caller, the rest by the encoder
+        self.submitted = 0
+        self.dropped = 0
+        self.encoded = 0
+        self.encodeSeconds = 0.0
+        self.closedBytes = 0  # Size of the finished segments
+        self._queue = queue.Queue(maxsize=queueSize)
+        self._pool = FrameBufferPool(queueSize + 2)  # Queued copies plus the one being encoded
+        self._rawPool = FrameBufferPool(queueSize + 2)
+        self._thread = None
+        self._running = False
+        self._writer = None
+        self._rawWriter = None
+        self._landmarks = None
+        self._segmentShape = None
+        self._segmentStart = None  # Timestamp of the first frame of the segment
+        self._segmentFrames = 0
+
+    def start(self):
+        if self._thread is None:
+            self._running = True
+            self._thread = threading.Thread(target=self._run, name='VideoRecorder', daemon=True)
+            self._thread.start()
+        return self
+
+    def submit(self, img, timestamp=None, raw=None, landmarks=None, overlay=None, alpha=None):
+        """
+        Queue a finished frame. The images are copied, the caller may reuse them right away.
+        :param img: annotated BGR frame
+        :param timestamp: seconds (e.g. Frame.timestamp), for the segment duration and the landmark file
+        :param raw: the frame before annotation, written when recordRaw
+        :param landmarks: (33, 4) normalized landmarks or None, written when recordLandmarks
+        :param overlay: drawn on the copy by the encoder thread (PoseOverlay.drawInto), for frames whose
+                        annotations are only drawn on screen
+        :param alpha: uint8 person alpha of img (maskToAlpha, same orientation), composited by the encoder
+                      thread with self.compositor before the overlay is drawn
+        :return: True if the frame was queued, False if it was dropped
+        """
+        if not self._running or self.error is not None or img is None:
+            return False
+        self.submitted += 1
+        if self.policy == 'drop' and self._queue.full():
+            self.dropped += 1  # Dropped before paying for the copy
+            return False
+        copy = self._pool.acquire(img.shape, img.dtype)
+        copy[...] = img
+        rawCopy = None
+        if self.recordRaw and raw is not None:
+            rawCopy = self._rawPool.acquire(raw.shape, raw.dtype)
+            rawCopy[...] = raw
+        if self.recordLandmarks and landmarks is not None:
+            landmarks = landmarks.copy()
+        if self.compositor is not None and alpha is not None:
+            alpha = alpha.copy()  # A few kB
+        else:
+            alpha = None
+        item = (copy, time.monotonic() if timestamp is None else timestamp, rawCopy, landmarks, overlay, alpha)
+        if self.policy == 'drop':
+            try:
+                self._queue.put_nowait(item)
+                return True
+            except queue.Full:
+                self._release(item)
+                self.dropped += 1
+                return False
+        while self._running:
+            try:
+                self._queue.put(item, timeout=_FLOAT_BLOCK_POLL)
+                return True
+            except queue.Full:
+                continue
+        self._release(item)
+        return False
+
+    def _release(self, item):
+        self._pool.release(item[0])
+        self._rawPool.release(item[2])
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                break
+            if self.error is None:
+                try:
+                    self._write(*item)
+                except Exception as e:
+                    self.error = e
+                    logger.error('Video recorder stopped: %s', e)
+            self._release(item)
+        self._closeSegment()
+
+    def _segmentPath(self, index, suffix, extension=None):
+        base, ext = os.path.splitext(self.path)
+        if self.segmentSeconds or self.segmentBytes:
+            base = '%s_%03d' % (base, index)
+        return base + suffix + (ext if extension is None else extension)
+
+    def _needsNewSegment(self, img, timestamp):
+        if self._writer is None or img.shape != self._segmentShape:
+            return True
+        if self.segmentSeconds and timestamp - self._segmentStart >= self.segmentSeconds:
+            return True
+        if self.segmentBytes and self._segmentFrames % _INT_SIZE_CHECK == 0:
+            # The writer buffers a little, the size is a close lower bound
+            return os.path.getsize(self.segmentPaths[-1]) >= self.segmentBytes
+        return False
+
+    def _openSegment(self, img, raw, timestamp):
+        self._closeSegment()
+        h, w = img.shape[:2]
+        fourcc = cv2.VideoWriter_fourcc(*self.fourcc)
+        index = len(self.segmentPaths)
+        path = self._segmentPath(index, '')
+        self._writer = cv2.VideoWriter(path, fourcc, self.fps, (w, h))
+        if not self._writer.isOpened():
+            self._writer = None
+            raise IOError('Could not open a %s video writer for %s' % (self.fourcc, path))
+        self.segmentPaths.append(path)
+        if self.recordRaw and raw is not None:
+            self._rawWriter = cv2.VideoWriter(self._segmentPath(index, '_raw'), fourcc, self.fps, raw.shape[1::-1])
+        if self.recordLandmarks:
+            self._landmarks = LandmarkRecorder(self._segmentPath(index, '', '.plm'), width=w, height=h)
+        self._segmentShape = img.shape
+        self._segmentStart = timestamp
+        self._segmentFrames = 0
+
+    def _closeSegment(self):
+        if self._writer is not None:
+            self._writer.release()
+            self.closedBytes += os.path.getsize(self.segmentPaths[-1])
+        if self._rawWriter is not None:
+            self._rawWriter.release()
+        if self._landmarks is not None:
+            self._landmarks.close()
+        self._writer = None
+        self._rawWriter = None
+        self._landmarks = None
+
+    def _write(self, img, timestamp, raw, landmarks, overlay, alpha):
+        t0 = time.perf_counter()
+        compositor = self.compositor
+        if compositor is not None and alpha is not None:
+            compositor.composite(img, alpha)  # In place, the copy is ours
+        if overlay is not None:
+            img = overlay.drawInto(img)
+        if self._needsNewSegment(img, timestamp):
+            self._openSegment(img, raw, timestamp)
+        self._writer.write(img)
+        if self._rawWriter is not None and raw is not None:
+            self._rawWriter.write(raw)
+        if self._landmarks is not None:
+            self._landmarks.append(landmarks, timestamp)
+        self._segmentFrames += 1
+        self.encoded += 1
+        self.encodeSeconds += time.perf_counter() - t0
+
+    def stop(self):
+        """
+        Encode the frames still queued, close the files and stop the encoder thread.
+        :return: stats()
+        """
+        if self._thread is not None:
+            self._running = False
+            self._queue.put(None)  # The encoder keeps draining, there will be room
+            self._thread.join()
+            self._thread = None
+        return self.stats()
+
+    def stats(self):
+        """
+        :return: dict with the frames submitted, encoded, dropped and queued, the segments, the bytes written
+                 (closed segments, plus the current one as far as flushed) and the mean encoding time
+        """
+        current = 0
+        if self._writer is not None and self.segmentPaths and os.path.exists(self.segmentPaths[-1]):
+            current = os.path.getsize(self.segmentPaths[-1])
+        return {'submitted': self.submitted, 'encoded': self.encoded, 'dropped': self.dropped,
+                'queued': self._queue.qsize(), 'segments': len(self.segmentPaths),
+                'bytes': self.closedBytes + current,
+                'encode_ms': 1000 * self.encodeSeconds / self.encoded if self.encoded else 0.0,
+                'error': None if self.error is None else str(self.error)}
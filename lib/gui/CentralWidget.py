@@ -1,15 +1,13 @@
 import sys
 import os
-import tkinter as tk
 from PySide2.QtWidgets import QWidget, QApplication, QPushButton, QHBoxLayout, QVBoxLayout, QSpacerItem
 from PySide2.QtGui import QIcon
 
+from lib.gui.Screen import screenSize
 from lib.gui.OpenGL_Widget import OpenGLWidget
 
 _PROJECT_FOLDER = os.path.normpath(os.path.realpath(__file__) + '/../../../')
 
-_INT_SCREEN_WIDTH = tk.Tk().winfo_screenwidth()  # get the screen width
-_INT_SCREEN_HEIGHT = tk.Tk().winfo_screenheight()  # get the screen height
 _INT_WIN_WIDTH = 1024  # this variable is only for the if __name__ == "__main__"
 _INT_WIN_HEIGHT = 512  # this variable is only for the if __name__ == "__main__"
 
@@ -26,7 +24,8 @@ class CentralWidget(QWidget):
         # ---------------------- #
         self.setWindowTitle(winTitle)  # Set Window Title
         self.setWindowIcon(QIcon(iconPath))  # Set Window Icon
-        self.setGeometry(_INT_SCREEN_WIDTH / 4, _INT_SCREEN_HEIGHT / 4, w, h)  # Set Window Geometry
+        screenW, screenH = screenSize()  # From Qt, after the QApplication exists
+        self.setGeometry(screenW // 4, screenH // 4, w, h)  # Set Window Geometry
         self.setMinimumWidth(minW)  # Set Window Minimum Width
         self.setMinimumHeight(minH)  # Set Window Minimum Height
         if maxW is not None:
@@ -1,7 +1,5 @@
 import sys
 import os
-import tkinter as tk
-import qdarkstyle
 from PySide2.QtCore import (
     Qt
 )
@@ -16,12 +14,11 @@ from PySide2.QtGui import (
     QIcon
 )
 
+from lib.gui.Screen import screenSize
 from lib.gui.CentralWidget import CentralWidget
 
 _STR_PROJECT_FOLDER = os.path.normpath(os.path.realpath(__file__) + '/../../../')
 
-_INT_SCREEN_WIDTH = tk.Tk().winfo_screenwidth()  # get the screen width
-_INT_SCREEN_HEIGHT = tk.Tk().winfo_screenheight()  # get the screen height
 _INT_WIN_WIDTH = 512  # this variable is only for the if __name__ == "__main__"
 _INT_WIN_HEIGHT = 512  # this variable is only for the if __name__ == "__main__"
 
@@ -55,7 +52,8 @@ class MainWindowTemplate(QMainWindow):
         # self.setStyle_()
         self.setWindowTitle(winTitle)  # Set Window Title
         self.setWindowIcon(QIcon(iconPath))  # Set Window Icon
-        self.setGeometry(_INT_SCREEN_WIDTH / 4, _INT_SCREEN_HEIGHT / 4, w, h)  # Set Window Geometry
+        screenW, screenH = screenSize()  # From Qt, after the QApplication exists
+        self.setGeometry(screenW // 4, screenH // 4, w, h)  # Set Window Geometry
         self.setMinimumWidth(minW)  # Set Window Minimum Width
         self.setMinimumHeight(minH)  # Set Window Minimum Height
 
@@ -110,6 +108,7 @@ class MainWindowTemplate(QMainWindow):
     # ------------------------------ #
 
     def setStyle_(self):
+        import qdarkstyle  # Imported here, only needed when the style is applied
         self.app.setStyleSheet(qdarkstyle.load_stylesheet(qt_api='pyside2'))
 
     def createMenuBar(self):
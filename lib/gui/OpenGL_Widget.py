@@ -1,13 +1,16 @@
 import sys
 import os
-import tkinter as tk
 import cv2 as cv2
 import time
+import logging
+import threading
 
 from OpenGL.GL import *
 
 from PySide2.QtCore import (
-    QBasicTimer
+    QBasicTimer,
+    QTimer,
+    Qt,
 )
 
 from PySide2.QtOpenGL import (
@@ -22,18 +25,25 @@ from PySide2.QtGui import (
     QIcon,
 )
 
+# Only what the first paint needs: the optional features import their modules when they are turned on
 import lib.core.PoseModule as pm
+from lib.core.FramePipeline import FramePipeline
+from lib.gui.TextureRenderer import TextureRenderer
+from lib.gui.SkeletonRenderer import SkeletonRenderer, PoseOverlay
+from lib.gui.WorldSkeletonRenderer import WorldSkeletonRenderer
+from lib.gui.Screen import screenSize
+from lib.core.StageMetrics import StageMetrics, MetricsExporter
 
 _PROJECT_FOLDER = os.path.normpath(os.path.realpath(__file__) + '/../../../')
 
-_INT_SCREEN_WIDTH = tk.Tk().winfo_screenwidth()  # get the screen width
-_INT_SCREEN_HEIGHT = tk.Tk().winfo_screenheight()  # get the screen height
 _INT_WIN_WIDTH = 1024  # this variable is only for the if __name__ == "__main__"
 _INT_WIN_HEIGHT = 512  # this variable is only for the if __name__ == "__main__"
 
 _INT_MAX_STRETCH = 100000  # Spacer Max Stretch
 _INT_BUTTON_MIN_WIDTH = 50  # Minimum Button Width
 
+logger = logging.getLogger(__name__)
+
 
 class OpenGLWidget(QGLWidget):
     def __init__(self, w=512, h=512, minW=256, minH=256, maxW=512, maxH=512,
@@ -46,7 +56,8 @@ class OpenGLWidget(QGLWidget):
         # ---------------------- #
         self.setWindowTitle(winTitle)  # Set Window Title
         self.setWindowIcon(QIcon(iconPath))  # Set Window Icon
-        self.setGeometry(_INT_SCREEN_WIDTH / 4, _INT_SCREEN_HEIGHT / 4, w, h)  # Set Window Geometry
+        screenW, screenH = screenSize()  # From Qt, after the QApplication exists
+        self.setGeometry(screenW // 4, screenH // 4, w, h)  # Set Window Geometry
         self.setMinimumWidth(minW)  # Set Window Minimum Width
         self.setMinimumHeight(minH)  # Set Window Minimum Height
         if maxW is not None:
@@ -55,15 +66,56 @@ class OpenGLWidget(QGLWidget):
             self.setMaximumHeight(maxH)  # Set Window Maximum Width
 
         self.imgToView = None
+        self.imgToViewSeq = 0  # Increased every time imgToView changes, the renderer uploads only then
+        self.maskToView = None  # Low resolution person alpha of imgToView, composited by the renderer
+        self.overlayToView = None  # PoseOverlay of imgToView, None when the pose is drawn into the image
+        self.overlayLayer = 'gl'  # Where the pose is drawn, see setOverlayLayer()
+        self.backgroundMode = 'none'  # See setBackgroundMode()
+        self.backgroundCompositor = None  # The same compositing on the CPU, for the recorded video
+        self._shownFrame = None  # Pipeline frame behind imgToView, its buffer goes back to the pool when replaced
+        self.renderer = TextureRenderer()
+        self.skeletonRenderer = SkeletonRenderer()
+        self.viewMode = '2d'  # See setViewMode()
+        self.worldRenderer = WorldSkeletonRenderer(pm.MEDIAPIPE_CONNECTIONS)
+        self._dragPos = None  # Last mouse position while orbiting the 3D view
         self.isInputFromCamera = False
         self.videoCapture = None
 
+        # --------------------------- #
+        # ----- Stage Metrics ------- #
+        # --------------------------- #
+        self.metrics = StageMetrics(enabled=False)  # See enableMetrics()
+        self.metricsOverlay = False
+        self.metricsExporter = None
+
         # --------------------------- #
         # ----- Pose Estimation ----- #
         # --------------------------- #
-        self.detector = pm.PoseDetector()
+        # MediaPipe is imported and loaded in the background once the window is shown (see showEvent),
+        # neither before the window appears nor on the first frame
+        self.detector = pm.PoseDetector(metrics=self.metrics)
+        self._warmUpScheduled = False
+        self.liveDetector = self.detector  # self.detector is swapped for a replay detector in replay mode
+        self.autoscaler = None  # See enableAutoscale()
         self.pTime = 0
 
+        # ------------------------------------ #
+        # ----- Landmark Record / Replay ----- #
+        # ------------------------------------ #
+        self.landmarkRecorder = None
+        self._recorderLock = threading.Lock()  # The worker appends while the GUI thread may close
+        self.videoRecorder = None  # See startRecordingVideo()
+        self.replayCapture = None
+
+        # -------------------------- #
+        # ----- Frame Pipeline ----- #
+        # -------------------------- #
+        self.framePipeline = None  # capture thread -> inference worker -> paintGL
+        self.inferenceProcesses = 0  # > 0: capture and inference in their own processes, see setInferenceProcesses()
+        self.cameraScheduler = None  # Several sources, see setCameraSources()
+        self.tiledView = None
+        self._shownFrames = []  # Per source, as _shownFrame
+
     def initializeGL(self):
         glClear(GL_COLOR_BUFFER_BIT | GL_DEPTH_BUFFER_BIT)
 
@@ -71,51 +123,42 @@ class OpenGLWidget(QGLWidget):
         glClear(GL_COLOR_BUFFER_BIT | GL_DEPTH_BUFFER_BIT)
         glClearColor(0.0, 0.0, 0.0, 1.0)
 
-        if self.isInputFromCamera:
-            ret, frame = self.videoCapture.read()
-
-            frame = self.detector.MediaPipe_findPose(frame)
-            # frame = self.detector.OpenPose_findPose(frame)
-            if frame is not None and frame.any():
-                _ = self.detector.MediaPipe_findPosition(frame, draw=True)
-                cTime = time.time()
-                fps = 1 / (cTime - self.pTime)
-                self.pTime = cTime
-
-                frame = cv2.flip(frame, 1)
-                cv2.putText(frame, str(int(fps)), (70, 50), cv2.FONT_HERSHEY_PLAIN, 3,
-                            (255, 0, 0), 3)
-                frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGBA)
-                frame = cv2.flip(frame, 0)
-
-            self.imgToView = frame
-
-        if self.imgToView is not None:
-            # print(self.imgToView.shape)
-            glColor3f(0.0, 0.0, 0.0)
-            w = self.imgToView.shape[1]
-            h = self.imgToView.shape[0]
-            original_ratio = w / h
-            designer_ratio = self.width() / self.height()
-            if original_ratio > designer_ratio:
-                designer_height = self.width() / original_ratio
-                scale = designer_height / h
-            elif original_ratio < designer_ratio:
-                designer_width = self.height() * original_ratio
-                scale = designer_width / w
-            else:
-                scale = 1
-
-            pos_w = scale * w
-            pos_w = 1.0 - ((self.width() - pos_w) / self.width())
-            glRasterPos2f(-pos_w, -1.0)
-            pos_h = scale * h
-            pos_h = 1.0 - ((self.height() - pos_h) / self.height())
-            glRasterPos2f(-pos_w, -pos_h)
-
-            glPixelZoom(scale, scale)
-            glDrawPixels(w, h, GL_RGBA, GL_UNSIGNED_BYTE, self.imgToView)
-            # cv2.imshow('hello', self.imgToView)
+        if self.isInputFromCamera and self.framePipeline is not None:
+            # Only pick up the newest finished frame, all the heavy work happens in the pipeline
+            frame = self.framePipeline.getLatestFrame()
+            if frame is not None:
+                self.setImgToView(frame.image, frame.mask, frame.overlay)
+                if self.viewMode == '3d':
+                    self.worldRenderer.pushPose(frame.world)
+                if self._shownFrame is not None:
+                    self._shownFrame.release()
+                self._shownFrame = frame
+
+        if self.viewMode == '3d' and self.cameraScheduler is None:
+            self.worldRenderer.draw(self.width(), self.height())
+        elif self.cameraScheduler is not None:
+            for i, source in enumerate(self.cameraScheduler.sources):
+                frame = source.getLatestFrame()
+                if frame is not None:
+                    self.tiledView.setImage(i, frame.image)
+                    if self._shownFrames[i] is not None:
+                        self._shownFrames[i].release()
+                    self._shownFrames[i] = frame
+            t0 = self.metrics.start()
+            if self.tiledView.draw(self.width(), self.height()):
+                self.metrics.stop('gl_upload', t0)
+        elif self.imgToView is not None:
+            # Re-uploads only when imgToView changed since the last paint
+            t0 = self.metrics.start()
+            if self.renderer.upload(self.imgToView, self.imgToViewSeq):
+                self.renderer.setMask(self.maskToView)
+                self.skeletonRenderer.setOverlay(self.overlayToView)
+                self.metrics.stop('gl_upload', t0)
+            # Frames with an overlay are shown mirrored by the renderer, the others were mirrored in place
+            self.renderer.mirrorX = self.overlayToView is not None and self.overlayToView.mirror
+            self.renderer.draw(self.width(), self.height())
+            if self.overlayToView is not None:
+                self.skeletonRenderer.draw(*self.renderer.fitQuad(self.width(), self.height()))
         else:
             glColor4f(0.0, 0.0, 0.0, 1.0)
 
@@ -125,9 +168,163 @@ class OpenGLWidget(QGLWidget):
         # Make the display area proportional to the size of the view
         glOrtho(-w / self.width(), w / self.width(), -h / self.height(), h / self.height(), -1.0, 1.0)
 
+    def showEvent(self, event):
+        super().showEvent(event)
+        if not self._warmUpScheduled:
+            self._warmUpScheduled = True
+            QTimer.singleShot(0, self.detector.backend.warmUp)  # After the first paint
+
     def timerEvent(self, QTimerEvent):
         self.update()  # refreshing the widget
 
+    def mousePressEvent(self, event):
+        if self.viewMode == '3d' and event.button() == Qt.LeftButton:
+            self._dragPos = event.pos()
+
+    def mouseMoveEvent(self, event):
+        if self._dragPos is not None:
+            pos = event.pos()
+            self.worldRenderer.camera.rotate(pos.x() - self._dragPos.x(), pos.y() - self._dragPos.y())
+            self._dragPos = pos
+            self.update()
+
+    def mouseReleaseEvent(self, event):
+        self._dragPos = None
+
+    def mouseDoubleClickEvent(self, event):
+        if self.viewMode == '3d':
+            self.worldRenderer.camera.reset()
+            self.update()
+
+    def wheelEvent(self, event):
+        if self.viewMode == '3d':
+            self.worldRenderer.camera.zoom(event.angleDelta().y() / 120.0)  # One notch is 120
+            self.update()
+
+    def processFrame(self, frame):
+        """
+        Runs on the inference worker thread of the frame pipeline, never on the GUI thread.
+        Finds the pose and mirrors the frame for display, in place: the BGR frame is uploaded
+        as is (GL_BGR) and flipped vertically in texture coordinates, so no new image is allocated.
+        :param frame: the FramePipeline.Frame to process in place
+        :return: Nothing
+        """
+        if self.replayCapture is not None:
+            # Keep the replayed landmarks on the frame the capture stage produced
+            self.detector.backend.seek(self.replayCapture.frameIndex(frame.seq))
+        drawIntoFrame = self.overlayLayer == 'frame'
+        raw = self._rawForRecording(frame.image) if drawIntoFrame else None
+        img = self.detector.MediaPipe_findPose(frame.image, draw=drawIntoFrame)
+        # img = self.detector.OpenPose_findPose(img)
+        if img is not None and img.any():
+            mask = self.detector.MediaPipe_segmentationMask() if self.backgroundMode != 'none' else None
+            if mask is not None:
+                from lib.core.SegmentationCompositor import maskToAlpha
+                frame.mask = maskToAlpha(mask)  # A few kB, composited on the GPU
+                if drawIntoFrame:
+                    cv2.flip(frame.mask, 1, dst=frame.mask)  # As the frame, see _finishFrame
+            if self.viewMode == '3d':
+                frame.world = self.detector.MediaPipe_worldLandmarks()
+            self._finishFrame(frame, img, self.detector.MediaPipe_findPosition(img, draw=drawIntoFrame), raw)
+        frame.image = img
+
+    def drawFrame(self, frame):
+        """
+        Runs on the compose thread of the MultiprocessPipeline: the pose was found in an inference
+        process and frame.landmarks holds its normalized landmarks (or None), only drawing is left.
+        :param frame: the Frame to process in place
+        :return: Nothing
+        """
+        img = frame.image
+        raw = self._rawForRecording(img) if self.overlayLayer == 'frame' else None
+        lmPixels = self.detector.MediaPipe_positionFromLandmarks(img, frame.landmarks,
+                                                                  draw=self.overlayLayer == 'frame')
+        self._finishFrame(frame, img, lmPixels, raw)
+
+    def _rawForRecording(self, img):
+        # The frame is about to be drawn on: keep a copy only if the recorder wants the raw frames
+        recorder = self.videoRecorder
+        return img.copy() if recorder is not None and recorder.recordRaw and img is not None else None
+
+    def _finishFrame(self, frame, img, lmPixels, raw=None):
+        # Record the landmarks, mirror the frame and write the fps and metrics on it
+        frame.landmarks = lmPixels.copy() if len(lmPixels) != 0 else None  # The detector reuses its array
+        if self.landmarkRecorder is not None:
+            with self._recorderLock:
+                if self.landmarkRecorder is not None:
+                    self.landmarkRecorder.append(self.detector.lmNormalized if len(lmPixels) != 0 else None,
+                                                 frame.timestamp)
+
+        if self.overlayLayer == 'gl':
+            # The frame stays as captured: the renderer mirrors it and draws this overlay on top
+            h, w = img.shape[:2]
+            overlay = PoseOverlay((w, h), mirror=True)
+            overlay.setMediaPipePose(frame.landmarks, pm.MEDIAPIPE_CONNECTIONS, self.detector.angles).addAngleLabels()
+            overlay.addLabel(str(int(frame.fps)), 70, 50, (255, 0, 0), 3)
+            if self.metricsOverlay:
+                for i, line in enumerate(self.metrics.overlayLines()):
+                    overlay.addLabel(line, 10, 80 + 18 * i, (0, 255, 255), 1.2)
+            frame.overlay = overlay
+            self._recordVideoFrame(frame, img, img, overlay)  # The encoder thread draws the overlay
+            return
+
+        t0 = self.metrics.start()
+        cv2.flip(img, 1, dst=img)  # The only full pass over the frame on the display path
+        cv2.putText(img, str(int(frame.fps)), (70, 50), cv2.FONT_HERSHEY_PLAIN, 3,
+                    (255, 0, 0), 3)
+        if self.metricsOverlay:
+            for i, line in enumerate(self.metrics.overlayLines()):
+                cv2.putText(img, line, (10, 80 + 18 * i), cv2.FONT_HERSHEY_PLAIN, 1.2, (0, 255, 255), 1)
+        self.metrics.stop('display_conversion', t0)
+        self._recordVideoFrame(frame, img, raw)
+
+    def _recordVideoFrame(self, frame, img, raw=None, overlay=None):
+        # Inference worker thread: only a copy into the recorder's queue, the encoding runs on its own thread
+        recorder = self.videoRecorder
+        if recorder is not None:
+            lmNormalized = self.detector.lmNormalized if frame.landmarks is not None else None
+            recorder.submit(img, frame.timestamp, raw=raw, landmarks=lmNormalized, overlay=overlay, alpha=frame.mask)
+
+    def processSourceFrame(self, source, frame):
+        """
+        Runs on a worker thread of the MultiCameraScheduler, with the detector of the frame's source.
+        :return: Nothing
+        """
+        img = source.detector.MediaPipe_findPose(frame.image)
+        if img is not None and img.any():
+            lmPixels = source.detector.MediaPipe_findPosition(img, draw=True)
+            frame.landmarks = lmPixels.copy() if len(lmPixels) != 0 else None
+            cv2.flip(img, 1, dst=img)
+            stats = source.stats()
+            cv2.putText(img, '%d  %d fps  %d dropped' % (source.index, int(frame.fps), stats['dropped']),
+                        (20, 40), cv2.FONT_HERSHEY_PLAIN, 2, (255, 0, 0), 2)
+        frame.image = img
+
+    def setCameraSources(self, sources, workers=2):
+        """
+        Show several cameras or videos side by side, their poses found by a shared pool of worker threads.
+        Stop them with setIsInputFromCamera(False).
+        :param sources: device indices or video paths
+        :param workers: inference threads for all the sources
+        :return: Nothing
+        """
+        from lib.core.MultiCameraScheduler import MultiCameraScheduler
+        from lib.gui.TiledView import TiledView
+        self.setIsInputFromCamera(False)
+        detectorKwargs = dict(self.detector.inferenceParams(), backend=self.detector.backendName)
+        self.cameraScheduler = MultiCameraScheduler(sources, self.processSourceFrame, workers=workers,
+                                                    detectorFactory=lambda: pm.PoseDetector(**detectorKwargs))
+        self.tiledView = TiledView(len(self.cameraScheduler.sources))
+        self._shownFrames = [None] * len(self.cameraScheduler.sources)
+        self.isInputFromCamera = True
+        self.cameraScheduler.start()
+
+    def cameraStats(self):
+        """
+        :return: per source fps, captured, processed and dropped frames, [] with a single source
+        """
+        return self.cameraScheduler.stats() if self.cameraScheduler is not None else []
+
     def setImg(self, imgPath):
         img = cv2.imread(imgPath)
         img = cv2.cvtColor(img, cv2.COLOR_BGR2RGBA)
@@ -142,33 +339,259 @@ class OpenGLWidget(QGLWidget):
             cv2.putText(img, str(int(fps)), (70, 50), cv2.FONT_HERSHEY_PLAIN, 3,
                         (255, 0, 0), 3)
 
+        self.setImgToView(img)
+
+    def setImgToView(self, img, mask=None, overlay=None):
         self.imgToView = img
+        self.maskToView = mask
+        self.overlayToView = overlay
+        self.imgToViewSeq += 1
 
     def clearImg(self):
-        self.imgToView = None
+        self.setImgToView(None)
 
     def setIsInputFromCamera(self, state: bool):
+        if state and (self.framePipeline is not None or self.cameraScheduler is not None):
+            return  # The camera is already open
         self.isInputFromCamera = state
-        if state:
+        if state and self.inferenceProcesses > 0:
+            # The capture process opens the camera, frames and landmarks come back through shared memory
+            from lib.core.SharedFrameRing import MultiprocessPipeline
+            self.framePipeline = MultiprocessPipeline(0, self.drawFrame, workers=self.inferenceProcesses,
+                                                      detectorKwargs=dict(self.detector.inferenceParams(),
+                                                                          backend=self.detector.backendName))
+            self.framePipeline.start()
+        elif state:
             self.videoCapture = cv2.VideoCapture(0)
             self.videoCapture.set(cv2.CAP_PROP_FPS, 24)
             # self.videoCapture.set(3, 800)
             # self.videoCapture.set(4, 800)
+            self.framePipeline = FramePipeline(self.videoCapture, self.processFrame, metrics=self.metrics)
+            self.framePipeline.start()
         else:
+            if self.cameraScheduler is not None:
+                self.cameraScheduler.stop()
+                self.cameraScheduler.release()
+                self.cameraScheduler = None
+                self._shownFrames = []
+                self.makeCurrent()  # The tile textures belong to this widget's context
+                self.tiledView.release()
+                self.doneCurrent()
+                self.tiledView = None
+            if self.framePipeline is not None:
+                self.framePipeline.stop()  # Join the threads before releasing the capture
+                self.framePipeline = None
+                self._shownFrame = None  # Its pool went with the pipeline, imgToView may keep the image
+            if self.replayCapture is not None:
+                self.replayCapture = None  # Released below, as the video capture
+                self.detector.backend.close()
+                self.detector = self.liveDetector
             if self.videoCapture is not None:
                 self.videoCapture.release()
                 self.videoCapture = None
-                self.imgToView = None
+                self.setImgToView(None)
             self.pTime = 0
 
+    def setInferenceProcesses(self, count):
+        """
+        Run the camera capture and count pose inference processes apart from the GUI process, from the next
+        time the camera is opened. 0 keeps everything in threads of this process.
+        :return: Nothing
+        """
+        self.inferenceProcesses = max(0, int(count))
+
     def stopImageFromCameraAndKeepImage(self):
-        img = self.imgToView
+        img, mask, overlay = self.imgToView, self.maskToView, self.overlayToView
         self.setIsInputFromCamera(False)
-        self.imgToView = img
+        self.setImgToView(img, mask, overlay)
 
     def getImgToView(self):
         return self.imgToView
 
+    def startRecordingLandmarks(self, path):
+        """
+        Record the landmarks of every finished frame to a LandmarkRecording file.
+        :return: Nothing
+        """
+        from lib.core.LandmarkRecording import LandmarkRecorder
+        self.stopRecordingLandmarks()
+        w = int(self.videoCapture.get(cv2.CAP_PROP_FRAME_WIDTH)) if self.videoCapture is not None else 0
+        h = int(self.videoCapture.get(cv2.CAP_PROP_FRAME_HEIGHT)) if self.videoCapture is not None else 0
+        recorder = LandmarkRecorder(path, width=w, height=h)
+        with self._recorderLock:
+            self.landmarkRecorder = recorder
+
+    def stopRecordingLandmarks(self):
+        with self._recorderLock:
+            recorder = self.landmarkRecorder
+            self.landmarkRecorder = None
+        if recorder is not None:
+            recorder.close()
+
+    def startRecordingVideo(self, path, policy='drop', fps=30.0, segmentSeconds=None, segmentBytes=None,
+                            recordRaw=False, recordLandmarks=False):
+        """
+        Save the annotated frames (pose, angles, fps and background compositing as shown) to a video,
+        encoded on a background thread so the live display rate is kept (VideoRecorder).
+        :param policy: 'drop' frames when the encoder falls behind, or 'block' the pipeline until it catches up
+        :param segmentSeconds: start a new file every this many seconds, None for one file
+        :param segmentBytes: start a new file once the current one reaches this size, None for no limit
+        :param recordRaw: also save the frames before annotation to <name>_raw<ext>
+        :param recordLandmarks: also save the landmarks to <name>.plm
+        :return: Nothing
+        """
+        from lib.core.VideoRecorder import VideoRecorder
+        self.stopRecordingVideo()
+        self.videoRecorder = VideoRecorder(path, fps=fps, policy=policy, segmentSeconds=segmentSeconds,
+                                           segmentBytes=segmentBytes, recordRaw=recordRaw,
+                                           recordLandmarks=recordLandmarks,
+                                           compositor=self.backgroundCompositor).start()
+
+    def stopRecordingVideo(self):
+        """
+        Encode the frames still queued and close the files.
+        :return: VideoRecorder.stats() (frames encoded, dropped, segments, bytes), None if nothing was recorded
+        """
+        recorder = self.videoRecorder
+        self.videoRecorder = None
+        return recorder.stop() if recorder is not None else None
+
+    def setReplaySource(self, path, realtime=True):
+        """
+        Replay a LandmarkRecording file through the frame pipeline, without loading MediaPipe.
+        Stop it with setIsInputFromCamera(False).
+        :return: Nothing
+        """
+        from lib.core.LandmarkRecording import ReplayCapture
+        self.setIsInputFromCamera(False)
+        self.replayCapture = ReplayCapture(path, realtime=realtime, loop=True)
+        self.detector = pm.PoseDetector(backend='replay', backendParams={'replayPath': path}, metrics=self.metrics)
+        self.videoCapture = self.replayCapture
+        self.isInputFromCamera = True
+        self.framePipeline = FramePipeline(self.videoCapture, self.processFrame, metrics=self.metrics)
+        self.framePipeline.start()
+
+    def setOverlayLayer(self, layer):
+        """
+        Choose where landmarks, bones, angles and the fps are drawn, from the next frame on:
+        'gl' draws them as geometry over the video texture (SkeletonRenderer), the camera image stays
+        untouched and is mirrored by the renderer; 'frame' draws them into the image on the CPU with
+        OpenCV (the draw=True path of PoseDetector), e.g. when the frames are also recorded.
+        :return: Nothing
+        """
+        if layer not in ('gl', 'frame'):
+            raise ValueError('Unknown overlay layer "%s", available: gl, frame' % layer)
+        self.overlayLayer = layer
+
+    def setViewMode(self, mode, trailLength=None):
+        """
+        '2d' shows the camera image with the pose over it; '3d' shows the MediaPipe world landmarks
+        as a 3D skeleton with a trail of the last poses (WorldSkeletonRenderer): drag to orbit,
+        wheel to zoom, double click to reset the view. The 3D view needs inference in this process,
+        it stays empty with setInferenceProcesses() and is not available with setCameraSources().
+        :param trailLength: poses in the trail, default: keep the current one
+        :return: Nothing
+        """
+        if mode not in ('2d', '3d'):
+            raise ValueError('Unknown view mode "%s", available: 2d, 3d' % mode)
+        if trailLength is not None and trailLength != self.worldRenderer.trailLength:
+            self.makeCurrent()
+            self.worldRenderer.release()
+            camera = self.worldRenderer.camera
+            self.worldRenderer = WorldSkeletonRenderer(pm.MEDIAPIPE_CONNECTIONS, trailLength)
+            self.worldRenderer.camera = camera
+            self.doneCurrent()
+        elif mode != self.viewMode:
+            self.worldRenderer.clear()
+        self.viewMode = mode
+        self._dragPos = None
+
+    def setBackgroundMode(self, mode, backgroundPath=None):
+        """
+        Blur or replace the background behind the person with the MediaPipe segmentation mask.
+        Turns segmentation on in the live detector when needed: a segmentation backend is loaded and warmed up
+        in the background and swapped in when ready, the stream keeps the current one (and no mask) until then.
+        :param mode: 'none', 'blur' or 'replace'
+        :param backgroundPath: image shown behind the person in 'replace' mode
+        :return: Nothing
+        """
+        from lib.core.SegmentationCompositor import SegmentationCompositor
+        background = cv2.imread(backgroundPath) if backgroundPath else None
+        if mode == 'replace' and background is None:
+            raise IOError('Could not read the background image: %s' % backgroundPath)
+        if mode != 'none' and not self.liveDetector.enable_segmentation:
+            self.liveDetector.enable_segmentation = True  # Backends made from now on (autoscaler) segment too
+            thread = threading.Thread(target=self._enableSegmentation, args=(self.liveDetector,), daemon=True)
+            thread.start()
+        self.backgroundMode = mode
+        self.renderer.setBackgroundMode(mode, background)
+        self.backgroundCompositor = SegmentationCompositor(mode, background) if mode != 'none' else None
+        if self.videoRecorder is not None:
+            self.videoRecorder.compositor = self.backgroundCompositor
+
+    @staticmethod
+    def _enableSegmentation(detector):
+        # Background thread, the same hot swap as LatencyAutoscaler: load and warm up first, then swap
+        try:
+            backend = detector.createBackend()
+            backend.warmUp(background=False)
+        except Exception as e:
+            detector.enable_segmentation = False
+            logger.warning('Could not load a segmentation backend: %s', e)
+            return
+        detector.swapBackend(backend)
+
+    def setKeyframeTracking(self, enabled=True, maxInterval=10, driftBudget=0.05):
+        """
+        Run MediaPipe only on keyframes of the camera stream and follow the landmarks with optical flow
+        in between (PoseDetector.setKeyframeTracking). Fewer inferences per second, at some accuracy:
+        compare with lib.benchmark.KeyframeTrackingBenchmark on a clip first. Applies to the in-process
+        pipeline, not to setInferenceProcesses() or setCameraSources().
+        :param maxInterval: longest run of tracked frames between two keyframes
+        :param driftBudget: expected drift between keyframes, as a share of the body height
+        :return: Nothing
+        """
+        self.liveDetector.setKeyframeTracking(enabled, maxInterval=maxInterval, driftBudget=driftBudget)
+
+    def enableAutoscale(self, targetFps=24.0, levels=None):
+        """
+        Step the model complexity and inference resolution of the live detector to keep targetFps.
+        The switches are logged (logger lib.core.LatencyAutoscaler) and kept in self.autoscaler.history.
+        :param levels: [(model_complexity, inputScale)] from the cheapest, see LatencyAutoscaler
+        :return: Nothing
+        """
+        from lib.core.LatencyAutoscaler import LatencyAutoscaler
+        self.disableAutoscale()
+        self.autoscaler = LatencyAutoscaler(self.liveDetector, targetFps=targetFps, levels=levels).attach()
+
+    def disableAutoscale(self):
+        # The detector keeps the level reached
+        if self.autoscaler is not None:
+            self.autoscaler.detach()
+            self.autoscaler = None
+
+    def enableMetrics(self, overlay=True, csvPath=None, promPath=None, interval=5.0):
+        """
+        Start timing capture, colour conversion, inference, landmarks, drawing and GL upload.
+        :param overlay: draw the per-stage p50/p95 latencies on the frame
+        :param csvPath: append the statistics to this CSV file every interval seconds
+        :param promPath: rewrite this Prometheus text file every interval seconds
+        :return: Nothing
+        """
+        self.metrics.enabled = True
+        self.metricsOverlay = overlay
+        if (csvPath or promPath) and self.metricsExporter is None:
+            self.metricsExporter = MetricsExporter(self.metrics, csvPath=csvPath, promPath=promPath,
+                                                   interval=interval)
+            self.metricsExporter.start()
+
+    def disableMetrics(self):
+        self.metrics.enabled = False
+        self.metricsOverlay = False
+        if self.metricsExporter is not None:
+            self.metricsExporter.stop()  # Flushes one last time
+            self.metricsExporter = None
+
 
 # ******************************************************* #
 # ********************   EXECUTION   ******************** #
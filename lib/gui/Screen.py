@@ -0,0 +1,17 @@
+from PySide2.QtGui import QGuiApplication
+
+_INT_FALLBACK_SCREEN_WIDTH = 1920  # Used before a QApplication exists or without a screen
+_INT_FALLBACK_SCREEN_HEIGHT = 1080
+
+
+def screenSize():
+    """
+    Available size of the primary screen, asked from the running QApplication
+    (no extra toolkit root is created just to read it).
+    :return: (width, height) in pixels
+    """
+    screen = QGuiApplication.primaryScreen() if QGuiApplication.instance() is not None else None
+    if screen is None:
+        return _INT_FALLBACK_SCREEN_WIDTH, _INT_FALLBACK_SCREEN_HEIGHT
+    geometry = screen.availableGeometry()
+    return geometry.width(), geometry.height()
@@ -0,0 +1,301 @@
+import ctypes
+from collections import OrderedDict
+
+import cv2
+import numpy as np
+
+from OpenGL.GL import *
+
+_INT_MAX_POINTS = 64  # Vertex buffer capacity: landmarks, then the angle annotation points
+_INT_MAX_INDICES = 256
+_INT_VERTEX_FLOATS = 6  # x, y, r, g, b, a
+_INT_LABEL_CACHE = 96  # Label textures kept (fps values, angles, metrics lines)
+_FLOAT_VISIBILITY = 0.5  # Landmarks below this visibility are not drawn, as mediapipe's draw_landmarks
+_FLOAT_POINT_SIZE = 6.0
+_FLOAT_ANGLE_POINT_SIZE = 14.0
+_FLOAT_LINE_WIDTH = 2.0
+_FLOAT_ANGLE_LINE_WIDTH = 3.0
+_INT_DRAW_SHIFT = 4  # Sub-pixel bits of the OpenCV drawing in PoseOverlay.drawInto
+_INT_DRAW_SCALE = 1 << _INT_DRAW_SHIFT
+
+_TUPLE_BONE_COLOR = (1.0, 1.0, 1.0, 1.0)
+_TUPLE_JOINT_COLOR = (1.0, 0.0, 0.0, 1.0)
+_TUPLE_ANGLE_COLOR = (1.0, 0.0, 0.0, 1.0)
+_TUPLE_OPENPOSE_BONE_COLOR = (0.0, 1.0, 0.0, 1.0)
+
+
+class PoseOverlay:
+    """
+    What SkeletonRenderer draws over one frame: built on the inference thread next to the frame
+    (plain arrays, no GL), handed to the renderer on the GUI thread.
+    :param imageSize: (w, h) of the frame the coordinates are in
+    :param mirror: the frame is shown mirrored, points are mirrored too (labels are given as shown)
+    """
+    def __init__(self, imageSize, mirror=False):
+        self.imageSize = imageSize
+        self.mirror = mirror
+        self.points = None  # (n, 2) float32 frame pixels
+        self.visible = None  # (n,) bool
+        self.connections = None  # (m, 2) indices into points
+        self.boneColor = _TUPLE_BONE_COLOR
+        self.angles = []  # (p1, p2, p3, degrees)
+        self.labels = []  # (text, x, y, (b, g, r), scale) in shown frame pixels, y of the baseline
+
+    def setPose(self, points, visible, connections, boneColor=_TUPLE_BONE_COLOR):
+        self.points = np.asarray(points, dtype=np.float32)[:, :2]
+        self.visible = np.asarray(visible, dtype=bool)
+        self.connections = np.asarray(connections, dtype=np.uint16).reshape(-1, 2)
+        self.boneColor = boneColor
+        return self
+
+    def setMediaPipePose(self, lmPixels, connections, angles=()):
+        """
+        :param lmPixels: (33, 4) PoseDetector.lmPixels (x, y, z, visibility), or None
+        """
+        if lmPixels is not None:
+            self.setPose(lmPixels, lmPixels[:, 3] >= _FLOAT_VISIBILITY, connections)
+            self.angles = list(angles)
+        return self
+
+    def setOpenPosePose(self, points, connections):
+        """
+        :param points: PoseDetector.opPoints, (x, y) or None per part
+        """
+        xy = np.array([p if p else (0.0, 0.0) for p in points], dtype=np.float32).reshape(-1, 2)
+        return self.setPose(xy, [bool(p) for p in points], connections, _TUPLE_OPENPOSE_BONE_COLOR)
+
+    def addLabel(self, text, x, y, color=(255, 0, 0), scale=3.0):
+        self.labels.append((text, x, y, color, scale))
+        return self
+
+    def addAngleLabels(self):
+        # As MediaPipe_findAngle: the angle 50 px left of and below the middle joint, as shown
+        w = self.imageSize[0]
+        for _, p2, _, angle in self.angles:
+            x2, y2 = self.points[p2]
+            x2 = w - x2 if self.mirror else x2
+            self.addLabel(str(int(angle)), int(x2) - 50, int(y2) + 50, (0, 0, 255), 2.0)
+        return self
+
+    def drawInto(self, img):
+        """
+        Draw the overlay into img with OpenCV, as SkeletonRenderer shows it (img is mirrored first
+        when the overlay is), for outputs without the GL renderer such as VideoRecorder.
+        :param img: the frame the overlay was made for, changed in place
+        :return: img
+        """
+        if self.mirror:
+            cv2.flip(img, 1, dst=img)
+        if self.points is not None:
+            points = self.points.copy()
+            if self.mirror:
+                points[:, 0] = self.imageSize[0] - points[:, 0]
+            pts = [tuple(p) for p in np.round(points * _INT_DRAW_SCALE).astype(np.int32)]
+            boneColor = tuple(int(255 * c) for c in self.boneColor[2::-1])  # RGBA floats to BGR
+            jointColor = tuple(int(255 * c) for c in _TUPLE_JOINT_COLOR[2::-1])
+            for a, b in self.connections:
+                if self.visible[a] and self.visible[b]:
+                    cv2.line(img, pts[a], pts[b], boneColor, int(_FLOAT_LINE_WIDTH), cv2.LINE_AA, _INT_DRAW_SHIFT)
+            for i in np.flatnonzero(self.visible):
+                cv2.circle(img, pts[i], int(_FLOAT_POINT_SIZE / 2 * _INT_DRAW_SCALE), jointColor, cv2.FILLED,
+                           cv2.LINE_AA, _INT_DRAW_SHIFT)
+            angleColor = tuple(int(255 * c) for c in _TUPLE_ANGLE_COLOR[2::-1])
+            for p1, p2, p3, _ in self.angles:
+                for a, b in ((p1, p2), (p3, p2)):
+                    cv2.line(img, pts[a], pts[b], (255, 255, 255), int(_FLOAT_ANGLE_LINE_WIDTH), cv2.LINE_AA,
+                             _INT_DRAW_SHIFT)
+                for p in (p1, p2, p3):
+                    cv2.circle(img, pts[p], int(_FLOAT_ANGLE_POINT_SIZE / 2 * _INT_DRAW_SCALE), angleColor, cv2.FILLED,
+                               cv2.LINE_AA, _INT_DRAW_SHIFT)
+        for text, x, y, color, scale in self.labels:
+            cv2.putText(img, text, (int(x), int(y)), cv2.FONT_HERSHEY_PLAIN, scale, tuple(color),
+                        max(1, int(round(scale))))
+        return img
+
+
+class SkeletonRenderer:
+    """
+    Draws pose overlays as geometry over the video quad of a TextureRenderer, so the frame itself
+    is never drawn on. Per frame only a few hundred bytes of vertices and indices are sent: the
+    landmarks (colour per vertex) go to one vertex buffer, the bones and visible joints to one
+    index buffer. Text (fps, angles, metrics) is rendered once per distinct string into a small
+    texture and drawn as a quad. Needs the same compatibility profile context as TextureRenderer.
+    """
+    def __init__(self):
+        self._vbo = None
+        self._ibo = None
+        self._vertices = np.zeros((_INT_MAX_POINTS, _INT_VERTEX_FLOATS), dtype=np.float32)
+        self._indices = np.zeros(_INT_MAX_INDICES, dtype=np.uint16)
+        self._ranges = []  # (GL mode, first index, count, point size / line width) to draw
+        self._overlay = None
+        self._dirty = False
+        self._labels = OrderedDict()  # (text, color, scale) -> (texture, w, h, baseline), least recently used first
+
+    def setOverlay(self, overlay):
+        """
+        :param overlay: PoseOverlay or None. Uploaded on the next draw.
+        :return: Nothing
+        """
+        self._overlay = overlay
+        self._dirty = True
+
+    def _build(self, overlay):
+        # Vertices: the pose points, then the 3 points of each angle; indices per primitive range
+        vertices, indices, ranges = self._vertices, self._indices, []
+        n = 0
+        k = 0
+        if overlay.points is not None:
+            n = min(len(overlay.points), _INT_MAX_POINTS)
+            vertices[:n, :2] = overlay.points[:n]
+            vertices[:n, 2:] = _TUPLE_JOINT_COLOR
+            visible = overlay.visible[:n]
+            bones = overlay.connections[(overlay.connections < n).all(axis=1)]
+            bones = bones[visible[bones[:, 0]] & visible[bones[:, 1]]].ravel()[:_INT_MAX_INDICES // 2]
+            joints = np.flatnonzero(visible)[:_INT_MAX_INDICES - bones.size]
+            # Bones are drawn in one colour, the joints with the colour of their vertices
+            indices[:bones.size] = bones
+            ranges.append((GL_LINES, 0, bones.size, _FLOAT_LINE_WIDTH, overlay.boneColor))
+            indices[bones.size:bones.size + joints.size] = joints
+            ranges.append((GL_POINTS, bones.size, joints.size, _FLOAT_POINT_SIZE, None))
+            k = bones.size + joints.size
+        for p1, p2, p3, _ in overlay.angles:
+            if n + 3 > _INT_MAX_POINTS or k + 7 > _INT_MAX_INDICES:
+                break
+            vertices[n:n + 3, :2] = overlay.points[[p1, p2, p3]]
+            vertices[n:n + 3, 2:] = _TUPLE_ANGLE_COLOR
+            indices[k:k + 4] = (n, n + 1, n + 2, n + 1)
+            ranges.append((GL_LINES, k, 4, _FLOAT_ANGLE_LINE_WIDTH, _TUPLE_BONE_COLOR))
+            indices[k + 4:k + 7] = (n, n + 1, n + 2)
+            ranges.append((GL_POINTS, k + 4, 3, _FLOAT_ANGLE_POINT_SIZE, None))
+            n += 3
+            k += 7
+
+        if self._vbo is None:
+            self._vbo, self._ibo = glGenBuffers(2)
+            glBindBuffer(GL_ARRAY_BUFFER, self._vbo)
+            glBufferData(GL_ARRAY_BUFFER, vertices.nbytes, None, GL_DYNAMIC_DRAW)
+            glBindBuffer(GL_ELEMENT_ARRAY_BUFFER, self._ibo)
+            glBufferData(GL_ELEMENT_ARRAY_BUFFER, indices.nbytes, None, GL_DYNAMIC_DRAW)
+        if n:
+            glBindBuffer(GL_ARRAY_BUFFER, self._vbo)
+            glBufferSubData(GL_ARRAY_BUFFER, 0, vertices[:n].nbytes, vertices[:n])
+            glBindBuffer(GL_ELEMENT_ARRAY_BUFFER, self._ibo)
+            glBufferSubData(GL_ELEMENT_ARRAY_BUFFER, 0, indices[:k].nbytes, indices[:k])
+            glBindBuffer(GL_ARRAY_BUFFER, 0)
+            glBindBuffer(GL_ELEMENT_ARRAY_BUFFER, 0)
+        self._ranges = [r for r in ranges if r[2] > 0] if n else []
+
+    def _label(self, text, color, scale):
+        key = (text, color, scale)
+        label = self._labels.get(key)
+        if label is not None:
+            self._labels.move_to_end(key)
+            return label
+        thickness = max(1, int(round(scale)))
+        (w, h), baseline = cv2.getTextSize(text, cv2.FONT_HERSHEY_PLAIN, scale, thickness)
+        h += baseline + thickness
+        w += thickness
+        canvas = np.zeros((h, w, 4), dtype=np.uint8)
+        cv2.putText(canvas, text, (0, h - baseline - 1), cv2.FONT_HERSHEY_PLAIN, scale,
+                    (color[2], color[1], color[0], 255), thickness)  # RGBA
+        texture = glGenTextures(1)
+        glPixelStorei(GL_UNPACK_ALIGNMENT, 1)
+        glBindTexture(GL_TEXTURE_2D, texture)
+        glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_MIN_FILTER, GL_LINEAR)
+        glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_MAG_FILTER, GL_LINEAR)
+        glTexImage2D(GL_TEXTURE_2D, 0, GL_RGBA8, w, h, 0, GL_RGBA, GL_UNSIGNED_BYTE, canvas)
+        glBindTexture(GL_TEXTURE_2D, 0)
+        label = (texture, w, h, baseline + 1)
+        self._labels[key] = label
+        if len(self._labels) > _INT_LABEL_CACHE:
+            _, (oldTexture, _, _, _) = self._labels.popitem(last=False)
+            glDeleteTextures([oldTexture])
+        return label
+
+    def draw(self, pos_w, pos_h):
+        """
+        Draw the overlay over the video quad.
+        :param pos_w: half width of the video quad in normalized device coordinates (TextureRenderer.fitQuad)
+        :param pos_h: half height
+        :return: Nothing
+        """
+        overlay = self._overlay
+        if overlay is None:
+            return
+        if self._dirty:
+            self._build(overlay)
+            self._dirty = False
+        w, h = overlay.imageSize
+
+        # Frame pixels (top-down) to the quad: x in [0, w] -> [-pos_w, pos_w], y in [0, h] -> [pos_h, -pos_h]
+        glMatrixMode(GL_MODELVIEW)
+        glPushMatrix()
+        glScalef(pos_w, pos_h, 1.0)
+        glTranslatef(-1.0, 1.0, 0.0)
+        glScalef(2.0 / w, -2.0 / h, 1.0)
+        glEnable(GL_BLEND)
+        glBlendFunc(GL_SRC_ALPHA, GL_ONE_MINUS_SRC_ALPHA)
+
+        if self._ranges:
+            glPushMatrix()
+            if overlay.mirror:
+                glTranslatef(w, 0.0, 0.0)
+                glScalef(-1.0, 1.0, 1.0)
+            glEnable(GL_POINT_SMOOTH)
+            glEnable(GL_LINE_SMOOTH)
+            glBindBuffer(GL_ARRAY_BUFFER, self._vbo)
+            glBindBuffer(GL_ELEMENT_ARRAY_BUFFER, self._ibo)
+            stride = _INT_VERTEX_FLOATS * 4
+            glEnableClientState(GL_VERTEX_ARRAY)
+            glVertexPointer(2, GL_FLOAT, stride, ctypes.c_void_p(0))
+            for mode, first, count, size, color in self._ranges:
+                if color is None:
+                    glEnableClientState(GL_COLOR_ARRAY)  # Per joint colour from the buffer
+                    glColorPointer(4, GL_FLOAT, stride, ctypes.c_void_p(8))
+                    glPointSize(size)
+                else:
+                    glDisableClientState(GL_COLOR_ARRAY)
+                    glColor4f(*color)
+                    glLineWidth(size)
+                glDrawElements(mode, count, GL_UNSIGNED_SHORT, ctypes.c_void_p(2 * first))
+            glDisableClientState(GL_COLOR_ARRAY)
+            glDisableClientState(GL_VERTEX_ARRAY)
+            glBindBuffer(GL_ARRAY_BUFFER, 0)
+            glBindBuffer(GL_ELEMENT_ARRAY_BUFFER, 0)
+            glDisable(GL_LINE_SMOOTH)
+            glDisable(GL_POINT_SMOOTH)
+            glPopMatrix()
+
+        if overlay.labels:
+            glEnable(GL_TEXTURE_2D)
+            glColor4f(1.0, 1.0, 1.0, 1.0)
+            for text, x, y, color, scale in overlay.labels:
+                texture, tw, th, baseline = self._label(text, tuple(color), scale)
+                top = y + baseline - th
+                glBindTexture(GL_TEXTURE_2D, texture)
+                glBegin(GL_QUADS)
+                glTexCoord2f(0.0, 0.0)
+                glVertex2f(x, top)
+                glTexCoord2f(1.0, 0.0)
+                glVertex2f(x + tw, top)
+                glTexCoord2f(1.0, 1.0)
+                glVertex2f(x + tw, top + th)
+                glTexCoord2f(0.0, 1.0)
+                glVertex2f(x, top + th)
+                glEnd()
+            glBindTexture(GL_TEXTURE_2D, 0)
+            glDisable(GL_TEXTURE_2D)
+
+        glDisable(GL_BLEND)
+        glColor4f(1.0, 1.0, 1.0, 1.0)
+        glPopMatrix()
+
+    def release(self):
+        if self._vbo is not None:
+            glDeleteBuffers(2, [self._vbo, self._ibo])
+        for texture, _, _, _ in self._labels.values():
+            glDeleteTextures([texture])
+        self._vbo = None
+        self._ibo = None
+        self._labels.clear()
+        self._dirty = self._overlay is not None
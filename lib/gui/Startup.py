@@ -0,0 +1,163 @@
+"""
+Application entry point, with a cold start profile for keeping startup under a budget.
+
+    python -m lib.gui.Startup
+    python -m lib.gui.Startup --profile-startup --budget 1.5
+
+--profile-startup starts the application in a fresh interpreter under `python -X importtime`,
+lets it run until the main window is shown and painted, then prints:
+  - the wall clock time from process start to the first painted window,
+  - the init steps (imports, QApplication, window construction, show, first paint),
+  - the slowest module imports, self and cumulative time, the project's own modules listed apart.
+With --budget the exit status is 1 when the cold start takes longer, so kiosk images can check it.
+A child that has not painted within --timeout seconds (no display, a hung driver) is killed.
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+import threading
+import subprocess
+
+_STR_PROJECT_FOLDER = os.path.normpath(os.path.realpath(__file__) + '/../../../')
+_STR_ICON_PATH_LOGO_32x32 = _STR_PROJECT_FOLDER + '/icon/crabsMLearning_32x32.png'
+_STR_PROFILE_MARKER = 'STARTUP_PROFILE '  # Prefix of the child's result line on stdout
+_INT_TOP_IMPORTS = 15  # Slowest imports listed in the report
+_FLOAT_PROFILE_TIMEOUT = 60.0  # Seconds to wait for the first paint, e.g. no display: the window never shows
+
+
+def runApp(profile=False):
+    """
+    Create and show the main window. With profile=True, quit once the window has been painted and
+    print the init step times as one JSON line.
+    """
+    steps = []
+    start = time.perf_counter()
+    last = [start]
+
+    def step(name):
+        now = time.perf_counter()
+        steps.append((name, now - last[0]))
+        last[0] = now
+
+    from PySide2.QtCore import QTimer
+    from PySide2.QtWidgets import QApplication
+    import lib.gui.MainWindow as mw
+    step('import lib.gui.MainWindow')
+
+    app = QApplication(sys.argv[:1])
+    step('QApplication')
+    mainWin = mw.MainWindowTemplate(app, w=512, h=512, minW=512, minH=256, winTitle='SPACE',
+                                    iconPath=_STR_ICON_PATH_LOGO_32x32)
+    step('MainWindowTemplate.__init__')
+    mainWin.show()
+    step('show')
+
+    if profile:
+        def firstPaint():
+            step('first paint')
+            print(_STR_PROFILE_MARKER + json.dumps({'steps': steps, 'total': time.perf_counter() - start}))
+            sys.stdout.flush()
+            app.quit()
+        QTimer.singleShot(0, firstPaint)  # Runs once the event loop has processed the show and paint events
+    return app.exec_()
+
+
+def parseImportTime(stderr):
+    """
+    :param stderr: output of `python -X importtime`
+    :return: [(module, self seconds, cumulative seconds, depth)] in import order
+    """
+    imports = []
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        parts = line[len('import time:'):].split('|')
+        if len(parts) != 3:
+            continue
+        name = parts[2].rstrip()
+        depth = (len(name) - len(name.lstrip())) // 2
+        imports.append((name.strip(), int(parts[0]) / 1e6, int(parts[1]) / 1e6, depth))
+    return imports
+
+
+def _readProfileLine(stream, start, found):
+    # Reader thread of profileStartup: the marker line is timed on arrival, the rest is drained
+    for line in stream:
+        if line.startswith(_STR_PROFILE_MARKER) and not found:
+            found.append(time.perf_counter() - start)  # Process start to first painted window
+            found.append(json.loads(line[len(_STR_PROFILE_MARKER):]))
+
+
+def profileStartup(budget=None, timeout=_FLOAT_PROFILE_TIMEOUT):
+    """
+    :param timeout: seconds to wait for the child's first paint before killing it
+    :return: process exit status, 1 if the budget was exceeded or the application failed to start
+    """
+    env = dict(os.environ)
+    env['PYTHONPATH'] = _STR_PROJECT_FOLDER + os.pathsep + env.get('PYTHONPATH', '')
+    # The import log is large, a file keeps it from filling a pipe nobody reads until the end
+    with tempfile.TemporaryFile('w+') as errFile:
+        start = time.perf_counter()
+        proc = subprocess.Popen([sys.executable, '-X', 'importtime', '-m', 'lib.gui.Startup', '--profile-child'],
+                                stdout=subprocess.PIPE, stderr=errFile, universal_newlines=True, env=env,
+                                cwd=_STR_PROJECT_FOLDER)
+        found = []  # [wall seconds, child result] once the marker line arrived
+        reader = threading.Thread(target=_readProfileLine, args=(proc.stdout, start, found), daemon=True)
+        reader.start()
+        reader.join(timeout)  # Ends with the child's stdout, i.e. when the child quits after the first paint
+        timedOut = reader.is_alive()
+        if timedOut:
+            proc.kill()
+        proc.wait()
+        reader.join()
+        errFile.seek(0)
+        stderr = errFile.read()
+    if not found:
+        reason = 'did not paint within %.0f s' % timeout if timedOut else 'did not start'
+        print('The application %s:\n%s' % (reason, stderr[-4000:]), file=sys.stderr)
+        return 1
+    wallSeconds, result = found
+
+    print('----- Cold start -----')
+    print('%-40s %10.1f ms' % ('process start -> first paint', 1000 * wallSeconds))
+    print('%-40s %10.1f ms' % ('interpreter and runtime (rest)', 1000 * (wallSeconds - result['total'])))
+    for name, seconds in result['steps']:
+        print('  %-38s %10.1f ms' % (name, 1000 * seconds))
+
+    imports = parseImportTime(stderr)
+    print('\n----- Slowest imports (cumulative, self) -----')
+    topLevel = [imp for imp in imports if imp[3] == 0]
+    for name, selfSeconds, cumulative, _ in sorted(topLevel, key=lambda imp: -imp[2])[:_INT_TOP_IMPORTS]:
+        print('  %-38s %10.1f ms %10.1f ms' % (name, 1000 * cumulative, 1000 * selfSeconds))
+    print('\n----- Project modules (cumulative, self) -----')
+    for name, selfSeconds, cumulative, _ in imports:
+        if name.startswith('lib.'):
+            print('  %-38s %10.1f ms %10.1f ms' % (name, 1000 * cumulative, 1000 * selfSeconds))
+
+    if budget is not None:
+        within = wallSeconds <= budget
+        print('\nBudget %.0f ms: %s' % (1000 * budget, 'ok' if within else 'EXCEEDED'))
+        return 0 if within else 1
+    return 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Start the pose estimation application.')
+    parser.add_argument('--profile-startup', action='store_true',
+                        help='report import and init time per module up to the first painted window, then exit')
+    parser.add_argument('--budget', type=float, default=None, help='cold start budget in seconds (with --profile-startup)')
+    parser.add_argument('--timeout', type=float, default=_FLOAT_PROFILE_TIMEOUT,
+                        help='seconds to wait for the first paint (with --profile-startup, default: %(default)s)')
+    parser.add_argument('--profile-child', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.profile_startup:
+        return profileStartup(args.budget, args.timeout)
+    return runApp(profile=args.profile_child)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
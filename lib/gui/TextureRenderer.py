@@ -0,0 +1,253 @@
+import ctypes
+import numpy as np
+
+from OpenGL.GL import *
+
+_INT_PBO_COUNT = 2  # Double-buffered pixel buffer objects
+_FLOAT_BLUR_LOD_BIAS = 3.5  # Mipmap level the blurred background is sampled from (about 1/11 of the frame size)
+
+
+class TextureRenderer:
+    """
+    Streams frames into a persistent texture through double-buffered pixel buffer objects
+    and draws it as a single textured quad. It only depends on PyOpenGL and an active
+    (compatibility profile) GL context, so it runs under QGLWidget as well as under a
+    headless OSMesa/llvmpipe context (see lib/benchmark/RendererBenchmark.py).
+
+    Frames are expected top-down as OpenCV stores them, the vertical flip and the scaling
+    to the viewport happen in texture/vertex coordinates.
+
+    With a segmentation mask (setMask) and a background mode, the frame is composited on the GPU:
+    the background is drawn first (the frame itself, sampled from a small mipmap level, or a
+    replacement texture), then the frame again with the low resolution mask as a second, alpha
+    texture that the sampler scales up.
+    """
+    def __init__(self, flipY=True, mirrorX=False):
+        self.flipY = flipY
+        self.mirrorX = mirrorX  # Show the frame mirrored without touching its pixels
+        self._texture = None
+        self._pbos = None
+        self._pboIndex = 0
+        self._texWidth = 0
+        self._texHeight = 0
+        self._texFormat = None
+        self._seq = None  # Sequence number of the frame currently in the texture
+        self.uploads = 0  # Number of frames actually sent to the GPU
+        self.backgroundMode = 'none'  # 'none', 'blur' or 'replace', see setBackgroundMode()
+        self._maskTexture = None
+        self._maskShape = None
+        self._hasMask = False
+        self._mipmapped = False  # The frame texture has mipmaps for the blurred background
+        self._backgroundTexture = None
+        self._background = None  # Replacement image waiting for upload
+
+    @staticmethod
+    def _glFormat(img):
+        channels = 1 if img.ndim == 2 else img.shape[2]
+        if channels == 4:
+            return GL_RGBA
+        if channels == 3:
+            return GL_BGR  # Upload OpenCV BGR frames without a colour conversion
+        return GL_LUMINANCE
+
+    def _allocate(self, w, h, fmt, nbytes):
+        if self._texture is None:
+            self._texture = glGenTextures(1)
+            self._pbos = glGenBuffers(_INT_PBO_COUNT)
+        glBindTexture(GL_TEXTURE_2D, self._texture)
+        glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_MIN_FILTER, GL_LINEAR)
+        glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_MAG_FILTER, GL_LINEAR)
+        glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_WRAP_S, GL_CLAMP_TO_EDGE)
+        glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_WRAP_T, GL_CLAMP_TO_EDGE)
+        glTexImage2D(GL_TEXTURE_2D, 0, GL_RGBA8, w, h, 0, fmt, GL_UNSIGNED_BYTE, None)
+        self._mipmapped = False
+        for pbo in self._pbos:
+            glBindBuffer(GL_PIXEL_UNPACK_BUFFER, pbo)
+            glBufferData(GL_PIXEL_UNPACK_BUFFER, nbytes, None, GL_STREAM_DRAW)
+        glBindBuffer(GL_PIXEL_UNPACK_BUFFER, 0)
+        self._texWidth = w
+        self._texHeight = h
+        self._texFormat = fmt
+
+    def upload(self, img, seq):
+        """
+        Copy img to the texture, unless seq is the sequence number of the frame already uploaded.
+        :param img: uint8 image (h, w, 3 BGR | 4 RGBA | 1)
+        :param seq: the frame sequence number
+        :return: True if a new upload happened
+        """
+        if img is None or seq == self._seq:
+            return False
+        img = np.ascontiguousarray(img)
+        h, w = img.shape[:2]
+        fmt = self._glFormat(img)
+        if self._texture is None or (w, h, fmt) != (self._texWidth, self._texHeight, self._texFormat):
+            self._allocate(w, h, fmt, img.nbytes)
+
+        # Write the frame into the next PBO. Orphaning the buffer first means the driver never
+        # has to wait for the transfer still reading the other one.
+        pbo = self._pbos[self._pboIndex]
+        self._pboIndex = (self._pboIndex + 1) % _INT_PBO_COUNT
+        glBindBuffer(GL_PIXEL_UNPACK_BUFFER, pbo)
+        glBufferData(GL_PIXEL_UNPACK_BUFFER, img.nbytes, None, GL_STREAM_DRAW)
+        ptr = glMapBuffer(GL_PIXEL_UNPACK_BUFFER, GL_WRITE_ONLY)
+        if ptr:
+            ctypes.memmove(ptr, img.ctypes.data, img.nbytes)
+            glUnmapBuffer(GL_PIXEL_UNPACK_BUFFER)
+
+        # Texture update sourced from the bound PBO (offset 0), asynchronous to the CPU
+        glPixelStorei(GL_UNPACK_ALIGNMENT, 1)
+        glBindTexture(GL_TEXTURE_2D, self._texture)
+        glTexSubImage2D(GL_TEXTURE_2D, 0, 0, 0, w, h, fmt, GL_UNSIGNED_BYTE, ctypes.c_void_p(0))
+        glBindBuffer(GL_PIXEL_UNPACK_BUFFER, 0)
+        if self.backgroundMode != 'blur' and self._mipmapped:
+            glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_MIN_FILTER, GL_LINEAR)  # The levels are stale from now on
+            self._mipmapped = False
+        elif self.backgroundMode == 'blur':
+            glGenerateMipmap(GL_TEXTURE_2D)  # On the GPU, the blur is a lookup in a small level
+            if not self._mipmapped:
+                glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_MIN_FILTER, GL_LINEAR_MIPMAP_LINEAR)
+                self._mipmapped = True
+
+        self._seq = seq
+        self.uploads += 1
+        return True
+
+    def setBackgroundMode(self, mode, background=None):
+        """
+        :param mode: 'none', 'blur' (the frame, blurred) or 'replace' (the background image)
+        :param background: BGR image for 'replace', uploaded on the next draw
+        :return: Nothing
+        """
+        self.backgroundMode = mode
+        if background is not None:
+            self._background = np.ascontiguousarray(background)
+        self._seq = None  # Re-upload, the blur needs mipmaps of the current frame
+
+    def setMask(self, alpha):
+        """
+        Upload the alpha of the next frames. Small (see SegmentationCompositor.maskToAlpha), so no PBO.
+        :param alpha: uint8 (h, w) person alpha in the frame orientation, None to draw without compositing
+        :return: Nothing
+        """
+        self._hasMask = alpha is not None
+        if alpha is None:
+            return
+        alpha = np.ascontiguousarray(alpha)
+        if self._maskTexture is None:
+            self._maskTexture = glGenTextures(1)
+        glPixelStorei(GL_UNPACK_ALIGNMENT, 1)
+        glBindTexture(GL_TEXTURE_2D, self._maskTexture)
+        if alpha.shape != self._maskShape:
+            glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_MIN_FILTER, GL_LINEAR)
+            glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_MAG_FILTER, GL_LINEAR)
+            glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_WRAP_S, GL_CLAMP_TO_EDGE)
+            glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_WRAP_T, GL_CLAMP_TO_EDGE)
+            glTexImage2D(GL_TEXTURE_2D, 0, GL_ALPHA8, alpha.shape[1], alpha.shape[0], 0, GL_ALPHA,
+                         GL_UNSIGNED_BYTE, alpha)
+            self._maskShape = alpha.shape
+        else:
+            glTexSubImage2D(GL_TEXTURE_2D, 0, 0, 0, alpha.shape[1], alpha.shape[0], GL_ALPHA, GL_UNSIGNED_BYTE, alpha)
+        glBindTexture(GL_TEXTURE_2D, 0)
+
+    def _uploadBackground(self):
+        if self._backgroundTexture is None:
+            self._backgroundTexture = glGenTextures(1)
+        img = self._background
+        glPixelStorei(GL_UNPACK_ALIGNMENT, 1)
+        glBindTexture(GL_TEXTURE_2D, self._backgroundTexture)
+        glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_MIN_FILTER, GL_LINEAR)
+        glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_MAG_FILTER, GL_LINEAR)
+        glTexImage2D(GL_TEXTURE_2D, 0, GL_RGBA8, img.shape[1], img.shape[0], 0, self._glFormat(img),
+                     GL_UNSIGNED_BYTE, img)
+        glBindTexture(GL_TEXTURE_2D, 0)
+        self._background = None
+
+    def _quad(self, pos_w, pos_h, withMask=False):
+        v_top, v_bottom = (0.0, 1.0) if self.flipY else (1.0, 0.0)
+        u_left, u_right = (1.0, 0.0) if self.mirrorX else (0.0, 1.0)
+        glBegin(GL_QUADS)
+        for u, v, x, y in ((u_left, v_bottom, -pos_w, -pos_h), (u_right, v_bottom, pos_w, -pos_h),
+                           (u_right, v_top, pos_w, pos_h), (u_left, v_top, -pos_w, pos_h)):
+            glMultiTexCoord2f(GL_TEXTURE0, u, v)
+            if withMask:
+                glMultiTexCoord2f(GL_TEXTURE1, u, v)
+            glVertex2f(x, y)
+        glEnd()
+
+    def fitQuad(self, viewWidth, viewHeight):
+        """
+        :return: (half width, half height) in normalized device coordinates of the quad draw() fills,
+                 keeping the frame aspect ratio (e.g. to draw a SkeletonRenderer overlay on it)
+        """
+        original_ratio = self._texWidth / self._texHeight
+        designer_ratio = viewWidth / viewHeight
+        if original_ratio > designer_ratio:
+            return 1.0, designer_ratio / original_ratio
+        return original_ratio / designer_ratio, 1.0
+
+    def draw(self, viewWidth, viewHeight):
+        """
+        Draw the texture as a quad that keeps the frame aspect ratio and fits the viewport.
+        :return: Nothing
+        """
+        if self._texture is None or viewWidth <= 0 or viewHeight <= 0:
+            return
+        pos_w, pos_h = self.fitQuad(viewWidth, viewHeight)
+
+        if self._background is not None:
+            self._uploadBackground()
+        composite = self._hasMask and (self.backgroundMode == 'blur' and self._mipmapped or
+                                       self.backgroundMode == 'replace' and self._backgroundTexture is not None)
+
+        glEnable(GL_TEXTURE_2D)
+        glColor4f(1.0, 1.0, 1.0, 1.0)
+        if composite:
+            # Background: the frame from a small mipmap level, or the replacement
+            if self.backgroundMode == 'blur':
+                glBindTexture(GL_TEXTURE_2D, self._texture)
+                glTexEnvf(GL_TEXTURE_FILTER_CONTROL, GL_TEXTURE_LOD_BIAS, _FLOAT_BLUR_LOD_BIAS)
+                self._quad(pos_w, pos_h)
+                glTexEnvf(GL_TEXTURE_FILTER_CONTROL, GL_TEXTURE_LOD_BIAS, 0.0)
+            else:
+                glBindTexture(GL_TEXTURE_2D, self._backgroundTexture)
+                self._quad(pos_w, pos_h)
+            # Foreground: frame colour from unit 0, alpha from the mask on unit 1, blended over
+            glBindTexture(GL_TEXTURE_2D, self._texture)
+            glTexEnvi(GL_TEXTURE_ENV, GL_TEXTURE_ENV_MODE, GL_REPLACE)
+            glActiveTexture(GL_TEXTURE1)
+            glEnable(GL_TEXTURE_2D)
+            glBindTexture(GL_TEXTURE_2D, self._maskTexture)
+            glTexEnvi(GL_TEXTURE_ENV, GL_TEXTURE_ENV_MODE, GL_COMBINE)
+            glTexEnvi(GL_TEXTURE_ENV, GL_COMBINE_RGB, GL_REPLACE)
+            glTexEnvi(GL_TEXTURE_ENV, GL_SOURCE0_RGB, GL_PREVIOUS)
+            glTexEnvi(GL_TEXTURE_ENV, GL_COMBINE_ALPHA, GL_REPLACE)
+            glTexEnvi(GL_TEXTURE_ENV, GL_SOURCE0_ALPHA, GL_TEXTURE)
+            glEnable(GL_BLEND)
+            glBlendFunc(GL_SRC_ALPHA, GL_ONE_MINUS_SRC_ALPHA)
+            self._quad(pos_w, pos_h, withMask=True)
+            glDisable(GL_BLEND)
+            glTexEnvi(GL_TEXTURE_ENV, GL_TEXTURE_ENV_MODE, GL_MODULATE)
+            glBindTexture(GL_TEXTURE_2D, 0)
+            glDisable(GL_TEXTURE_2D)
+            glActiveTexture(GL_TEXTURE0)
+            glTexEnvi(GL_TEXTURE_ENV, GL_TEXTURE_ENV_MODE, GL_MODULATE)
+        else:
+            glBindTexture(GL_TEXTURE_2D, self._texture)
+            self._quad(pos_w, pos_h)
+        glBindTexture(GL_TEXTURE_2D, 0)
+        glDisable(GL_TEXTURE_2D)
+
+    def release(self):
+        if self._texture is not None:
+            glDeleteTextures([self._texture])
+            glDeleteBuffers(_INT_PBO_COUNT, self._pbos)
+        for texture in (self._maskTexture, self._backgroundTexture):
+            if texture is not None:
+                glDeleteTextures([texture])
+        self._maskTexture = None
+        self._maskShape = None
+        self._backgroundTexture = None
+        self._texture = None
+        self._pbos = None
+        self._seq = None
@@ -0,0 +1,61 @@
+import math
+
+from OpenGL.GL import glViewport
+
+from lib.gui.TextureRenderer import TextureRenderer
+
+
+def tileGrid(count, aspect=1.0):
+    """
+    :param count: number of tiles
+    :param aspect: width / height of the view
+    :return: (columns, rows) that fit count tiles, with more columns on wide views
+    """
+    if count <= 0:
+        return 0, 0
+    cols = max(1, min(count, int(round(math.sqrt(count * aspect)))))
+    return cols, int(math.ceil(count / cols))
+
+
+def tileViewports(count, w, h):
+    """
+    :return: [(x, y, w, h)] GL viewports of count tiles, row by row from the top left
+    """
+    cols, rows = tileGrid(count, w / h if h > 0 else 1.0)
+    tileW, tileH = w // max(cols, 1), h // max(rows, 1)
+    return [((i % cols) * tileW, h - (i // cols + 1) * tileH, tileW, tileH) for i in range(count)]
+
+
+class TiledView:
+    """
+    One TextureRenderer per source, drawn in a grid of viewports of the GL widget.
+    """
+    def __init__(self, count):
+        self.renderers = [TextureRenderer() for _ in range(count)]
+        self.images = [None] * count
+        self.seqs = [0] * count
+
+    def setImage(self, index, img):
+        self.images[index] = img
+        self.seqs[index] += 1
+
+    def draw(self, w, h):
+        """
+        Upload the tiles that changed and draw every tile, then restore the full viewport.
+        :return: number of tiles uploaded
+        """
+        uploads = 0
+        for renderer, img, seq, (x, y, tileW, tileH) in zip(self.renderers, self.images, self.seqs,
+                                                           tileViewports(len(self.renderers), w, h)):
+            if img is None:
+                continue
+            uploads += renderer.upload(img, seq)
+            glViewport(x, y, tileW, tileH)
+            renderer.draw(tileW, tileH)
+        glViewport(0, 0, w, h)
+        return uploads
+
+    def release(self):
+        for renderer in self.renderers:
+            renderer.release()
+        self.images = [None] * len(self.renderers)
@@ -0,0 +1,314 @@
+import ctypes
+import math
+
+import numpy as np
+
+from OpenGL.GL import *
+
+_INT_LANDMARKS = 33
+_INT_TRAIL = 90  # Poses kept in the ring buffer, 3 s at 30 fps
+_INT_MAX_TRAIL = 1024  # uint16 indices: 1 + trail * 33 vertices must stay below 65536
+_INT_VERTEX_FLOATS = 4  # x, y, z, sequence number (texture coordinate of the fade ramp)
+_INT_FADE_TEXELS = 256
+_FLOAT_VISIBILITY = 0.5
+_FLOAT_PARK = 1.0e4  # Unused index slots point at a vertex this far away, always clipped
+_FLOAT_MAX_SEQ = float(1 << 24)  # Sequence numbers are exact in float32 up to here
+_FLOAT_TRAIL_ALPHA = 0.6  # Alpha of the newest trail pose, older ones fade to 0
+_FLOAT_POINT_SIZE = 7.0
+_FLOAT_LINE_WIDTH = 3.0
+_FLOAT_TRAIL_POINT_SIZE = 3.0
+_FLOAT_TRAIL_LINE_WIDTH = 1.0
+
+_FLOAT_FOV = 45.0
+_FLOAT_NEAR = 0.05
+_FLOAT_FAR = 100.0
+_FLOAT_DISTANCE = 3.0  # Metres from the orbit target
+_FLOAT_MIN_DISTANCE = 0.5
+_FLOAT_MAX_DISTANCE = 20.0
+_FLOAT_YAW = 30.0
+_FLOAT_PITCH = 15.0
+_FLOAT_DEGREES_PER_PIXEL = 0.4
+_FLOAT_ZOOM_STEP = 1.1  # Distance factor per wheel notch
+
+_FLOAT_FLOOR = -0.95  # Floor grid height (GL y, metres below the hip centre)
+_FLOAT_GRID_SIZE = 1.5  # Half size of the floor grid in metres
+_FLOAT_GRID_STEP = 0.25
+
+_TUPLE_BONE_COLOR = (1.0, 1.0, 1.0, 1.0)
+_TUPLE_JOINT_COLOR = (1.0, 0.0, 0.0, 1.0)
+_TUPLE_TRAIL_COLOR = (0.3, 0.7, 1.0)
+_TUPLE_GRID_COLOR = (0.35, 0.35, 0.35, 1.0)
+
+
+def perspective(fovY, aspect, near, far):
+    f = 1.0 / math.tan(math.radians(fovY) / 2)
+    return np.array([[f / aspect, 0, 0, 0],
+                     [0, f, 0, 0],
+                     [0, 0, (far + near) / (near - far), 2 * far * near / (near - far)],
+                     [0, 0, -1, 0]], dtype=np.float32)
+
+
+def _rotation(axis, degrees):
+    c, s = math.cos(math.radians(degrees)), math.sin(math.radians(degrees))
+    m = np.eye(4, dtype=np.float32)
+    i, j = {'x': (1, 2), 'y': (2, 0)}[axis]
+    m[i, i], m[i, j], m[j, i], m[j, j] = c, -s, s, c
+    return m
+
+
+class OrbitCamera:
+    """
+    Perspective camera circling a target point: drag to rotate (yaw around the vertical axis,
+    pitch up and down), wheel to zoom, reset() to go back to the default view.
+    """
+    def __init__(self, target=(0.0, 0.0, 0.0)):
+        self.defaultTarget = tuple(target)
+        self.reset()
+
+    def reset(self):
+        self.target = np.array(self.defaultTarget, dtype=np.float32)
+        self.yaw = _FLOAT_YAW
+        self.pitch = _FLOAT_PITCH
+        self.distance = _FLOAT_DISTANCE
+
+    def rotate(self, dx, dy):
+        """
+        :param dx, dy: mouse movement in pixels
+        """
+        self.yaw = (self.yaw + dx * _FLOAT_DEGREES_PER_PIXEL) % 360.0
+        self.pitch = max(-89.0, min(89.0, self.pitch + dy * _FLOAT_DEGREES_PER_PIXEL))
+
+    def zoom(self, steps):
+        """
+        :param steps: wheel notches, positive zooms in
+        """
+        self.distance = max(_FLOAT_MIN_DISTANCE, min(_FLOAT_MAX_DISTANCE, self.distance / _FLOAT_ZOOM_STEP ** steps))
+
+    def projection(self, aspect):
+        return perspective(_FLOAT_FOV, aspect, _FLOAT_NEAR, _FLOAT_FAR)
+
+    def view(self):
+        translate = np.eye(4, dtype=np.float32)
+        translate[:3, 3] = -self.target
+        back = np.eye(4, dtype=np.float32)
+        back[2, 3] = -self.distance
+        return back @ _rotation('x', self.pitch) @ _rotation('y', -self.yaw) @ translate
+
+
+class WorldSkeletonRenderer:
+    """
+    3D view of MediaPipe world landmarks (metres around the hip centre) with a trail of the last
+    poses, in the same compatibility profile context as TextureRenderer.
+
+    All geometry lives in two buffers allocated once: a vertex buffer holding a ring of trail
+    poses and an index buffer with the bones and joints of each ring slot. A new pose overwrites
+    its slot in place (33 vertices and their indices, under 600 bytes); nothing else is sent and
+    no geometry is built in Python at paint time. The whole trail is then drawn with one
+    glDrawElements for the bones and one for the joints, whatever its length: every vertex
+    carries the sequence number of its pose as a texture coordinate, and the texture matrix
+    maps it onto a 1D alpha ramp, so the trail fades with age without touching the vertices.
+    Bones and joints below the visibility threshold are pointed at a parking vertex far outside
+    the view. The newest pose is drawn once more on top, opaque and thicker.
+    :param connections: (m, 2) landmark index pairs, e.g. PoseModule.MEDIAPIPE_CONNECTIONS
+    :param trailLength: poses kept, the newest included
+    """
+    def __init__(self, connections, trailLength=_INT_TRAIL):
+        self.connections = np.asarray(connections, dtype=np.uint16).reshape(-1, 2)
+        self.trailLength = max(1, min(int(trailLength), _INT_MAX_TRAIL))
+        self.camera = OrbitCamera()
+        self._bonesPerSlot = 2 * len(self.connections)
+        self._indicesPerSlot = self._bonesPerSlot + _INT_LANDMARKS
+        self._vbo = None
+        self._ibo = None
+        self._fade = None
+        self._grid = None
+        self._gridCount = 0
+        self._slotVertices = np.zeros((_INT_LANDMARKS, _INT_VERTEX_FLOATS), dtype=np.float32)
+        self._slotBones = np.zeros(self._bonesPerSlot, dtype=np.uint16)
+        self._slotJoints = np.zeros(_INT_LANDMARKS, dtype=np.uint16)
+        self._pending = []  # (slot, world landmarks or None, seq) not uploaded yet
+        self._seq = 0  # Sequence number of the next pose
+        self._newest = None  # Slot of the newest pose with landmarks, None when it had none
+
+    def _allocate(self):
+        vertexCount = 1 + self.trailLength * _INT_LANDMARKS  # The parking vertex first
+        vertices = np.zeros((vertexCount, _INT_VERTEX_FLOATS), dtype=np.float32)
+        vertices[0, :3] = _FLOAT_PARK
+        vertices[0, 3] = -_FLOAT_MAX_SEQ
+        # Bones of all slots first (one GL_LINES range), then the joints of all slots (one GL_POINTS range)
+        indices = np.zeros(self.trailLength * self._indicesPerSlot, dtype=np.uint16)
+        self._vbo, self._ibo = glGenBuffers(2)
+        glBindBuffer(GL_ARRAY_BUFFER, self._vbo)
+        glBufferData(GL_ARRAY_BUFFER, vertices.nbytes, vertices, GL_DYNAMIC_DRAW)
+        glBindBuffer(GL_ELEMENT_ARRAY_BUFFER, self._ibo)
+        glBufferData(GL_ELEMENT_ARRAY_BUFFER, indices.nbytes, indices, GL_DYNAMIC_DRAW)
+        glBindBuffer(GL_ARRAY_BUFFER, 0)
+        glBindBuffer(GL_ELEMENT_ARRAY_BUFFER, 0)
+
+        ramp = np.zeros((_INT_FADE_TEXELS, 4), dtype=np.uint8)
+        ramp[:, :3] = 255
+        ramp[:, 3] = np.linspace(0, 255 * _FLOAT_TRAIL_ALPHA, _INT_FADE_TEXELS).astype(np.uint8)
+        self._fade = glGenTextures(1)
+        glBindTexture(GL_TEXTURE_1D, self._fade)
+        glTexParameteri(GL_TEXTURE_1D, GL_TEXTURE_MIN_FILTER, GL_LINEAR)
+        glTexParameteri(GL_TEXTURE_1D, GL_TEXTURE_MAG_FILTER, GL_LINEAR)
+        glTexParameteri(GL_TEXTURE_1D, GL_TEXTURE_WRAP_S, GL_CLAMP_TO_EDGE)
+        glTexImage1D(GL_TEXTURE_1D, 0, GL_RGBA8, _INT_FADE_TEXELS, 0, GL_RGBA, GL_UNSIGNED_BYTE, ramp)
+        glBindTexture(GL_TEXTURE_1D, 0)
+
+        steps = np.arange(-_FLOAT_GRID_SIZE, _FLOAT_GRID_SIZE + 1e-6, _FLOAT_GRID_STEP, dtype=np.float32)
+        lines = []
+        for s in steps:
+            lines += [(s, _FLOAT_FLOOR, -_FLOAT_GRID_SIZE), (s, _FLOAT_FLOOR, _FLOAT_GRID_SIZE),
+                      (-_FLOAT_GRID_SIZE, _FLOAT_FLOOR, s), (_FLOAT_GRID_SIZE, _FLOAT_FLOOR, s)]
+        grid = np.array(lines, dtype=np.float32)
+        self._grid = glGenBuffers(1)
+        glBindBuffer(GL_ARRAY_BUFFER, self._grid)
+        glBufferData(GL_ARRAY_BUFFER, grid.nbytes, grid, GL_STATIC_DRAW)
+        glBindBuffer(GL_ARRAY_BUFFER, 0)
+        self._gridCount = len(grid)
+
+    def pushPose(self, world):
+        """
+        Add the pose of a new frame to the trail. Cheap, the upload happens on the next draw.
+        :param world: (33, 4) world landmarks (PoseDetector.MediaPipe_worldLandmarks) or None without a pose
+        :return: Nothing
+        """
+        if self._seq >= _FLOAT_MAX_SEQ:
+            self.clear()
+        slot = self._seq % self.trailLength
+        self._pending.append((slot, None if world is None else np.array(world, dtype=np.float32), self._seq))
+        del self._pending[:-self.trailLength]  # Older pending poses would be overwritten anyway
+        self._newest = None if world is None else slot
+        self._seq += 1
+
+    def clear(self):
+        """
+        Empty the trail.
+        """
+        self._pending = [(slot, None, 0) for slot in range(self.trailLength)]
+        self._seq = 0
+        self._newest = None
+
+    def _upload(self, slot, world, seq):
+        vertices, bones, joints = self._slotVertices, self._slotBones, self._slotJoints
+        base = 1 + slot * _INT_LANDMARKS
+        if world is None:
+            bones[:] = 0
+            joints[:] = 0
+        else:
+            # MediaPipe world axes (x right, y down, z away from the camera) to GL (y up, z towards the viewer)
+            vertices[:, 0] = world[:, 0]
+            vertices[:, 1] = -world[:, 1]
+            vertices[:, 2] = -world[:, 2]
+            vertices[:, 3] = seq
+            visible = world[:, 3] >= _FLOAT_VISIBILITY
+            shown = visible[self.connections].all(axis=1)
+            bones[:] = np.where(shown[:, None], self.connections + base, 0).ravel()
+            joints[:] = np.where(visible, np.arange(base, base + _INT_LANDMARKS), 0)
+            glBindBuffer(GL_ARRAY_BUFFER, self._vbo)
+            glBufferSubData(GL_ARRAY_BUFFER, base * vertices.itemsize * _INT_VERTEX_FLOATS, vertices.nbytes, vertices)
+        glBindBuffer(GL_ELEMENT_ARRAY_BUFFER, self._ibo)
+        glBufferSubData(GL_ELEMENT_ARRAY_BUFFER, slot * bones.nbytes, bones.nbytes, bones)
+        glBufferSubData(GL_ELEMENT_ARRAY_BUFFER, self.trailLength * bones.nbytes + slot * joints.nbytes,
+                        joints.nbytes, joints)
+
+    def draw(self, width, height):
+        """
+        Draw the floor grid, the trail and the newest pose over the whole viewport.
+        :param width, height: viewport size in pixels, for the aspect ratio
+        :return: Nothing
+        """
+        if self._vbo is None:
+            self._allocate()
+        if self._pending:
+            for slot, world, seq in self._pending:
+                self._upload(slot, world, seq)
+            self._pending = []
+            glBindBuffer(GL_ARRAY_BUFFER, 0)
+            glBindBuffer(GL_ELEMENT_ARRAY_BUFFER, 0)
+
+        glMatrixMode(GL_PROJECTION)
+        glPushMatrix()
+        glLoadMatrixf(np.ascontiguousarray(self.camera.projection(width / max(height, 1)).T))
+        glMatrixMode(GL_MODELVIEW)
+        glPushMatrix()
+        glLoadMatrixf(np.ascontiguousarray(self.camera.view().T))
+        glEnable(GL_BLEND)
+        glBlendFunc(GL_SRC_ALPHA, GL_ONE_MINUS_SRC_ALPHA)
+        glEnable(GL_LINE_SMOOTH)
+        glEnable(GL_POINT_SMOOTH)
+        glEnableClientState(GL_VERTEX_ARRAY)
+
+        glBindBuffer(GL_ARRAY_BUFFER, self._grid)
+        glVertexPointer(3, GL_FLOAT, 0, ctypes.c_void_p(0))
+        glColor4f(*_TUPLE_GRID_COLOR)
+        glLineWidth(1.0)
+        glDrawArrays(GL_LINES, 0, self._gridCount)
+
+        stride = _INT_VERTEX_FLOATS * 4
+        glBindBuffer(GL_ARRAY_BUFFER, self._vbo)
+        glBindBuffer(GL_ELEMENT_ARRAY_BUFFER, self._ibo)
+        glVertexPointer(3, GL_FLOAT, stride, ctypes.c_void_p(0))
+        if self.trailLength > 1 and self._seq > 1:
+            # Sequence number -> fade ramp: the newest pose at the top, the one trailLength - 1 older at 0
+            newest = self._seq - 1
+            glMatrixMode(GL_TEXTURE)
+            glPushMatrix()
+            glLoadIdentity()
+            glScalef(1.0 / (self.trailLength - 1), 1.0, 1.0)
+            glTranslatef(-(newest - self.trailLength + 1), 0.0, 0.0)
+            glMatrixMode(GL_MODELVIEW)
+            glEnable(GL_TEXTURE_1D)
+            glBindTexture(GL_TEXTURE_1D, self._fade)
+            glTexEnvi(GL_TEXTURE_ENV, GL_TEXTURE_ENV_MODE, GL_MODULATE)
+            glEnableClientState(GL_TEXTURE_COORD_ARRAY)
+            glTexCoordPointer(1, GL_FLOAT, stride, ctypes.c_void_p(12))
+            glColor4f(*_TUPLE_TRAIL_COLOR, 1.0)
+            glLineWidth(_FLOAT_TRAIL_LINE_WIDTH)
+            glDrawElements(GL_LINES, self.trailLength * self._bonesPerSlot, GL_UNSIGNED_SHORT, ctypes.c_void_p(0))
+            glPointSize(_FLOAT_TRAIL_POINT_SIZE)
+            glDrawElements(GL_POINTS, self.trailLength * _INT_LANDMARKS, GL_UNSIGNED_SHORT,
+                           ctypes.c_void_p(2 * self.trailLength * self._bonesPerSlot))
+            glDisableClientState(GL_TEXTURE_COORD_ARRAY)
+            glBindTexture(GL_TEXTURE_1D, 0)
+            glDisable(GL_TEXTURE_1D)
+            glMatrixMode(GL_TEXTURE)
+            glPopMatrix()
+            glMatrixMode(GL_MODELVIEW)
+
+        if self._newest is not None:
+            slot = self._newest
+            glColor4f(*_TUPLE_BONE_COLOR)
+            glLineWidth(_FLOAT_LINE_WIDTH)
+            glDrawElements(GL_LINES, self._bonesPerSlot, GL_UNSIGNED_SHORT,
+                           ctypes.c_void_p(2 * slot * self._bonesPerSlot))
+            glColor4f(*_TUPLE_JOINT_COLOR)
+            glPointSize(_FLOAT_POINT_SIZE)
+            glDrawElements(GL_POINTS, _INT_LANDMARKS, GL_UNSIGNED_SHORT,
+                           ctypes.c_void_p(2 * (self.trailLength * self._bonesPerSlot + slot * _INT_LANDMARKS)))
+
+        glDisableClientState(GL_VERTEX_ARRAY)
+        glBindBuffer(GL_ARRAY_BUFFER, 0)
+        glBindBuffer(GL_ELEMENT_ARRAY_BUFFER, 0)
+        glDisable(GL_POINT_SMOOTH)
+        glDisable(GL_LINE_SMOOTH)
+        glDisable(GL_BLEND)
+        glColor4f(1.0, 1.0, 1.0, 1.0)
+        glPopMatrix()
+        glMatrixMode(GL_PROJECTION)
+        glPopMatrix()
+        glMatrixMode(GL_MODELVIEW)
+
+    def release(self):
+        if self._vbo is not None:
+            glDeleteBuffers(3, [self._vbo, self._ibo, self._grid])
+            glDeleteTextures([self._fade])
+        self._vbo = None
+        self._ibo = None
+        self._grid = None
+        self._fade = None
+        # The trail only lived in the buffers, the next draw starts an empty one
+        self._pending = []
+        self._seq = 0
+        self._newest = None
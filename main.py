@@ -8,10 +8,14 @@ pose = mpPose.Pose()
 
 cap = cv2.VideoCapture('PoseVideos/pv_05.mp4')
 pTime = 0
+# Reused every frame instead of allocating full-size images (read and cvtColor/resize write into them)
+img = None
+imgRGB = None
+resized = None
 while True:
-    success, img = cap.read()
+    success, img = cap.read(image=img)
     if success:
-        imgRGB = cv2.cvtColor(img, cv2.COLOR_BGR2RGB)
+        imgRGB = cv2.cvtColor(img, cv2.COLOR_BGR2RGB, dst=imgRGB)
         results = pose.process(imgRGB)
         # print(results.pose_landmarks)
         if results.pose_landmarks:
@@ -35,7 +39,7 @@ while True:
         dim = (width, height)
 
         # resize image
-        resized = cv2.resize(img, dim, interpolation=cv2.INTER_AREA)
+        resized = cv2.resize(img, dim, dst=resized, interpolation=cv2.INTER_AREA)
 
         cv2.imshow("Image", resized)
         cv2.waitKey(1)
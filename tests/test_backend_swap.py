@@ -0,0 +1,142 @@
+import sys
+import threading
+
+import numpy as np
+
+import lib.core.PoseModule as pm
+import lib.core.PoseBackends as pb
+
+
+class _ModelBackend(pb.StubBackend):
+    # A stub with a model object that only exists while loaded, like MediaPipe's self.pose
+    def __init__(self, **params):
+        super().__init__(**params)
+        self.loads = 0
+
+    def _load(self):
+        self.loads += 1
+        self.model = object()
+
+    def _unload(self):
+        self.model = None
+
+    def _process(self, img):
+        assert self.model is not None, 'inference on an unloaded backend'
+        return super()._process(img)
+
+
+def test_process_survives_concurrent_swaps():
+    pb.registerBackend('_model_stub', _ModelBackend)
+    detector = pm.PoseDetector(backend='_model_stub')
+    img = np.full((48, 64, 3), 9, dtype=np.uint8)
+    errors = []
+    stop = threading.Event()
+
+    def infer():
+        try:
+            while not stop.is_set():
+                detector.MediaPipe_findPose(img, draw=True)
+        except Exception as e:
+            errors.append(e)
+
+    interval = sys.getswitchinterval()
+    sys.setswitchinterval(1e-6)  # Switch threads as often as possible to hit the window between load and process
+    try:
+        thread = threading.Thread(target=infer)
+        thread.start()
+        backends = []
+        for _ in range(2000):
+            backend = detector.createBackend()
+            backends.append(backend)
+            detector.swapBackend(backend)
+        stop.set()
+        thread.join()
+    finally:
+        sys.setswitchinterval(interval)
+    assert not errors
+    assert all(not b.isLoaded for b in backends[:-1])  # Retired backends do not keep their model
+
+
+def test_closed_backend_reloads_on_next_frame():
+    backend = _ModelBackend()
+    img = np.full((8, 8, 3), 9, dtype=np.uint8)
+    backend.process(img)
+    backend.close()
+    backend.process(img)  # A stopped camera started again
+    assert backend.isLoaded
+
+
+def test_retired_backend_does_not_reload():
+    old, new = _ModelBackend(), _ModelBackend()
+    img = np.full((8, 8, 3), 9, dtype=np.uint8)
+    old.process(img)
+    old.retire(new)
+    results = old.process(img)  # A frame that picked the old backend right before the swap
+    assert old.loads == 1 and not old.isLoaded
+    assert new.loads == 1 and new.frameIndex == 1
+    assert results.pose_landmarks
+
+
+def test_close_during_inference():
+    entered, release = threading.Event(), threading.Event()
+
+    class _BlockingBackend(_ModelBackend):
+        # Inference stalls until the test has called close() from another thread
+        def _process(self, img):
+            entered.set()
+            release.wait(5)
+            return super()._process(img)
+
+    backend = _BlockingBackend()
+    results = []
+    frame = threading.Thread(target=lambda: results.append(backend.process(np.full((8, 8, 3), 9, dtype=np.uint8))))
+    frame.start()
+    assert entered.wait(5)
+    closer = threading.Thread(target=backend.close)
+    closer.start()
+    closer.join(0.1)
+    assert closer.is_alive()  # close() waits for the frame in progress
+    assert backend.isLoaded and backend.model is not None
+    release.set()
+    frame.join(5)
+    closer.join(5)
+    assert results and results[0].pose_landmarks
+    assert not backend.isLoaded and backend.model is None
+    assert backend.loads == 1
+
+
+class _FakeGraph:
+    # Stands in for mediapipe.solutions.pose.Pose, counts the graphs built
+    created = 0
+
+    def __init__(self, *args):
+        _FakeGraph.created += 1
+
+    def process(self, img):
+        return None
+
+    def close(self):
+        pass
+
+
+class _FakeMediaPipeBackend(pb.MediaPipeBackend):
+    def _load(self):
+        self.mpPose = type('_FakePoseSolution', (), {'Pose': _FakeGraph})
+        self.pose = self._createPose()
+
+
+def test_warm_up_keeps_the_mediapipe_graph():
+    _FakeGraph.created = 0
+    backend = _FakeMediaPipeBackend()
+    backend.warmUp(background=False)
+    warmGraph = backend.pose
+    backend.process(np.full((8, 8, 3), 9, dtype=np.uint8))
+    assert _FakeGraph.created == 1 and backend.pose is warmGraph
+    backend.reset()  # A new stream still starts on a fresh graph
+    assert _FakeGraph.created == 2
+
+
+def test_warm_up_frame_is_not_counted():
+    backend = pb.StubBackend()
+    backend.warmUp(background=False)
+    assert backend.frameIndex == 0
@@ -0,0 +1,52 @@
+import os
+
+import cv2
+import numpy as np
+
+from lib.core.BatchPoseModule import outputPaths, main
+from lib.core.ChunkedVideoModule import chunkPath
+
+
+def writeVideo(path, frames=6, size=(64, 48)):
+    writer = cv2.VideoWriter(str(path), cv2.VideoWriter_fourcc(*'MJPG'), 30.0, size)
+    for i in range(frames):
+        writer.write(np.full((size[1], size[0], 3), (40 + 10 * i) % 256, dtype=np.uint8))
+    writer.release()
+
+
+def test_same_named_videos_get_distinct_outputs(tmp_path):
+    a = os.path.join(str(tmp_path), '2023-01', 'cam.avi')
+    b = os.path.join(str(tmp_path), '2023-02', 'cam.avi')
+    assert outputPaths(a, 'out') != outputPaths(b, 'out')
+    assert set(outputPaths(a, 'out')).isdisjoint(outputPaths(b, 'out'))
+    assert chunkPath(a, 'out', 0) != chunkPath(b, 'out', 0)
+    assert outputPaths(a, 'out') == outputPaths(a, 'out')  # Stable, re-runs find their progress
+
+
+def test_batch_run_with_same_named_videos(tmp_path):
+    for folder in ('2023-01', '2023-02'):
+        os.makedirs(str(tmp_path / folder))
+        writeVideo(tmp_path / folder / 'cam.avi')
+    out = tmp_path / 'out'
+    assert main([str(tmp_path / '2023-*' / '*.avi'), '--output', str(out), '--backend', 'stub', '--workers', '2']) == 0
+    csvs = sorted(p for p in os.listdir(str(out)) if p.endswith('.landmarks.csv'))
+    assert len(csvs) == 2
+    for name in csvs:
+        with open(str(out / name)) as f:
+            assert len(f.readlines()) == 1 + 6
+
+
+def test_batch_run_goes_on_past_an_unreadable_video(tmp_path, capsys):
+    writeVideo(tmp_path / 'a.avi')
+    writeVideo(tmp_path / 'c.avi')
+    with open(str(tmp_path / 'b.avi'), 'wb') as f:
+        f.write(b'not a video' * 100)
+    out = tmp_path / 'out'
+    assert main([str(tmp_path), '--output', str(out), '--backend', 'stub', '--workers', '2']) == 1
+    for name in ('a.avi', 'c.avi'):
+        csvPath, progressPath = outputPaths(str(tmp_path / name), str(out))
+        with open(csvPath) as f:
+            assert len(f.readlines()) == 1 + 6
+    assert not os.path.exists(outputPaths(str(tmp_path / 'b.avi'), str(out))[0])
+    summary = capsys.readouterr().out.split('----- Failed (1 of 3 videos) -----')[1]
+    assert 'b.avi' in summary and 'a.avi' not in summary
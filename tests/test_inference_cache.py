@@ -0,0 +1,73 @@
+import os
+import multiprocessing
+
+import numpy as np
+
+import lib.core.BatchPoseModule as bpm
+from lib.core.InferenceCache import InferenceCache
+
+from tests.test_batch_outputs import writeVideo
+
+
+def test_hits_and_misses_are_counted_by_the_cache(tmp_path):
+    video = tmp_path / 'clip.avi'
+    writeVideo(video)
+    cache = InferenceCache(str(tmp_path / 'cache'))
+    lm = np.full((33, 4), 0.5, dtype=np.float32)
+
+    entry = cache.open(str(video), 'stub', {'model_complexity': 1})
+    assert not entry.complete
+    for i in range(6):
+        entry.store(i, lm if i % 2 else None, 64, 48)
+    entry.close(complete=True)
+    assert cache.stats()['misses'] == 6 and cache.stats()['hits'] == 0 and cache.stored == 1
+
+    entry = cache.open(str(video), 'stub', {'model_complexity': 1})
+    assert entry.complete
+    results = [entry.lookup(i) for i in range(7)]
+    entry.close()
+    assert [hit for hit, _ in results] == [True] * 6 + [False]
+    assert results[0][1] is None and np.allclose(results[1][1], lm)
+    stats = cache.stats()
+    assert stats['hits'] == 6 and stats['misses'] == 6 and stats['hit_rate'] == 0.5
+
+    other = cache.open(str(video), 'stub', {'model_complexity': 2})  # Other settings: a different entry
+    assert not other.complete
+    other.close()
+
+
+def test_batch_video_stats_count_cache_use(tmp_path):
+    video = tmp_path / 'clip.avi'
+    writeVideo(video)
+    os.makedirs(str(tmp_path / 'out1'))
+    os.makedirs(str(tmp_path / 'out2'))
+    bpm._initWorker({'backend': 'stub'}, str(tmp_path / 'cache'), 1 << 20)
+    try:
+        first = bpm.processVideo(str(video), str(tmp_path / 'out1'))
+        second = bpm.processVideo(str(video), str(tmp_path / 'out2'))
+    finally:
+        bpm._cache = None
+    assert (first['cacheHits'], first['cacheMisses']) == (0, 6)
+    assert (second['cacheHits'], second['cacheMisses']) == (6, 0)
+    with open(bpm.outputPaths(str(video), str(tmp_path / 'out1'))[0]) as a, \
+            open(bpm.outputPaths(str(video), str(tmp_path / 'out2'))[0]) as b:
+        assert a.read() == b.read()
+
+
+def _hashVideo(args):
+    cacheDir, video = args
+    return InferenceCache(cacheDir).videoHash(video)
+
+
+def test_video_hashes_from_concurrent_processes(tmp_path):
+    videos = []
+    for i in range(4):
+        video = str(tmp_path / ('clip%d.avi' % i))
+        writeVideo(video, frames=2 + i)
+        videos.append(video)
+    cacheDir = str(tmp_path / 'cache')
+    with multiprocessing.Pool(4) as pool:
+        hashes = pool.map(_hashVideo, [(cacheDir, video) for video in videos * 4])
+    assert hashes == [InferenceCache(cacheDir).videoHash(video) for video in videos * 4]
+    assert len(set(hashes)) == 4
+    assert not [name for name in os.listdir(os.path.join(cacheDir, 'video_hashes')) if name.endswith('.tmp')]
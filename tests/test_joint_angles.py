@@ -0,0 +1,103 @@
+import math
+
+import numpy as np
+import pytest
+
+import lib.core.PoseModule as pm
+from lib.core.JointAngleAnalytics import JOINTS, jointAngles, AngleAggregator, RepCounter
+
+
+def kneeAngles(reps=10, period=90, rest=170.0, bottom=70.0, noise=3.0, dropout=0.02, seed=0):
+    # Squats: the knee rests straight and bends reps times, with some noise and a few dropouts
+    rng = np.random.default_rng(seed)
+    t = np.arange(reps * period + period // 2)
+    angles = rest - (rest - bottom) * 0.5 * (1 - np.cos(2 * np.pi * t / period))
+    angles[t >= reps * period] = rest
+    angles += rng.normal(0, noise, len(t))
+    angles[rng.random(len(t)) < dropout] = np.nan
+    return angles.astype(np.float32)
+
+
+def test_reps_are_counted_the_same_in_blocks():
+    angles = kneeAngles()
+    whole = RepCounter(100.0, 150.0)
+    whole.update(angles, 0)
+    assert len(whole.reps) == 10
+    for block in (1, 7, 45, 89, 91, 500):  # Boundaries inside reps, at their peaks, between them
+        counter = RepCounter(100.0, 150.0)
+        found = []
+        for start in range(0, len(angles), block):
+            found += counter.update(angles[start:start + block])
+        assert counter.reps == whole.reps, block
+        assert found == whole.reps
+
+
+def test_rep_is_not_finished_across_a_gap():
+    angles = kneeAngles(reps=1, noise=0.0, dropout=0.0)
+    counter = RepCounter(100.0, 150.0)
+    counter.update(angles[:45], 0)  # Down to the bottom of the rep
+    counter.update(angles[45:], 1000)  # Not the next frame: the open rep is dropped
+    assert counter.reps == []
+    contiguous = RepCounter(100.0, 150.0)
+    contiguous.update(angles[:45], 0)
+    contiguous.update(angles[45:], 45)
+    assert len(contiguous.reps) == 1 and contiguous.reps[0]['peak'] == 45
+
+
+def test_joint_angles_match_find_angle():
+    rng = np.random.default_rng(2)
+    landmarks = rng.random((5, 33, 4)).astype(np.float32)
+    landmarks[:, :, 3] = 1.0
+    width, height = 640, 480
+    angles = jointAngles(landmarks, mode='2d', width=width, height=height, signed=True)
+    detector = pm.PoseDetector(backend='stub')
+    img = np.zeros((height, width, 3), dtype=np.uint8)
+    for f in range(len(landmarks)):
+        detector.lmList = landmarks[f] * (width, height, width, 1)
+        for j, (p1, p2, p3) in enumerate(JOINTS.values()):
+            assert angles[f, j] == pytest.approx(detector.MediaPipe_findAngle(img, p1, p2, p3, draw=False), abs=1e-3)
+
+
+def test_joint_angles_3d_and_missing_landmarks():
+    landmarks = np.zeros((2, 33, 4), dtype=np.float32)
+    landmarks[:, :, 3] = 1.0
+    p1, p2, p3 = JOINTS['left_knee']
+    landmarks[:, p1, :3] = (0.0, 0.0, 1.0)
+    landmarks[:, p3, :3] = (1.0, 0.0, 0.0)
+    landmarks[1, p3, 3] = 0.1  # Not visible
+    angles = jointAngles(landmarks, mode='3d')
+    knee = list(JOINTS).index('left_knee')
+    assert angles[0, knee] == pytest.approx(90.0)
+    assert math.isnan(angles[1, knee])
+    assert math.isnan(jointAngles(landmarks, mode='3d', valid=[False, True])[0, knee])
+
+
+def test_aggregator_blocks_match_whole():
+    angles = np.stack([kneeAngles(seed=3), kneeAngles(seed=4)], axis=1)
+    whole = AngleAggregator(['a', 'b'])
+    whole.update(angles)
+    blocked = AngleAggregator(['a', 'b'])
+    for start in range(0, len(angles), 77):
+        blocked.update(angles[start:start + 77])
+    for name, stats in whole.summary().items():
+        assert blocked.summary()[name] == pytest.approx(stats)
+    stats = whole.summary()['a']
+    values = angles[:, 0][~np.isnan(angles[:, 0])]
+    assert stats['count'] == len(values)
+    assert stats['mean'] == pytest.approx(values.mean(), rel=1e-6)
+    assert abs(stats['p50'] - np.percentile(values, 50)) <= 0.1
+
+
+def test_analyse_landmarks_counts_reps_across_blocks():
+    from lib.core.JointAngleAnalytics import analyseLandmarks
+    p1, p2, p3 = JOINTS['left_knee']
+    target = np.radians(np.nan_to_num(kneeAngles(dropout=0.0), nan=170.0))
+    landmarks = np.zeros((len(target), 33, 4), dtype=np.float32)
+    landmarks[:, :, 3] = 1.0
+    landmarks[:, p1, :2] = (0.0, -1.0)  # Thigh straight up from the knee, the shin turns by the knee angle
+    landmarks[:, p3, 0] = np.sin(target)
+    landmarks[:, p3, 1] = -np.cos(target)
+    results = [analyseLandmarks(landmarks, repJoints=['left_knee'], thresholds={'left_knee': (100, 150)},
+                                block=block)[2]['left_knee'] for block in (64, 1000, len(landmarks))]
+    assert len(results[0]) == 10
+    assert results[0] == results[1] == results[2]
@@ -0,0 +1,58 @@
+import cv2
+import numpy as np
+
+import lib.core.PoseModule as pm
+
+
+def test_find_position_fills_pixel_landmarks():
+    detector = pm.PoseDetector(backend='stub')
+    img = np.full((480, 640, 3), 9, dtype=np.uint8)
+    detector.MediaPipe_findPose(img, draw=False)
+    lmPixels = detector.MediaPipe_findPosition(img, draw=False)
+    expected = np.array([(lm.x, lm.y, lm.z, lm.visibility) for lm in detector.results.pose_landmarks.landmark],
+                        dtype=np.float32)
+    assert np.array_equal(detector.lmNormalized, expected)
+    assert np.allclose(lmPixels, expected * (640, 480, 640, 1))
+
+
+def test_find_position_without_pose_returns_empty_list():
+    detector = pm.PoseDetector(backend='stub')
+    # MediaPipe_findPose skips all-zero frames without calling the backend, so there are no results yet
+    img = np.zeros((48, 64, 3), dtype=np.uint8)
+    detector.MediaPipe_findPose(img, draw=False)
+    assert detector.backend.frameIndex == 0
+    assert detector.MediaPipe_findPosition(img, draw=False) == []
+    assert detector.lmList == []
+
+    # Any other frame goes to the stub, which always reports its pose
+    img[0, 0] = 1
+    detector.MediaPipe_findPose(img, draw=False)
+    assert detector.backend.frameIndex == 1
+    lmPixels = detector.MediaPipe_findPosition(img, draw=False)
+    assert lmPixels.shape == (33, 4) and detector.lmList is lmPixels
+
+    # Back to "no pose" once the detector starts over
+    detector.MediaPipe_resetTracking()
+    assert detector.MediaPipe_findPosition(img, draw=False) == []
+
+
+def test_keyframe_tracking_mode_skips_inference_between_keyframes():
+    detector = pm.PoseDetector(backend='stub')
+    detector.setKeyframeTracking(minInterval=4, maxInterval=4)
+    rng = np.random.default_rng(0)
+    img = rng.integers(0, 255, (240, 320, 3), dtype=np.uint8)  # Texture for the optical flow to follow
+    img = cv2.GaussianBlur(img, (5, 5), 0)
+    found = []
+    for _ in range(8):
+        frame = img.copy()  # Drawn on
+        detector.MediaPipe_findPose(frame, draw=True)
+        lmPixels = detector.MediaPipe_findPosition(frame, draw=True)
+        found.append(len(lmPixels) != 0)
+    assert all(found)
+    assert detector.backend.frameIndex == 2  # Inference on frames 0 and 4 only
+    assert detector.keyframeTracker.trackedFrames == 6
+    assert np.allclose(detector.lmPixels[:, :2], detector.lmNormalized[:, :2] * (320, 240), atol=1e-3)
+
+    detector.setKeyframeTracking(False)
+    detector.MediaPipe_findPose(img, draw=False)
+    assert detector.backend.frameIndex == 3
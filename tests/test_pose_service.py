@@ -0,0 +1,78 @@
+import json
+import socket
+import struct
+
+import numpy as np
+import pytest
+
+import lib.core.PoseBackends as pb
+from lib.core.PoseService import PoseService, PoseClient, recvMessage
+
+
+class _BrokenBackend(pb.StubBackend):
+    def _load(self):
+        raise RuntimeError('no model here')
+
+
+@pytest.fixture
+def service(tmp_path):
+    services = []
+
+    def start(**kwargs):
+        service = PoseService(str(tmp_path / 'pose.sock'), workers=1, **kwargs)
+        service.start()
+        services.append(service)
+        return service
+
+    yield start
+    for service in services:
+        service.stop()
+
+
+def _sendRaw(sock, headerBytes):
+    sock.sendall(struct.pack('<I', len(headerBytes)) + headerBytes)
+
+
+def test_malformed_headers_get_error_replies(service):
+    svc = service(detectorKwargs={'backend': 'stub'})
+    img = np.full((48, 64, 3), 9, dtype=np.uint8)
+
+    client = PoseClient(svc.address)
+    sock = client.sock
+    _sendRaw(sock, json.dumps({'op': 'landmarks', 'nbytes': 4}).encode())
+    sock.sendall(b'abcd')  # No shape for a raw frame
+    header, _ = recvMessage(sock)
+    assert not header['ok'] and 'KeyError' in header['error']
+    assert client.landmarks(img) is not None  # The connection is still served
+
+    _sendRaw(sock, json.dumps({'op': 'landmarks', 'nbytes': 0, 'shape': 'x'}).encode())
+    header, _ = recvMessage(sock)
+    assert not header['ok']
+    client.close()
+
+    for bad in (b'not json', json.dumps(['a list']).encode(), json.dumps({'nbytes': 'many'}).encode()):
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.connect(svc.address)
+        _sendRaw(sock, bad)
+        header, _ = recvMessage(sock)
+        assert not header['ok']
+        sock.close()
+    assert PoseClient(svc.address).landmarks(img) is not None  # The service survived all of it
+
+
+def test_requests_fail_when_the_workers_can_not_load(service):
+    pb.registerBackend('_broken_stub', _BrokenBackend)
+    svc = service(detectorKwargs={'backend': '_broken_stub'}, requestTimeout=5.0)
+    client = PoseClient(svc.address)
+    with pytest.raises(RuntimeError, match='could not load'):
+        client.landmarks(np.full((48, 64, 3), 9, dtype=np.uint8))
+    assert svc.stats()['workers']['landmarks'] == 0
+    client.close()
+
+
+def test_requests_time_out():
+    # Never started: nothing answers
+    svc = PoseService('/unused', workers=1, detectorKwargs={'backend': 'stub'}, requestTimeout=0.05)
+    with pytest.raises(RuntimeError, match='No result'):
+        svc.submit('landmarks', np.zeros((8, 8, 3), dtype=np.uint8))
+    assert svc.stats()['errors'] == 1
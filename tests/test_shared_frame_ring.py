@@ -0,0 +1,54 @@
+import time
+
+import numpy as np
+
+from lib.core.SharedFrameRing import SharedRing, MultiprocessPipeline
+
+from tests.test_batch_outputs import writeVideo
+
+
+def test_ring_wraparound():
+    ring = SharedRing((2, 3), np.float32, slots=4)
+    try:
+        for seq in range(1, 11):  # Two and a half times around
+            ring.write(seq, np.full((2, 3), seq, dtype=np.float32), timestamp=seq / 10, aux=seq % 2)
+        assert ring.latestSeq() == 10
+        assert ring.latestSeq(1, 2) == 9
+        for seq in range(1, 7):  # Overwritten by seq + 4 (and + 8)
+            assert ring.read(seq) is None and not ring.isValid(seq)
+        for seq in range(7, 11):
+            view, timestamp, aux = ring.read(seq)
+            assert (view == seq).all() and timestamp == seq / 10 and aux == seq % 2
+
+        view, _, _ = ring.read(8)
+        ring.beginWrite(12)  # Same slot as 8: the reader of 8 sees it go away mid-read
+        assert not ring.isValid(8) and ring.read(12) is None and ring.latestSeq() == 10
+        ring.endWrite(12, 1.2)
+        assert ring.latestSeq() == 12 and ring.read(8) is None
+
+        other = SharedRing.attach(ring.spec())  # Another process' view of the same memory
+        assert other.latestSeq() == 12 and (other.read(10)[0] == 10).all()
+        other.close()
+    finally:
+        ring.close()
+
+
+def test_file_source_frames_are_all_composed(tmp_path):
+    video = tmp_path / 'clip.avi'
+    writeVideo(video, frames=40, size=(64, 48))  # 30 fps
+    composed = []
+    pipeline = MultiprocessPipeline(str(video), lambda frame: composed.append(frame.seq), workers=1,
+                                    detectorKwargs={'backend': 'stub'})
+    pipeline.start()
+    try:
+        deadline = time.monotonic() + 60
+        while (not composed or composed[-1] < 40) and time.monotonic() < deadline:
+            time.sleep(0.05)
+            frame = pipeline.getLatestFrame()
+            if frame is not None:
+                frame.release()
+    finally:
+        pipeline.stop()
+    # Read at 30 fps the ring is never overwritten before the worker gets to a frame
+    assert composed[-1] == 40
+    assert len(composed) >= 30
@@ -0,0 +1,26 @@
+import cv2
+import numpy as np
+
+from lib.core.SegmentationCompositor import SegmentationCompositor
+from lib.core.VideoRecorder import VideoRecorder
+
+
+def test_recorded_frames_are_composited(tmp_path):
+    path = str(tmp_path / 'out.avi')
+    background = np.zeros((120, 160, 3), dtype=np.uint8)
+    background[...] = (0, 0, 255)
+    recorder = VideoRecorder(path, fourcc='MJPG', policy='block',
+                             compositor=SegmentationCompositor('replace', background)).start()
+    img = np.full((120, 160, 3), 200, dtype=np.uint8)
+    alpha = np.zeros((12, 16), dtype=np.uint8)
+    alpha[:, :8] = 255  # The person on the left half
+    for _ in range(3):
+        assert recorder.submit(img, alpha=alpha)
+    assert recorder.stop()['encoded'] == 3
+    assert (img == 200).all()  # The caller's frame is left alone
+
+    ok, frame = cv2.VideoCapture(path).read()
+    assert ok
+    left, right = frame[60, 20].astype(int), frame[60, 140].astype(int)
+    assert np.abs(left - 200).max() < 20
+    assert right[2] > 200 and right[:2].max() < 50